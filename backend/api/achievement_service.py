@@ -1,10 +1,29 @@
-from django.utils import timezone
-from datetime import timedelta
+from django.core.cache import cache
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from .models import (
     User, Achievement, UserAchievement, UserProgress, 
-    GameSession, SavedFlashcardSet, DailyStats
+    GameSession, SavedFlashcardSet, UserStats
 )
 
+ACTIVE_ACHIEVEMENTS_CACHE_KEY = 'achievements:active'
+ACTIVE_ACHIEVEMENTS_CACHE_TIMEOUT = 300
+
+
+class AchievementEvent:
+    # Các sự kiện hoạt động của user mà engine thành tích lắng nghe
+    CARD_REVIEWED = 'card_reviewed'
+    GAME_FINISHED = 'game_finished'
+    SET_SAVED = 'set_saved'
+
+    # Sự kiện -> bộ đếm trong UserStats bị ảnh hưởng
+    COUNTERS = {
+        CARD_REVIEWED: 'words_learned',
+        GAME_FINISHED: 'games_played',
+        SET_SAVED: 'sets_saved',
+    }
+
 
 class AchievementService:
     @staticmethod
@@ -19,6 +38,113 @@ class AchievementService:
         
         return new_achievements
     
+    @staticmethod
+    def handle_event(user, event, delta=1):
+        """Cập nhật bộ đếm của sự kiện và chỉ kiểm tra các thành tích đăng ký sự kiện đó.
+        - delta: số đơn vị cộng vào bộ đếm (0 nếu hành động không làm đổi bộ đếm, âm khi hoàn tác).
+        - Số query không phụ thuộc lượng dữ liệu của user.
+        """
+        counters = AchievementService._apply_counter(user, AchievementEvent.COUNTERS[event], delta)
+        if event == AchievementEvent.CARD_REVIEWED:
+            stats = user.stats
+            stats.record_activity()
+            counters['current_streak'] = stats.get_current_streak()
+        if delta < 0:
+            # Bộ đếm giảm thì không thể đạt thêm thành tích nào
+            return []
+
+        candidates = AchievementService._get_subscribed_achievements(event)
+        if not candidates:
+            return []
+
+        earned_ids = set(UserAchievement.objects.filter(
+            user=user, achievement__in=candidates
+        ).values_list('achievement_id', flat=True))
+
+        new_achievements = []
+        for achievement in candidates:
+            if achievement.id in earned_ids:
+                continue
+            progress_value = counters[AchievementService._counter_for(achievement)]
+            if progress_value >= achievement.requirement_value:
+                if AchievementService._award_achievement(user, achievement, progress_value):
+                    new_achievements.append(achievement)
+
+        return new_achievements
+
+    @staticmethod
+    def record_reviews(user, reviewed, correct):
+        """Cộng dồn tổng số lần ôn/đúng trọn đời bằng F() và trả về độ chính xác hiện tại."""
+        stats, rebuilt = AchievementService._get_stats(user)
+        if reviewed and not rebuilt:
+            UserStats.objects.filter(pk=stats.pk).update(
+                total_reviewed=F('total_reviewed') + reviewed,
+                total_correct=F('total_correct') + correct
+            )
+            stats.total_reviewed += reviewed
+            stats.total_correct += correct
+        return stats.accuracy_rate
+
+    @staticmethod
+    def get_accuracy_rate(user):
+        return AchievementService._get_stats(user)[0].accuracy_rate
+
+    @staticmethod
+    def _get_stats(user):
+        # Lấy bộ đếm của user; lần đầu sẽ đếm lại từ dữ liệu hiện có.
+        # Bản ghi vừa đếm lại đã gồm mọi thay đổi trước đó trong request nên được đánh dấu
+        # để các bộ đếm khác không cộng thêm lần nữa.
+        try:
+            stats = user.stats
+        except UserStats.DoesNotExist:
+            user.stats = stats = UserStats.rebuild_for(user)
+            stats._rebuilt = True
+        return stats, getattr(stats, '_rebuilt', False)
+
+    @staticmethod
+    def _apply_counter(user, counter, delta):
+        stats, rebuilt = AchievementService._get_stats(user)
+        if delta and not rebuilt:
+            UserStats.objects.filter(pk=stats.pk).update(**{counter: F(counter) + delta})
+            setattr(stats, counter, getattr(stats, counter) + delta)
+        # handle_event là bước cuối của mỗi hành động, từ đây bộ đếm được cộng dồn bình thường
+        stats._rebuilt = False
+        return {
+            'words_learned': stats.words_learned,
+            'games_played': stats.games_played,
+            'sets_saved': stats.sets_saved,
+        }
+
+    @staticmethod
+    def _counter_for(achievement):
+        # Ánh xạ thành tích -> tên bộ đếm dùng để so với requirement_value
+        desc = (achievement.description or '').lower()
+        if achievement.achievement_type == 'learning' and 'từ vựng' in desc:
+            return 'words_learned'
+        if achievement.achievement_type == 'gaming' and 'ván game' in desc:
+            return 'games_played'
+        if achievement.achievement_type == 'streak':
+            return 'current_streak'
+        if achievement.achievement_type == 'milestone' and 'bộ flashcard' in desc and 'lưu' in desc:
+            return 'sets_saved'
+        return None
+
+    @staticmethod
+    def _get_subscribed_achievements(event):
+        # Danh sách thành tích đang hoạt động, cache theo process và xóa khi Achievement thay đổi
+        subscriptions = cache.get(ACTIVE_ACHIEVEMENTS_CACHE_KEY)
+        if subscriptions is None:
+            subscriptions = {name: [] for name in AchievementEvent.COUNTERS}
+            for achievement in Achievement.objects.filter(is_active=True):
+                counter = AchievementService._counter_for(achievement)
+                for name, event_counter in AchievementEvent.COUNTERS.items():
+                    # Chuỗi ngày chỉ thay đổi khi user ôn tập thẻ
+                    if counter == event_counter or (
+                            counter == 'current_streak' and name == AchievementEvent.CARD_REVIEWED):
+                        subscriptions[name].append(achievement)
+            cache.set(ACTIVE_ACHIEVEMENTS_CACHE_KEY, subscriptions, ACTIVE_ACHIEVEMENTS_CACHE_TIMEOUT)
+        return subscriptions.get(event, [])
+
     @staticmethod
     def _check_learning_achievements(user):
         new_achievements = []
@@ -123,32 +249,9 @@ class AchievementService:
     
     @staticmethod
     def _calculate_current_streak(user):
-        today = timezone.now().date()
-        current_streak = 0
-        
-        # Kiểm tra từ hôm nay trở về trước
-        for i in range(365):  # Kiểm tra tối đa 1 năm
-            check_date = today - timedelta(days=i)
-            
-            # Kiểm tra xem ngày đó có hoạt động học tập không
-            has_activity = (
-                DailyStats.objects.filter(
-                    user=user, 
-                    date=check_date,
-                    cards_studied__gt=0
-                ).exists() or
-                UserProgress.objects.filter(
-                    user=user,
-                    last_reviewed__date=check_date
-                ).exists()
-            )
-            
-            if has_activity:
-                current_streak += 1
-            else:
-                break
-        
-        return current_streak
+        # Đọc chuỗi ngày đã lưu sẵn trong UserStats (cập nhật tăng dần khi ôn tập)
+        stats, _ = AchievementService._get_stats(user)
+        return stats.get_current_streak()
     
     @staticmethod
     def _should_award_achievement(user, achievement):
@@ -211,29 +314,19 @@ class AchievementService:
     
     @staticmethod
     def _calculate_progress_for_achievement(user, achievement):
-        # Tính toán tiến trình hiện tại cho một thành tích
-        if achievement.achievement_type == 'learning':
-            desc = (achievement.description or '').lower()
-            if 'từ vựng' in desc:
-                return UserProgress.objects.filter(
-                    user=user, 
-                    times_reviewed__gte=1
-                ).count()
-        
-        elif achievement.achievement_type == 'gaming':
-            desc = (achievement.description or '').lower()
-            if 'ván game' in desc:
-                return GameSession.objects.filter(user=user).count()
-        
-        elif achievement.achievement_type == 'streak':
+        # Tính toán tiến trình hiện tại cho một thành tích từ bộ đếm của user
+        counter = AchievementService._counter_for(achievement)
+        if counter == 'current_streak':
             return AchievementService._calculate_current_streak(user)
-        
-        elif achievement.achievement_type == 'milestone':
+        if counter is not None:
+            stats, _ = AchievementService._get_stats(user)
+            return getattr(stats, counter)
+        if achievement.achievement_type == 'milestone':
             desc = (achievement.description or '').lower()
-            if 'bộ flashcard' in desc:
-                if 'lưu' in desc:
-                    return SavedFlashcardSet.objects.filter(user=user).count()
-            elif 'tài khoản' in desc:
+            if 'bộ flashcard' not in desc and 'tài khoản' in desc:
                 return 1
-        
         return 0
+
+@receiver([post_save, post_delete], sender=Achievement)
+def invalidate_active_achievements(sender, **kwargs):
+    cache.delete(ACTIVE_ACHIEVEMENTS_CACHE_KEY)
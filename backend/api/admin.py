@@ -7,7 +7,7 @@ from django.utils.safestring import mark_safe
 from .models import (
     User, Topic, FlashcardSet, Flashcard, SavedFlashcardSet,
     UserProgress, GameSession, Achievement, UserAchievement,
-    UserFeedback, DailyStats
+    UserFeedback, DailyStats, UserStats, LeaderboardEntry
 )
 
 
@@ -31,7 +31,7 @@ class UserAdmin(BaseUserAdmin):
         if obj.avatar:
             return format_html(
                 '<img src="{}" width="40" height="40" style="border-radius: 50%; object-fit: cover;" />',
-                obj.avatar.url
+                obj.avatar_url
             )
         return format_html(
             '<div style="width: 40px; height: 40px; background: #ddd; border-radius: 50%; display: flex; align-items: center; justify-content: center; font-size: 12px;">No Img</div>')
@@ -43,7 +43,7 @@ class UserAdmin(BaseUserAdmin):
         if obj.avatar:
             return format_html(
                 '<img src="{}" width="150" height="150" style="border-radius: 10px; object-fit: cover; border: 2px solid #ddd;" />',
-                obj.avatar.url
+                obj.avatar_url
             )
         return format_html(
             '<div style="width: 150px; height: 150px; background: #f0f0f0; border: 2px dashed #ccc; border-radius: 10px; display: flex; align-items: center; justify-content: center; color: #999;">Chưa có ảnh</div>')
@@ -172,7 +172,7 @@ class FlashcardSetAdmin(admin.ModelAdmin):
     list_filter = ('difficulty', 'is_public', 'topic', 'created_at')
     search_fields = ('title', 'description', 'creator__username')
     ordering = ('-created_at',)
-    readonly_fields = ('total_cards', 'total_saves', 'average_rating', 'created_at', 'updated_at')
+    readonly_fields = ('total_cards', 'total_saves', 'average_rating', 'rating_count', 'created_at', 'updated_at')
 
     fieldsets = (
         ('Thông tin cơ bản', {
@@ -182,7 +182,7 @@ class FlashcardSetAdmin(admin.ModelAdmin):
             'fields': ('difficulty', 'is_public')
         }),
         ('Thống kê', {
-            'fields': ('total_cards', 'total_saves', 'average_rating'),
+            'fields': ('total_cards', 'total_saves', 'average_rating', 'rating_count'),
             'classes': ('collapse',)
         }),
         ('Thông tin thời gian', {
@@ -209,10 +209,10 @@ class FlashcardSetAdmin(admin.ModelAdmin):
 
     def update_card_counts(self, request, queryset):
         for flashcard_set in queryset:
-            flashcard_set.update_total_cards()
-        self.message_user(request, f'Đã cập nhật số lượng thẻ cho {queryset.count()} bộ flashcard.')
+            flashcard_set.recount_counters()
+        self.message_user(request, f'Đã đếm lại bộ đếm cho {queryset.count()} bộ flashcard.')
 
-    update_card_counts.short_description = 'Cập nhật số lượng thẻ'
+    update_card_counts.short_description = 'Đếm lại số thẻ, lượt lưu và đánh giá'
 
 
 class FlashcardAdmin(admin.ModelAdmin):
@@ -273,6 +273,9 @@ class UserProgressAdmin(admin.ModelAdmin):
         ('Đánh giá', {
             'fields': ('difficulty_rating', 'is_learned', 'is_difficult')
         }),
+        ('Lịch ôn tập', {
+            'fields': ('due_at', 'interval_days', 'ease_factor', 'repetitions')
+        }),
         ('Thời gian', {
             'fields': ('last_reviewed',),
             'classes': ('collapse',)
@@ -451,6 +454,25 @@ class DailyStatsAdmin(admin.ModelAdmin):
         return super().get_queryset(request).select_related('user')
 
 
+class UserStatsAdmin(admin.ModelAdmin):
+    list_display = ('user', 'words_learned', 'games_played', 'sets_saved', 'total_reviewed', 'accuracy_rate', 'updated_at')
+    search_fields = ('user__username',)
+    readonly_fields = ('updated_at',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('user')
+
+
+class LeaderboardEntryAdmin(admin.ModelAdmin):
+    list_display = ('user', 'game_type', 'window', 'period', 'best_score', 'total_games', 'updated_at')
+    list_filter = ('game_type', 'window')
+    search_fields = ('user__username',)
+    ordering = ('game_type', 'window', '-period', '-best_score')
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('user')
+
+
 admin.site.register(User, UserAdmin)
 admin.site.register(Topic, TopicAdmin)
 admin.site.register(FlashcardSet, FlashcardSetAdmin)
@@ -462,6 +484,8 @@ admin.site.register(Achievement, AchievementAdmin)
 admin.site.register(UserAchievement, UserAchievementAdmin)
 admin.site.register(UserFeedback, UserFeedbackAdmin)
 admin.site.register(DailyStats, DailyStatsAdmin)
+admin.site.register(UserStats, UserStatsAdmin)
+admin.site.register(LeaderboardEntry, LeaderboardEntryAdmin)
 
 admin.site.site_header = "Flashcard App Admin"
 admin.site.site_title = "Flashcard Admin"
@@ -1,88 +1,380 @@
+import hashlib
 import logging
-from typing import List, Optional
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
 
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
 from django.db.models import QuerySet
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 
-from api.models import FlashcardSet, Topic
-from sentence_transformers import SentenceTransformer
+from api.embedding_worker import EmbeddingWorkerUnavailable, RemoteEncoder
+from api.models import FlashcardSet, FlashcardSetEmbedding, IndexVersion, Topic
 
 logger = logging.getLogger(__name__)
 
+MODEL_NAME = "all-MiniLM-L6-v2"
+INDEX_VERSION_NAME = "ai_set_embeddings"
+ENCODE_BATCH_SIZE = 256
+MIN_SCORE = 0.6
+MAX_TOP_K = 50
+SUGGESTION_CACHE_TIMEOUT = 60 * 60 * 24
+
+try:
+    import faiss
+except ImportError:  # pragma: no cover
+    faiss = None
+
+
+def get_index_version() -> int:
+    # Lưu trong DB (không phải cache của process) để mọi worker cùng thấy thay đổi
+    return IndexVersion.current(INDEX_VERSION_NAME)
+
+
+def bump_index_version() -> None:
+    # Đánh dấu chỉ mục embedding đã cũ (gọi từ signal khi bộ flashcard thay đổi)
+    IndexVersion.bump(INDEX_VERSION_NAME)
+
+
+def worker_authkey() -> bytes:
+    return (settings.AI_EMBEDDING_WORKER_AUTHKEY or settings.SECRET_KEY or "").encode("utf-8")
+
+
+def load_sentence_transformer():
+    # Nạp SBERT trong process hiện tại; ưu tiên file model trên đĩa nếu được cấu hình
+    from sentence_transformers import SentenceTransformer
+
+    model_path = settings.AI_SUGGESTION_MODEL_PATH
+    if model_path:
+        encoder = SentenceTransformer(model_path, local_files_only=True)
+    else:
+        encoder = SentenceTransformer(MODEL_NAME)
+    try:
+        _ = encoder.encode(["warmup"], normalize_embeddings=True, convert_to_numpy=True)
+    except Exception as warmup_exc:
+        logger.warning("AISuggestionService: warm-up encode failed: %s", warmup_exc)
+    return encoder
+
+
+def suggestion_cache_key(topic_text: str, top_k: int, version: int) -> str:
+    # Theo nội dung chủ đề => đổi tên/mô tả thì mọi worker tự dùng key mới, không cần xóa cache
+    return f"ai:suggestions:{content_hash(topic_text)}:{top_k}:{version}"
+
+
+def topic_text(topic: Topic) -> str:
+    return f"{topic.name or ''}. {topic.description or ''}".strip()
+
+
+def is_shared_cache(alias: str = "default") -> bool:
+    # LocMemCache/DummyCache chỉ sống trong 1 process, dữ liệu ghi vào không tới được worker khác
+    return not isinstance(caches[alias], (LocMemCache, DummyCache))
+
+
+def set_text(title: Optional[str], description: Optional[str]) -> str:
+    return f"{title or ''}. {description or ''}".strip()
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(f"{MODEL_NAME}\n{text}".encode("utf-8")).hexdigest()
+
+
+class SetEmbeddingIndex:
+    """Chỉ mục vector của các bộ flashcard công khai.
+    - Vector lưu trong bảng FlashcardSetEmbedding theo (set id, content hash), chỉ encode lại bộ có nội dung đổi.
+    - Trong process giữ ma trận/FAISS index, dựng lại khi phiên bản chỉ mục (IndexVersion) thay đổi.
+    - (ids, ma trận, FAISS index) được thay cùng lúc bằng 1 tuple nên search() không đọc lẫn bản cũ và mới.
+    """
+
+    def __init__(self, encode) -> None:
+        self._encode = encode
+        self._lock = threading.Lock()
+        self._version: Optional[int] = None
+        self._vectors: Dict[int, Tuple[str, np.ndarray]] = {}
+        # (ids, ma trận, FAISS index hoặc None); None khi chưa dựng lần nào
+        self._state: Optional[Tuple[np.ndarray, np.ndarray, object]] = None
+        self.build_ms: Optional[float] = None
+        self.encoded_on_build = 0
+        self.last_query_ms: Optional[float] = None
+
+    @property
+    def size(self) -> int:
+        state = self._state
+        return len(state[0]) if state is not None else 0
+
+    def ensure_fresh(self, version: Optional[int] = None) -> bool:
+        if version is None:
+            version = get_index_version()
+        if self._state is not None and version == self._version:
+            return True
+        with self._lock:
+            if self._state is not None and version == self._version:
+                return True
+            return self._build(version)
+
+    def _build(self, version: int) -> bool:
+        started = time.perf_counter()
+        current: Dict[int, Tuple[str, str]] = {}
+        for set_id, title, description in FlashcardSet.objects.filter(
+                is_public=True).order_by().values_list("id", "title", "description"):
+            text = set_text(title, description)
+            current[set_id] = (content_hash(text), text)
+
+        # Bộ chưa có vector đúng nội dung trong bộ nhớ => thử lấy từ DB trước
+        missing = [set_id for set_id, (digest, _) in current.items()
+                   if self._vectors.get(set_id, (None,))[0] != digest]
+        for set_id, digest, vector in FlashcardSetEmbedding.objects.filter(
+                flashcard_set_id__in=missing).values_list("flashcard_set_id", "content_hash", "vector"):
+            if current[set_id][0] == digest:
+                self._vectors[set_id] = (digest, np.frombuffer(bytes(vector), dtype=np.float32))
+
+        # Chỉ encode những bộ mới hoặc đã đổi tiêu đề/mô tả
+        stale = [set_id for set_id in missing if self._vectors.get(set_id, (None,))[0] != current[set_id][0]]
+        for start in range(0, len(stale), ENCODE_BATCH_SIZE):
+            batch = stale[start:start + ENCODE_BATCH_SIZE]
+            embeddings = self._encode([current[set_id][1] for set_id in batch])
+            if embeddings is None:
+                return self._state is not None
+            rows = []
+            for set_id, embedding in zip(batch, embeddings):
+                vector = np.asarray(embedding, dtype=np.float32)
+                self._vectors[set_id] = (current[set_id][0], vector)
+                rows.append(FlashcardSetEmbedding(
+                    flashcard_set_id=set_id, content_hash=current[set_id][0], vector=vector.tobytes()
+                ))
+            with transaction.atomic():
+                FlashcardSetEmbedding.objects.filter(flashcard_set_id__in=batch).delete()
+                FlashcardSetEmbedding.objects.bulk_create(rows)
+
+        # Bỏ các bộ đã xóa/chuyển sang riêng tư khỏi bộ nhớ
+        for set_id in list(self._vectors):
+            if set_id not in current:
+                del self._vectors[set_id]
+
+        ids = np.fromiter(self._vectors.keys(), dtype=np.int64, count=len(self._vectors))
+        if len(ids):
+            matrix = np.vstack([self._vectors[set_id][1] for set_id in ids.tolist()])
+        else:
+            matrix = np.empty((0, 0), dtype=np.float32)
+        faiss_index = None
+        if faiss is not None and len(ids):
+            faiss_index = faiss.IndexFlatIP(matrix.shape[1])
+            faiss_index.add(matrix)
+
+        self._state = (ids, matrix, faiss_index)
+        self._version = version
+        self.encoded_on_build = len(stale)
+        self.build_ms = (time.perf_counter() - started) * 1000
+        logger.info(
+            "SetEmbeddingIndex: built %d vectors (%d encoded) in %.1f ms",
+            self.size, self.encoded_on_build, self.build_ms,
+        )
+        return True
+
+    def search(self, query: np.ndarray, top_k: int) -> List[Tuple[int, float]]:
+        started = time.perf_counter()
+        # Đọc snapshot 1 lần: thread khác có thể đang dựng lại chỉ mục
+        state = self._state
+        if state is None or not len(state[0]):
+            return []
+        ids, matrix, faiss_index = state
+        top_k = min(top_k, len(ids))
+        query = np.asarray(query, dtype=np.float32).reshape(1, -1)
+        if faiss_index is not None:
+            scores, positions = faiss_index.search(query, top_k)
+            scores, positions = scores[0], positions[0]
+        else:
+            all_scores = matrix @ query[0]
+            positions = np.argsort(-all_scores)[:top_k]
+            scores = all_scores[positions]
+        hits = [(int(ids[pos]), float(score)) for pos, score in zip(positions, scores) if pos >= 0]
+        self.last_query_ms = (time.perf_counter() - started) * 1000
+        return hits
+
 
 class AISuggestionService:
     """Service gợi ý bộ flashcard theo chủ đề bằng embeddings (SBERT/FAISS) với fallback an toàn.
     - Nếu không cài được thư viện ML, sẽ fallback sang xếp hạng theo mức độ phổ biến/đánh giá.
-    - Thiết kế dạng singleton để dùng chung model/encoder trong process.
+    - Thiết kế dạng singleton (thread-safe) để dùng chung model/encoder trong process.
+    - Model được nạp ngoài request (thread nền); khi chưa sẵn sàng thì trả xếp hạng phổ biến.
+    - Có thể encode qua process dùng chung (EmbeddingWorker) thay vì nạp torch trong mỗi worker.
+    - Vector các bộ flashcard được lưu bền trong DB và tra cứu qua SetEmbeddingIndex.
     """
 
     # Singleton pattern: đảm bảo 1 class chỉ có duy nhất 1 instance
     _instance: Optional["AISuggestionService"] = None
+    _instance_lock = threading.Lock()
 
-    # Constructor
-    def __init__(self) -> None:
-        self._encoder = None
-        self._use_embeddings = False
-        try:
-            self._encoder = SentenceTransformer("all-MiniLM-L6-v2")
-            self._use_embeddings = True
-            logger.info("AISuggestionService: Loaded SBERT model all-MiniLM-L6-v2")
-            try:
-                _ = self._encoder.encode(["warmup"], normalize_embeddings=True, convert_to_numpy=True)
-            except Exception as warmup_exc:
-                logger.warning("AISuggestionService: warm-up encode failed: %s", warmup_exc)
-        except Exception as exc:
-            logger.warning(
-                "AISuggestionService: sentence-transformers not available, falling back. Error: %s",
-                exc,
-            )
+    # Trạng thái vòng đời model
+    NOT_LOADED = "not_loaded"
+    LOADING = "loading"
+    READY = "ready"
+    FAILED = "failed"
 
+    # Constructor: không nạp model ở đây để get_instance() luôn trả về ngay
+    def __init__(self, encoder=None) -> None:
+        self._encoder = encoder
+        self._use_embeddings = encoder is not None
+        self.model_state = self.READY if encoder is not None else self.NOT_LOADED
+        self._load_lock = threading.Lock()
+        self._load_thread: Optional[threading.Thread] = None
+        self.index = SetEmbeddingIndex(self._encode)
 
     @classmethod
     def get_instance(cls) -> "AISuggestionService":
         if cls._instance is None:
-            cls._instance = AISuggestionService()
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = AISuggestionService()
         return cls._instance
 
+    @classmethod
+    def preload(cls) -> None:
+        # Gọi lúc app ready / post_fork của worker để nạp model trước request đầu tiên
+        cls.get_instance().start_background_load()
+
+    @property
+    def is_ready(self) -> bool:
+        return self.model_state == self.READY
+
+    def start_background_load(self) -> None:
+        with self._instance_lock:
+            if self.model_state != self.NOT_LOADED or self._load_thread is not None:
+                return
+            self._load_thread = threading.Thread(
+                target=self.load_model, name="ai-suggestion-model-loader", daemon=True
+            )
+            self._load_thread.start()
+
+    def load_model(self) -> bool:
+        # Nạp model (blocking, chỉ chạy 1 lần); ưu tiên process encode chung nếu được cấu hình
+        with self._load_lock:
+            if self.model_state in (self.READY, self.FAILED):
+                return self.is_ready
+            self.model_state = self.LOADING
+            started = time.perf_counter()
+            try:
+                encoder = self._connect_worker()
+                source = f"worker {settings.AI_EMBEDDING_WORKER_SOCKET}"
+                if encoder is None:
+                    encoder = load_sentence_transformer()
+                    source = settings.AI_SUGGESTION_MODEL_PATH or MODEL_NAME
+                self._encoder = encoder
+                self._use_embeddings = True
+                self.model_state = self.READY
+                logger.info(
+                    "AISuggestionService: Loaded SBERT model %s in %.1f s",
+                    source, time.perf_counter() - started,
+                )
+            except Exception as exc:
+                self.model_state = self.FAILED
+                logger.warning(
+                    "AISuggestionService: sentence-transformers not available, falling back. Error: %s",
+                    exc,
+                )
+        return self.is_ready
+
+    def _connect_worker(self) -> Optional[RemoteEncoder]:
+        # Dùng process encode chung (run_embedding_worker) nếu được cấu hình và đang chạy
+        socket_path = settings.AI_EMBEDDING_WORKER_SOCKET
+        if not socket_path:
+            return None
+        remote = RemoteEncoder(socket_path, worker_authkey(), timeout=settings.AI_EMBEDDING_WORKER_TIMEOUT)
+        if remote.ping():
+            return remote
+        if not settings.AI_EMBEDDING_WORKER_FALLBACK:
+            raise RuntimeError(f"Embedding worker {socket_path} is not reachable")
+        logger.warning("AISuggestionService: embedding worker unreachable, loading model in-process")
+        return None
+
     def _encode(self, texts: List[str]):
         if not self._use_embeddings or self._encoder is None:
             return None
         try:
             embeddings = self._encoder.encode(texts, normalize_embeddings=True, convert_to_numpy=True)
             return embeddings
+        except EmbeddingWorkerUnavailable as exc:
+            logger.warning("AISuggestionService: %s, fallback", exc)
+            self._on_worker_unavailable()
+            return None
         except Exception as exc:  # pragma: no cover
             logger.error("AISuggestionService: encode failed, fallback. Error: %s", exc)
             return None
 
-    def _rank_by_embeddings(self, topic: Topic, candidate_sets: QuerySet, top_k: int) -> List[FlashcardSet]:
-        # Chuẩn bị văn bản: chủ đề và từng bộ flashcard (tiêu đề + mô tả)
-        topic_text = f"{topic.name or ''}. {topic.description or ''}".strip()
-        set_texts: List[str] = []
-        sets_list: List[FlashcardSet] = list(candidate_sets)
-        for s in sets_list:
-            set_texts.append(f"{s.title or ''}. {s.description or ''}".strip())
+    def _on_worker_unavailable(self) -> None:
+        # Worker chết/treo sau khi đã kết nối: nạp lại ở thread nền (thử worker trước, rồi model trong process).
+        # Không cho fallback thì giữ kết nối cũ, các request sau tự thử lại worker
+        if not settings.AI_EMBEDDING_WORKER_FALLBACK:
+            return
+        with self._instance_lock:
+            if not isinstance(self._encoder, RemoteEncoder) or self.model_state != self.READY:
+                return
+            self._use_embeddings = False
+            self._encoder = None
+            self.model_state = self.NOT_LOADED
+            self._load_thread = None
+        self.start_background_load()
 
-        if not set_texts:
-            return []
+    def get_stats(self) -> dict:
+        return {
+            "model_state": self.model_state,
+            "use_embeddings": self._use_embeddings,
+            "backend": "faiss" if faiss is not None else "numpy",
+            "index_size": self.index.size,
+            "index_build_ms": self.index.build_ms,
+            "encoded_on_build": self.index.encoded_on_build,
+            "last_query_ms": self.index.last_query_ms,
+        }
+
+    def _encode_topic(self, topic: Topic) -> Optional[np.ndarray]:
+        # Cache vector chủ đề theo nội dung => tự hết hiệu lực khi đổi tên/mô tả
+        text = topic_text(topic)
+        key = f"ai:topic_embedding:{content_hash(text)}"
+        cached = cache.get(key)
+        if cached is not None:
+            return np.frombuffer(cached, dtype=np.float32)
+        topic_embeds = self._encode([text])
+        if topic_embeds is None:
+            return None
+        vector = np.asarray(topic_embeds[0], dtype=np.float32)
+        cache.set(key, vector.tobytes(), SUGGESTION_CACHE_TIMEOUT)
+        return vector
 
-        topic_embeds = self._encode([topic_text])
-        set_embeds = self._encode(set_texts)
+    def _rank_by_embeddings(self, topic: Topic, top_k: int) -> Optional[List[int]]:
+        # Kết quả chỉ đổi khi chủ đề hoặc bộ công khai đổi => cache theo (nội dung topic, top_k, phiên bản chỉ mục)
+        version = get_index_version()
+        key = suggestion_cache_key(topic_text(topic), top_k, version)
+        set_ids = cache.get(key)
+        if set_ids is not None:
+            return set_ids
 
-        if topic_embeds is None or set_embeds is None:
-            # Không thể encode => fallback
-            return self._rank_by_popularity(candidate_sets, top_k)
+        if not self._use_embeddings:
+            # Model chưa sẵn sàng => nạp nền, request này dùng xếp hạng phổ biến
+            if self.model_state == self.NOT_LOADED:
+                self.start_background_load()
+            return None
 
-        # Tính cosine similarity vì embeddings đã được normalize
-        import numpy as np  # local import để tránh hard dep khi fallback
+        # Chỉ encode chủ đề; vector các bộ flashcard lấy từ chỉ mục đã lưu
+        if not self.index.ensure_fresh(version):
+            return None
+        query = self._encode_topic(topic)
+        if query is None:
+            # Không thể encode => fallback
+            return None
 
-        query = topic_embeds[0]
-        scores = np.dot(set_embeds, query) # tính độ tương đồng
-        # Lấy top_k theo điểm giảm dần
-        top_indices = np.argsort(-scores)[:top_k]
-        ranked = [
-            {"set": sets_list[i], "score": float(scores[i])}
-            for i in top_indices
-        ]
-        return ranked
+        hits = self.index.search(query, top_k)
+        logger.debug(
+            "AISuggestionService: topic %s searched %d vectors in %.2f ms",
+            topic.pk, self.index.size, self.index.last_query_ms or 0,
+        )
+        set_ids = [set_id for set_id, score in hits if score >= MIN_SCORE]
+        cache.set(key, set_ids, SUGGESTION_CACHE_TIMEOUT)
+        return set_ids
 
     def _rank_by_popularity(self, candidate_sets: QuerySet, top_k: int) -> List[FlashcardSet]:
         # Fallback: ưu tiên nhiều lượt lưu, rating cao, mới tạo
@@ -99,13 +391,25 @@ class AISuggestionService:
         if not candidates.exists():
             return []
 
-        if self._use_embeddings:
-            ranked = self._rank_by_embeddings(topic, candidates, top_k)
-            ranked = [r for r in ranked if r["score"] >= 0.6]
-            ranked = [r["set"] for r in ranked]
-        else:
-            ranked = self._rank_by_popularity(candidates, top_k)
+        set_ids = self._rank_by_embeddings(topic, top_k)
+        if set_ids is None:
+            return self._rank_by_popularity(candidates, top_k)
+
+        sets_by_id = candidates.in_bulk(set_ids)
+        return [sets_by_id[set_id] for set_id in set_ids if set_id in sets_by_id]
+
+
+# Các trường ảnh hưởng tới nội dung/khả năng được gợi ý của một bộ flashcard
+INDEXED_SET_FIELDS = {"title", "description", "is_public"}
+
 
-        return ranked
+@receiver(post_save, sender=FlashcardSet)
+def mark_set_index_stale_on_save(sender, instance, created, update_fields=None, **kwargs):
+    # Bỏ qua các lần lưu chỉ cập nhật bộ đếm (total_cards, total_saves, average_rating...)
+    if created or update_fields is None or INDEXED_SET_FIELDS & set(update_fields):
+        bump_index_version()
 
 
+@receiver(post_delete, sender=FlashcardSet)
+def mark_set_index_stale_on_delete(sender, instance, **kwargs):
+    bump_index_version()
@@ -4,3 +4,13 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        # Đăng ký các signal receiver của service thành tích, gợi ý AI và tìm kiếm
+        from api import achievement_service, ai_suggestion, search, typeahead  # noqa: F401
+        from django.conf import settings
+
+        if settings.AI_SUGGESTION_PRELOAD:
+            ai_suggestion.AISuggestionService.preload()
+        if settings.SEARCH_SUGGEST_PRELOAD:
+            typeahead.SuggestionIndex.preload()
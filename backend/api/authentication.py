@@ -5,7 +5,9 @@ from rest_framework.exceptions import AuthenticationFailed
 from django.contrib.auth import get_user_model
 from django.conf import settings
 import os
-from cloudinary import uploader as cloudinary_uploader
+
+from api.avatar_import import AvatarImportQueue
+from api.token_cache import get_token_cache
 
 User = get_user_model()
 
@@ -32,6 +34,15 @@ class FirebaseAuthentication(BaseAuthentication):
         if firebase_token.startswith('Bearer '):
             firebase_token = firebase_token[7:]
 
+        # Token đã xác thực gần đây => bỏ qua bước kiểm tra chữ ký RSA
+        token_cache = get_token_cache()
+        cached = token_cache.get(firebase_token)
+        if cached is not None:
+            user = User.objects.filter(pk=cached[1]).first()
+            if user is not None:
+                return (user, firebase_token)
+            token_cache.discard(firebase_token)
+
         try:
             # Verify Firebase token
             decoded_token = auth.verify_id_token(firebase_token)
@@ -40,15 +51,9 @@ class FirebaseAuthentication(BaseAuthentication):
             # Get or create user
             try:
                 user = User.objects.get(username=firebase_uid)
-                # Update avatar from Firebase picture if missing
-                picture_url = decoded_token.get('picture')
-                if picture_url and not getattr(user, 'avatar', None):
-                    try:
-                        upload_result = cloudinary_uploader.upload(picture_url, folder='avatars')
-                        user.avatar = upload_result.get('public_id')
-                        user.save(update_fields=['avatar'])
-                    except Exception:
-                        pass
+                # Update avatar from Firebase picture if missing (chạy nền, không chờ upload)
+                if not getattr(user, 'avatar', None):
+                    AvatarImportQueue.enqueue(user.pk, decoded_token.get('picture'))
             except User.DoesNotExist:
                 # Create new user from Firebase data
                 user_data = {
@@ -68,15 +73,9 @@ class FirebaseAuthentication(BaseAuthentication):
                 user = User.objects.create_user(**user_data)
 
                 # Set avatar from Firebase picture if available
-                picture_url = decoded_token.get('picture')
-                if picture_url:
-                    try:
-                        upload_result = cloudinary_uploader.upload(picture_url, folder='avatars')
-                        user.avatar = upload_result.get('public_id')
-                        user.save(update_fields=['avatar'])
-                    except Exception:
-                        pass
+                AvatarImportQueue.enqueue(user.pk, decoded_token.get('picture'))
 
+            token_cache.set(firebase_token, decoded_token, user.pk)
             return (user, firebase_token)
 
         except auth.InvalidIdTokenError:
@@ -0,0 +1,104 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from cloudinary import uploader as cloudinary_uploader
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+
+from api.models import User
+
+logger = logging.getLogger(__name__)
+
+IN_FLIGHT_TIMEOUT = 5 * 60
+ATTEMPTS_TIMEOUT = 24 * 60 * 60
+BACKOFF_BASE_SECONDS = 60
+BACKOFF_MAX_SECONDS = 6 * 60 * 60
+
+
+def in_flight_key(user_id) -> str:
+    return f"avatar_import:in_flight:{user_id}"
+
+
+def backoff_key(user_id) -> str:
+    return f"avatar_import:backoff:{user_id}"
+
+
+def attempts_key(user_id) -> str:
+    return f"avatar_import:attempts:{user_id}"
+
+
+class AvatarImportQueue:
+    """Nhập ảnh đại diện Firebase lên Cloudinary ngoài luồng xác thực.
+    - enqueue() chỉ đánh dấu và đẩy job vào thread pool rồi trả về ngay.
+    - Mỗi user chỉ có 1 job đang chạy (cache.add làm cờ in-flight, dùng chung giữa các worker nếu cache là Redis).
+    - Lỗi thì chờ lùi dần (60 giây, 2 phút, 4 phút... tối đa 6 giờ) trước khi nhận job mới cho user đó.
+    - AVATAR_IMPORT_WORKERS=0 chạy ngay trong thread gọi (test/management command).
+    """
+
+    _executor: Optional[ThreadPoolExecutor] = None
+    _executor_lock = threading.Lock()
+
+    @staticmethod
+    def upload(picture_url: str) -> dict:
+        return cloudinary_uploader.upload(picture_url, folder="avatars")
+
+    @classmethod
+    def get_executor(cls) -> ThreadPoolExecutor:
+        if cls._executor is None:
+            with cls._executor_lock:
+                if cls._executor is None:
+                    cls._executor = ThreadPoolExecutor(
+                        max_workers=settings.AVATAR_IMPORT_WORKERS, thread_name_prefix="avatar-import"
+                    )
+        return cls._executor
+
+    @classmethod
+    def enqueue(cls, user_id: int, picture_url: Optional[str]) -> bool:
+        """Trả về False nếu bỏ qua (không có ảnh, đang chạy hoặc đang chờ thử lại)."""
+        if not picture_url or cache.get(backoff_key(user_id)):
+            return False
+        if not cache.add(in_flight_key(user_id), 1, IN_FLIGHT_TIMEOUT):
+            return False
+        # User mới tạo trong transaction => chỉ chạy khi đã commit để thread nền thấy được
+        transaction.on_commit(lambda: cls._submit(user_id, picture_url))
+        return True
+
+    @classmethod
+    def _submit(cls, user_id: int, picture_url: str) -> None:
+        if settings.AVATAR_IMPORT_WORKERS <= 0:
+            cls.run(user_id, picture_url)
+            return
+        cls.get_executor().submit(cls._run_in_thread, user_id, picture_url)
+
+    @classmethod
+    def _run_in_thread(cls, user_id: int, picture_url: str) -> None:
+        try:
+            cls.run(user_id, picture_url)
+        finally:
+            close_old_connections()
+
+    @classmethod
+    def run(cls, user_id: int, picture_url: str) -> bool:
+        try:
+            public_id = cls.upload(picture_url).get("public_id")
+            if not public_id:
+                raise ValueError("upload result has no public_id")
+            # Chỉ ghi nếu user vẫn chưa có avatar (có thể đã tự tải ảnh lên trong lúc chờ)
+            User.objects.filter(Q(avatar__isnull=True) | Q(avatar=""), pk=user_id).update(avatar=public_id)
+            cache.delete(attempts_key(user_id))
+            return True
+        except Exception as exc:
+            attempts = (cache.get(attempts_key(user_id)) or 0) + 1
+            delay = min(BACKOFF_BASE_SECONDS * 2 ** (attempts - 1), BACKOFF_MAX_SECONDS)
+            cache.set(attempts_key(user_id), attempts, ATTEMPTS_TIMEOUT)
+            cache.set(backoff_key(user_id), 1, delay)
+            logger.warning(
+                "AvatarImportQueue: user %s attempt %d failed, retry after %ds: %s", user_id, attempts, delay, exc
+            )
+            return False
+        finally:
+            cache.delete(in_flight_key(user_id))
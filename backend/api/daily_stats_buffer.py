@@ -0,0 +1,256 @@
+import atexit
+import logging
+import threading
+from collections import defaultdict
+from datetime import date
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import DailyStats
+
+logger = logging.getLogger(__name__)
+
+ACCURACY_FIELD = 'accuracy_rate'
+
+
+class LocalDeltaStore:
+    """Lưu delta trong bộ nhớ process; chỉ process này flush được (luồng nền của DailyStatsBuffer)."""
+
+    shared = False
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+
+    def add(self, user_id, day, deltas, accuracy_rate=None):
+        with self._lock:
+            entry = self._pending.setdefault((user_id, day), [defaultdict(int), None])
+            for field, value in deltas.items():
+                entry[0][field] += value
+            if accuracy_rate is not None:
+                entry[1] = accuracy_rate
+
+    def pending_for(self, user_id):
+        with self._lock:
+            return {
+                day: (dict(deltas), accuracy_rate)
+                for (pending_user_id, day), (deltas, accuracy_rate) in self._pending.items()
+                if pending_user_id == user_id
+            }
+
+    def drain(self, limit):
+        rows = []
+        with self._lock:
+            for key in list(self._pending)[:limit]:
+                deltas, accuracy_rate = self._pending.pop(key)
+                rows.append((*key, dict(deltas), accuracy_rate))
+        return rows
+
+
+class RedisDeltaStore:
+    """Lưu delta trong Redis (qua django-redis) để mọi worker dùng chung.
+    - Mỗi (user, ngày) là 1 hash, cộng bằng HINCRBY; key chờ ghi nằm trong 1 set chung và 1 set theo user.
+    - Ghi và lấy ra đều chạy trong MULTI nên không mất delta khi ghi song song với flush.
+    """
+
+    PREFIX = 'dailystats:pending'
+    shared = True
+    INDEX_KEY = f'{PREFIX}:index'
+
+    def __init__(self, alias='default'):
+        if not settings.CACHES[alias]['BACKEND'].startswith('django_redis.'):
+            raise ImproperlyConfigured(
+                "DAILY_STATS_BUFFER_STORE='redis' cần CACHES dùng django_redis (đặt REDIS_URL), "
+                "hoặc đặt DAILY_STATS_BUFFER_STORE='local' khi chỉ chạy 1 process"
+            )
+        from django_redis import get_redis_connection
+        self.redis = get_redis_connection(alias)
+
+    def _key(self, user_id, day):
+        return f'{self.PREFIX}:{user_id}:{day.isoformat()}'
+
+    def _user_key(self, user_id):
+        return f'{self.PREFIX}:user:{user_id}'
+
+    @staticmethod
+    def _parse(raw):
+        values = {k.decode() if isinstance(k, bytes) else k: v for k, v in raw.items()}
+        accuracy_rate = values.pop(ACCURACY_FIELD, None)
+        deltas = {field: int(value) for field, value in values.items()}
+        return deltas, float(accuracy_rate) if accuracy_rate is not None else None
+
+    def add(self, user_id, day, deltas, accuracy_rate=None):
+        key = self._key(user_id, day)
+        pipe = self.redis.pipeline(transaction=True)
+        for field, value in deltas.items():
+            if value:
+                pipe.hincrby(key, field, value)
+        if accuracy_rate is not None:
+            pipe.hset(key, ACCURACY_FIELD, accuracy_rate)
+        pipe.sadd(self.INDEX_KEY, key)
+        pipe.sadd(self._user_key(user_id), day.isoformat())
+        pipe.execute()
+
+    def pending_for(self, user_id):
+        days = sorted(
+            date.fromisoformat(day.decode() if isinstance(day, bytes) else day)
+            for day in self.redis.smembers(self._user_key(user_id))
+        )
+        pipe = self.redis.pipeline(transaction=False)
+        for day in days:
+            pipe.hgetall(self._key(user_id, day))
+        return {day: self._parse(raw) for day, raw in zip(days, pipe.execute()) if raw}
+
+    def drain(self, limit):
+        rows = []
+        for key in self.redis.spop(self.INDEX_KEY, limit) or []:
+            key = key.decode() if isinstance(key, bytes) else key
+            user_id, day = key[len(self.PREFIX) + 1:].split(':')
+            pipe = self.redis.pipeline(transaction=True)
+            pipe.hgetall(key)
+            pipe.delete(key)
+            pipe.srem(self._user_key(user_id), day)
+            raw = pipe.execute()[0]
+            if raw:
+                rows.append((int(user_id), date.fromisoformat(day), *self._parse(raw)))
+        return rows
+
+
+class DailyStatsBuffer:
+    """Ghi DailyStats kiểu write-behind (bật bằng DAILY_STATS_WRITE_BEHIND).
+    - record(): khi bật thì chỉ cộng delta vào store, không khóa dòng (user, ngày) trong DB.
+    - flush(): ghi dồn các delta vào DB theo lô, mỗi lô trong 1 transaction. Store 'redis' được flush bởi
+      manage.py flush_daily_stats --loop; store 'local' được flush bởi luồng nền trong chính process đó
+      (mỗi DAILY_STATS_LOCAL_FLUSH_INTERVAL giây và khi process thoát bình thường).
+    - merge_pending()/pending_for(): cộng delta chưa ghi khi đọc để số liệu luôn mới nhất.
+    - Đảm bảo at-most-once: drain() xóa delta khỏi store trước khi ghi DB. Ghi lỗi thì delta được trả lại store,
+      nhưng nếu process flush chết giữa drain và commit thì delta của lô đó mất (tối đa batch_size bản ghi).
+    """
+
+    _store = None
+    _store_lock = threading.Lock()
+    _flusher_stop = None
+    _exit_hook_registered = False
+
+    @staticmethod
+    def enabled():
+        return getattr(settings, 'DAILY_STATS_WRITE_BEHIND', False)
+
+    @classmethod
+    def get_store(cls):
+        if cls._store is None:
+            with cls._store_lock:
+                if cls._store is None:
+                    backend = getattr(settings, 'DAILY_STATS_BUFFER_STORE', 'local')
+                    if backend == 'redis':
+                        cls._store = RedisDeltaStore()
+                    else:
+                        cls._start_local_flusher()
+                        cls._store = LocalDeltaStore()
+        return cls._store
+
+    @classmethod
+    def reset_store(cls):
+        if cls._flusher_stop is not None:
+            cls._flusher_stop.set()
+            cls._flusher_stop = None
+        cls._store = None
+
+    @classmethod
+    def _start_local_flusher(cls):
+        # Delta trong store 'local' chỉ nằm trong process này => process này phải tự ghi xuống DB
+        interval = getattr(settings, 'DAILY_STATS_LOCAL_FLUSH_INTERVAL', 5)
+        if not interval or interval <= 0:
+            raise ImproperlyConfigured(
+                "DAILY_STATS_BUFFER_STORE='local' cần DAILY_STATS_LOCAL_FLUSH_INTERVAL > 0; "
+                "hoặc đặt REDIS_URL để dùng store 'redis' và chạy manage.py flush_daily_stats --loop"
+            )
+        stop = threading.Event()
+        threading.Thread(
+            target=cls._flush_periodically, args=(stop, interval), name='DailyStatsFlusher', daemon=True
+        ).start()
+        cls._flusher_stop = stop
+        if not cls._exit_hook_registered:
+            atexit.register(cls._flush_on_exit)
+            cls._exit_hook_registered = True
+
+    @classmethod
+    def _flush_periodically(cls, stop, interval):
+        while not stop.wait(interval):
+            cls._flush_quietly()
+
+    @classmethod
+    def _flush_on_exit(cls):
+        if cls._store is not None and not cls._store.shared:
+            cls._flush_quietly()
+
+    @classmethod
+    def _flush_quietly(cls):
+        try:
+            cls.flush()
+        except Exception:
+            pass  # flush() đã ghi log và trả delta lại store, lần sau ghi tiếp
+        finally:
+            # Kết nối DB của luồng nền không đi qua request nên phải tự đóng
+            connection.close()
+
+    @classmethod
+    def record(cls, user, day=None, accuracy_rate=None, **deltas):
+        if not cls.enabled():
+            return DailyStats.accumulate(user, day, accuracy_rate=accuracy_rate, **deltas)
+
+        DailyStats.check_counters(deltas)
+        cls.get_store().add(getattr(user, 'pk', user), day or timezone.localdate(), deltas, accuracy_rate)
+
+    @classmethod
+    def flush(cls, batch_size=500):
+        # Ghi dồn các delta đang chờ, trả về số bản ghi (user, ngày) đã ghi
+        if not cls.enabled():
+            return 0
+
+        store = cls.get_store()
+        flushed = 0
+        while True:
+            rows = store.drain(batch_size)
+            if not rows:
+                return flushed
+            try:
+                # accumulate_many chạy nhiều câu INSERT; lỗi giữa chừng phải hoàn tác cả lô trước khi trả delta lại
+                with transaction.atomic():
+                    DailyStats.accumulate_many(rows, batch_size=batch_size)
+            except Exception:
+                # Trả delta lại store để lần flush sau ghi tiếp
+                for user_id, day, deltas, accuracy_rate in rows:
+                    store.add(user_id, day, deltas, accuracy_rate)
+                logger.exception('DailyStatsBuffer: flush failed, %s rows re-queued', len(rows))
+                raise
+            flushed += len(rows)
+
+    @classmethod
+    def pending_for(cls, user):
+        if not cls.enabled():
+            return {}
+        return cls.get_store().pending_for(getattr(user, 'pk', user))
+
+    @classmethod
+    def merge_pending(cls, user, stats_list, start_date=None, end_date=None):
+        """Cộng delta chưa ghi vào danh sách DailyStats đã đọc từ DB (kể cả ngày chưa có bản ghi)."""
+        pending = cls.pending_for(user)
+        if not pending:
+            return stats_list
+
+        by_day = {stats.date: stats for stats in stats_list}
+        for day, (deltas, accuracy_rate) in pending.items():
+            if (start_date and day < start_date) or (end_date and day > end_date):
+                continue
+            stats = by_day.get(day)
+            if stats is None:
+                stats = by_day[day] = DailyStats(user=user, date=day)
+            for field, value in deltas.items():
+                setattr(stats, field, getattr(stats, field) + value)
+            if accuracy_rate is not None:
+                stats.accuracy_rate = accuracy_rate
+        return sorted(by_day.values(), key=lambda stats: stats.date, reverse=True)
@@ -0,0 +1,206 @@
+import logging
+import os
+import queue
+import socket
+import struct
+import threading
+import time
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Connection, answer_challenge, deliver_challenge
+from typing import List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def _set_socket_timeouts(sock: socket.socket, timeout: float) -> None:
+    # Connection đọc/ghi thẳng trên fd nên socket phải ở chế độ blocking => dùng SO_RCVTIMEO/SO_SNDTIMEO
+    # thay cho settimeout(); recv/send quá hạn sẽ lỗi EAGAIN (OSError)
+    seconds = int(timeout)
+    timeval = struct.pack("ll", seconds, int((timeout - seconds) * 1_000_000))
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVTIMEO, timeval)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDTIMEO, timeval)
+
+
+class _PendingEncode:
+    def __init__(self, texts: List[str]) -> None:
+        self.texts = texts
+        self.result: Optional[np.ndarray] = None
+        self.error: Optional[str] = None
+        self.done = threading.Event()
+
+
+class EmbeddingWorker:
+    """Process encode dùng chung cho mọi gunicorn worker qua Unix socket.
+    - Chỉ process này nạp torch/SBERT; các worker Django gửi văn bản và nhận vector.
+    - Các request đến gần nhau (trong max_wait_ms) được gộp thành 1 lần encode.
+    - Vòng accept chỉ nhận socket; bắt tay authkey và đọc/ghi chạy trong luồng riêng của từng kết nối với
+      timeout giây, nên 1 client treo không chặn các worker khác.
+    """
+
+    def __init__(self, encoder, address: str, authkey: bytes,
+                 max_batch_size: int = 64, max_wait_ms: float = 5, timeout: float = 5) -> None:
+        self.encoder = encoder
+        self.address = address
+        self.authkey = authkey
+        self.timeout = timeout
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.batches = 0
+        self.requests = 0
+        self._queue: "queue.Queue[_PendingEncode]" = queue.Queue()
+        self._listener: Optional[socket.socket] = None
+        self._stopped = threading.Event()
+
+    def serve_forever(self) -> None:
+        if os.path.exists(self.address):
+            os.unlink(self.address)
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(self.address)
+        listener.listen(socket.SOMAXCONN)
+        self._listener = listener
+        threading.Thread(target=self._batch_loop, name="embedding-batcher", daemon=True).start()
+        logger.info("EmbeddingWorker: listening on %s", self.address)
+        while not self._stopped.is_set():
+            try:
+                sock, _ = listener.accept()
+            except OSError:
+                # Listener đã đóng (stop)
+                continue
+            threading.Thread(target=self._handle, args=(sock,), daemon=True).start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._listener is not None:
+            try:
+                # shutdown() đánh thức accept() đang chờ, close() thì không
+                self._listener.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self._listener.close()
+            if os.path.exists(self.address):
+                os.unlink(self.address)
+
+    def _handle(self, sock: socket.socket) -> None:
+        try:
+            _set_socket_timeouts(sock, self.timeout)
+            conn = Connection(sock.detach())
+        finally:
+            sock.close()
+        try:
+            # Cùng thứ tự bắt tay với multiprocessing.connection.Listener.accept()
+            deliver_challenge(conn, self.authkey)
+            answer_challenge(conn, self.authkey)
+            while True:
+                message = conn.recv()
+                if message.get("op") == "ping":
+                    conn.send({"ok": True})
+                    continue
+                pending = _PendingEncode(list(message["texts"]))
+                self._queue.put(pending)
+                pending.done.wait()
+                if pending.error is not None:
+                    conn.send({"error": pending.error})
+                else:
+                    conn.send({"vectors": pending.result})
+        except EOFError:
+            pass
+        except (OSError, AuthenticationError) as exc:
+            # Client treo quá timeout, ngắt giữa chừng hoặc sai authkey
+            logger.warning("EmbeddingWorker: dropped connection: %s", exc)
+        finally:
+            conn.close()
+
+    def _batch_loop(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            count = len(batch[0].texts)
+            deadline = time.monotonic() + self.max_wait
+            while count < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    pending = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(pending)
+                count += len(pending.texts)
+            self._encode_batch(batch)
+
+    def _encode_batch(self, batch: List[_PendingEncode]) -> None:
+        texts = [text for pending in batch for text in pending.texts]
+        try:
+            vectors = np.asarray(
+                self.encoder.encode(texts, normalize_embeddings=True, convert_to_numpy=True),
+                dtype=np.float32,
+            )
+            offset = 0
+            for pending in batch:
+                pending.result = vectors[offset:offset + len(pending.texts)]
+                offset += len(pending.texts)
+        except Exception as exc:
+            logger.error("EmbeddingWorker: encode failed: %s", exc)
+            for pending in batch:
+                pending.error = str(exc)
+        self.batches += 1
+        self.requests += len(batch)
+        for pending in batch:
+            pending.done.set()
+
+
+class EmbeddingWorkerUnavailable(RuntimeError):
+    """Không kết nối được, hết thời gian chờ hoặc worker đóng kết nối giữa chừng."""
+
+
+class RemoteEncoder:
+    """Client gửi văn bản tới EmbeddingWorker, cùng giao diện encode() với SentenceTransformer.
+    Mọi thao tác trên socket (kết nối, bắt tay authkey, gửi, nhận) đều giới hạn bởi timeout giây.
+    """
+
+    def __init__(self, address: str, authkey: bytes, timeout: float = 5) -> None:
+        self.address = address
+        self.authkey = authkey
+        self.timeout = timeout
+
+    def _connect(self) -> Connection:
+        # Giống multiprocessing.connection.Client nhưng có timeout; với Unix socket, SO_SNDTIMEO cũng giới hạn
+        # connect() khi hàng đợi accept của worker đã đầy
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            _set_socket_timeouts(sock, self.timeout)
+            sock.connect(self.address)
+            conn = Connection(sock.detach())
+        finally:
+            sock.close()
+        try:
+            answer_challenge(conn, self.authkey)
+            deliver_challenge(conn, self.authkey)
+        except BaseException:
+            conn.close()
+            raise
+        return conn
+
+    def _request(self, message: dict) -> dict:
+        try:
+            with self._connect() as conn:
+                conn.send(message)
+                return conn.recv()
+        except (OSError, EOFError) as exc:
+            # Hết timeout (EAGAIN), worker chưa chạy hoặc chết giữa chừng
+            raise EmbeddingWorkerUnavailable(f"embedding worker {self.address}: {exc}") from exc
+
+    def ping(self) -> bool:
+        try:
+            return bool(self._request({"op": "ping"}).get("ok"))
+        except (EmbeddingWorkerUnavailable, AuthenticationError) as exc:
+            logger.warning("RemoteEncoder: worker %s unreachable: %s", self.address, exc)
+            return False
+
+    def encode(self, texts: List[str], **kwargs) -> np.ndarray:
+        # Worker luôn normalize và trả numpy, giống các tham số service đang dùng
+        response = self._request({"op": "encode", "texts": list(texts)})
+        if "error" in response:
+            raise RuntimeError(response["error"])
+        return response["vectors"]
@@ -0,0 +1,116 @@
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import StreamingHttpResponse
+
+from .models import Flashcard, UserProgress, DailyStats, GameSession
+
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+# Cột khi xuất flashcard (kèm thông tin bộ để mỗi dòng tự đủ nghĩa)
+FLASHCARD_EXPORT_FIELDS = {
+    'set_id': 'flashcard_set_id',
+    'set_title': 'flashcard_set__title',
+    'topic': 'flashcard_set__topic__name',
+    'difficulty': 'flashcard_set__difficulty',
+    'id': 'id',
+    'vietnamese': 'vietnamese',
+    'english': 'english',
+    'example_sentence_en': 'example_sentence_en',
+    'word_type': 'word_type',
+    'created_at': 'created_at',
+}
+
+# Lịch sử học của user: loại bản ghi -> (model, các trường)
+HISTORY_EXPORT_SOURCES = {
+    'progress': (UserProgress, [
+        'flashcard_id', 'flashcard__english', 'flashcard__vietnamese', 'mastery_level', 'times_reviewed',
+        'times_correct', 'last_reviewed', 'difficulty_rating', 'is_learned', 'is_difficult', 'due_at',
+    ]),
+    'daily_stats': (DailyStats, [
+        'date', 'cards_studied', 'new_words_learned', 'words_reviewed', 'time_spent',
+        'games_played', 'points_earned', 'accuracy_rate',
+    ]),
+    'game_session': (GameSession, [
+        'game_type', 'score', 'total_questions', 'correct_answers', 'time_spent', 'completed_at',
+    ]),
+}
+
+
+class _Echo:
+    # csv.writer ghi vào đây và nhận lại chuỗi để yield, không giữ buffer
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows, fieldnames):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(fieldnames)
+    for row in rows:
+        yield writer.writerow([row[field] for field in fieldnames])
+
+
+def iter_ndjson(rows):
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+def _after(keys, last, lookup):
+    # (k0, k1, ...) > (v0, v1, ...) theo thứ tự từ điển, viết bằng OR để dùng được index
+    condition = Q()
+    for position, key in enumerate(keys):
+        equal = {prior: last[index] for index, prior in enumerate(keys[:position])}
+        condition |= Q(**equal, **{f'{key}__{lookup}': last[position]})
+    return condition
+
+
+def keyset_rows(queryset, fields, keys=('pk',), descending=False, chunk_size=None):
+    """Đọc queryset.values(*fields) theo trang keyset (WHERE khóa > khóa cuối ... LIMIT chunk_size).
+    Không dùng .iterator(): mysqlclient không có server-side cursor nên vẫn tải cả kết quả vào bộ nhớ.
+    keys phải xác định duy nhất mỗi dòng (kết thúc bằng 'pk'/'id').
+    """
+    chunk_size = chunk_size or EXPORT_CHUNK_SIZE
+    lookup = 'lt' if descending else 'gt'
+    extra = [key for key in keys if key not in fields]
+    queryset = queryset.order_by(*(f'-{key}' if descending else key for key in keys)).values(*fields, *extra)
+    last = None
+    while True:
+        page = queryset if last is None else queryset.filter(_after(keys, last, lookup))
+        rows = list(page[:chunk_size])
+        for row in rows:
+            yield {field: row[field] for field in fields} if extra else row
+        if len(rows) < chunk_size:
+            return
+        last = [rows[-1][key] for key in keys]
+
+
+def flashcard_rows(flashcard_sets):
+    """Các thẻ của những bộ flashcard đã lọc, đọc theo trang keyset (bộ, id)."""
+    queryset = Flashcard.objects.filter(flashcard_set__in=flashcard_sets)
+    for row in keyset_rows(queryset, list(FLASHCARD_EXPORT_FIELDS.values()), keys=('flashcard_set_id', 'id')):
+        yield {name: row[lookup] for name, lookup in FLASHCARD_EXPORT_FIELDS.items()}
+
+
+def history_rows(user):
+    """Tiến trình, thống kê ngày và lịch sử game của user, mỗi bản ghi có trường 'type'."""
+    for record_type, (model, fields) in HISTORY_EXPORT_SOURCES.items():
+        for row in keyset_rows(model.objects.filter(user=user), fields):
+            yield {'type': record_type, **row}
+
+
+def export_flashcards(flashcard_sets, file_format):
+    if file_format == 'csv':
+        return iter_csv(flashcard_rows(flashcard_sets), list(FLASHCARD_EXPORT_FIELDS))
+    return iter_ndjson(flashcard_rows(flashcard_sets))
+
+
+def streaming_export_response(chunks, file_format, filename):
+    response = StreamingHttpResponse(chunks, content_type=EXPORT_FORMATS[file_format])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{file_format}"'
+    return response
@@ -0,0 +1,134 @@
+import csv
+import io
+import json
+import os
+
+from django.db import transaction
+
+from .models import Flashcard, FlashcardSet, SearchIndexChange
+from .search import record_search_change
+from .typeahead import SuggestionIndex
+
+
+class FlashcardImportError(Exception):
+    """Lỗi làm hỏng cả file (sai định dạng, thiếu cột bắt buộc)."""
+
+
+class FlashcardImporter:
+    """Nhập flashcard hàng loạt từ CSV/TSV/JSON lines.
+    - Đọc và kiểm tra từng dòng, không nạp cả file vào bộ nhớ.
+    - Ghi bằng bulk_create theo chunk (không phát post_save cho từng thẻ), cộng total_cards 1 lần.
+    - Dòng lỗi bị bỏ qua và được báo lại theo số dòng.
+    """
+
+    FORMATS = ('csv', 'tsv', 'jsonl')
+    EXTENSIONS = {'.csv': 'csv', '.tsv': 'tsv', '.jsonl': 'jsonl', '.ndjson': 'jsonl', '.json': 'jsonl'}
+    FIELDS = ('vietnamese', 'english', 'example_sentence_en', 'word_type')
+    REQUIRED_FIELDS = ('vietnamese', 'english')
+
+    def __init__(self, flashcard_set, chunk_size=1000, max_reported_errors=100):
+        self.flashcard_set = flashcard_set
+        self.chunk_size = chunk_size
+        self.max_reported_errors = max_reported_errors
+        self.max_lengths = {
+            field: Flashcard._meta.get_field(field).max_length for field in self.FIELDS
+        }
+        self.word_types = {value for value, _ in Flashcard._meta.get_field('word_type').choices}
+
+    @classmethod
+    def detect_format(cls, filename=None, requested=None):
+        fmt = (requested or cls.EXTENSIONS.get(os.path.splitext(filename or '')[1].lower(), '')).lower()
+        if fmt not in cls.FORMATS:
+            raise FlashcardImportError(f"Định dạng không hỗ trợ, chọn một trong: {', '.join(cls.FORMATS)}")
+        return fmt
+
+    def iter_rows(self, binary_stream, fmt):
+        # Trả về (số dòng, dict dữ liệu hoặc None, thông báo lỗi phân tích)
+        text = io.TextIOWrapper(binary_stream, encoding='utf-8-sig', newline='')
+        if fmt == 'jsonl':
+            for line_number, line in enumerate(text, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    data = json.loads(line)
+                except ValueError:
+                    yield line_number, None, 'JSON không hợp lệ'
+                    continue
+                if not isinstance(data, dict):
+                    yield line_number, None, 'Mỗi dòng phải là 1 object JSON'
+                    continue
+                yield line_number, data, None
+            return
+
+        reader = csv.DictReader(text, delimiter='\t' if fmt == 'tsv' else ',')
+        missing = [field for field in self.REQUIRED_FIELDS if field not in (reader.fieldnames or [])]
+        if missing:
+            raise FlashcardImportError(f"Thiếu cột bắt buộc: {', '.join(missing)}")
+        for data in reader:
+            # Dòng header là dòng 1
+            yield reader.line_num, data, None
+
+    def _safe_rows(self, binary_stream, fmt):
+        # Lỗi mã hóa/CSV hỏng giữa chừng làm hủy cả lần nhập (transaction được hoàn tác)
+        try:
+            yield from self.iter_rows(binary_stream, fmt)
+        except (UnicodeDecodeError, csv.Error) as exc:
+            raise FlashcardImportError(f'Không đọc được file: {exc}')
+
+    def validate(self, data):
+        values = {}
+        errors = {}
+        for field in self.FIELDS:
+            value = data.get(field)
+            value = '' if value is None else str(value).strip()
+            if not value and field in self.REQUIRED_FIELDS:
+                errors[field] = 'Trường này là bắt buộc'
+            elif self.max_lengths[field] and len(value) > self.max_lengths[field]:
+                errors[field] = f'Tối đa {self.max_lengths[field]} ký tự'
+            values[field] = value
+        if values['word_type'] and values['word_type'] not in self.word_types:
+            errors['word_type'] = f"Giá trị không hợp lệ, chọn một trong: {', '.join(sorted(self.word_types))}"
+        if errors:
+            return None, errors
+        flashcard = Flashcard(flashcard_set=self.flashcard_set, **values)
+        flashcard.refresh_search_text()
+        return flashcard, None
+
+    def run(self, binary_stream, fmt):
+        created = 0
+        error_count = 0
+        errors = []
+        chunk = []
+
+        with transaction.atomic():
+            for line_number, data, parse_error in self._safe_rows(binary_stream, fmt):
+                flashcard, row_errors = (None, {'row': parse_error}) if parse_error else self.validate(data)
+                if row_errors:
+                    error_count += 1
+                    if len(errors) < self.max_reported_errors:
+                        errors.append({'line': line_number, 'errors': row_errors})
+                    continue
+
+                chunk.append(flashcard)
+                if len(chunk) >= self.chunk_size:
+                    Flashcard.objects.bulk_create(chunk)
+                    SuggestionIndex.record_new_cards(chunk)
+                    created += len(chunk)
+                    chunk = []
+
+            if chunk:
+                Flashcard.objects.bulk_create(chunk)
+                SuggestionIndex.record_new_cards(chunk)
+                created += len(chunk)
+
+            # bulk_create không phát post_save nên cộng bộ đếm 1 lần cho cả file
+            FlashcardSet.apply_counter_deltas(self.flashcard_set.pk, cards=created)
+            if created:
+                record_search_change(SearchIndexChange.SET_CARDS, self.flashcard_set.pk)
+
+        return {
+            'created': created,
+            'error_count': error_count,
+            'errors': errors,
+            'errors_truncated': error_count > len(errors),
+        }
@@ -0,0 +1,136 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Q, F, Max, Count
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import GameSession, LeaderboardEntry
+
+
+class LeaderboardService:
+    """Bảng xếp hạng game lưu sẵn theo (loại game, khung thời gian, kỳ).
+    - Mỗi GameSession mới chỉ cập nhật vài dòng LeaderboardEntry của chính user đó.
+    - Top N đọc 1 query có join user, hạng của user đếm trên index (game_type, window, period, best_score).
+    """
+
+    WINDOWS = [choice[0] for choice in LeaderboardEntry.WINDOW_CHOICES]
+
+    @staticmethod
+    def period_for(window, day=None):
+        day = day or timezone.localdate()
+        if window == 'daily':
+            return day.isoformat()
+        if window == 'weekly':
+            year, week, _ = day.isocalendar()
+            return f'{year}-W{week:02d}'
+        return 'all'
+
+    @staticmethod
+    def _keys_for(game_type, day=None):
+        return [
+            (key, window, LeaderboardService.period_for(window, day))
+            for key in (game_type, LeaderboardEntry.ALL_GAMES)
+            for window in LeaderboardService.WINDOWS
+        ]
+
+    @staticmethod
+    def _key_filter(keys):
+        condition = Q()
+        for game_type, window, period in keys:
+            condition |= Q(game_type=game_type, window=window, period=period)
+        return condition
+
+    @staticmethod
+    def record_game(game_session):
+        # Cập nhật điểm cao nhất/số ván cho mọi khung thời gian bằng 1 UPDATE, chỉ INSERT khi sang kỳ mới
+        keys = LeaderboardService._keys_for(game_session.game_type)
+        with transaction.atomic():
+            updated = LeaderboardEntry.objects.filter(
+                LeaderboardService._key_filter(keys), user_id=game_session.user_id
+            ).update(
+                best_score=Greatest(F('best_score'), game_session.score),
+                total_games=F('total_games') + 1,
+                updated_at=timezone.now(),
+            )
+            if updated == len(keys):
+                return
+            # Không biết UPDATE đã khớp những dòng nào (request khác có thể vừa tạo dòng) => hủy nó,
+            # rồi cộng lại cho mọi dòng bằng 1 upsert để ván này được tính đúng 1 lần
+            transaction.set_rollback(True)
+
+        # Sang kỳ mới => xóa các dòng ngày/tuần đã qua của user này (không còn endpoint nào đọc)
+        LeaderboardService.prune_stale_periods(user_id=game_session.user_id)
+        LeaderboardEntry.upsert_scores(game_session.user_id, keys, game_session.score)
+
+    @staticmethod
+    def _board(game_type=None, window='all_time'):
+        return LeaderboardEntry.objects.filter(
+            game_type=game_type or LeaderboardEntry.ALL_GAMES,
+            window=window,
+            period=LeaderboardService.period_for(window),
+        )
+
+    @staticmethod
+    def prune_stale_periods(user_id=None, day=None):
+        # Dòng 'daily'/'weekly' chỉ được đọc trong kỳ hiện tại; các kỳ cũ chỉ làm bảng phình ra
+        stale = Q()
+        for window in ('daily', 'weekly'):
+            stale |= Q(window=window) & ~Q(period=LeaderboardService.period_for(window, day))
+        entries = LeaderboardEntry.objects.filter(stale)
+        if user_id is not None:
+            entries = entries.filter(user_id=user_id)
+        deleted, _ = entries.delete()
+        return deleted
+
+    # Cùng điểm thì user_id nhỏ hơn đứng trước; get_top và get_user_rank phải dùng chung thứ tự này
+    RANK_ORDER = ('-best_score', 'user_id')
+
+    @staticmethod
+    def get_top(game_type=None, window='all_time', limit=10):
+        return list(
+            LeaderboardService._board(game_type, window)
+            .select_related('user')
+            .order_by(*LeaderboardService.RANK_ORDER)[:limit]
+        )
+
+    @staticmethod
+    def get_user_rank(user, game_type=None, window='all_time'):
+        board = LeaderboardService._board(game_type, window)
+        entry = board.filter(user=user).first()
+        if entry is None:
+            return None
+        # Hạng = số người đứng trước theo RANK_ORDER + 1 (quét khoảng trên index, không aggregate cả bảng)
+        ahead = Q(best_score__gt=entry.best_score) | Q(best_score=entry.best_score, user_id__lt=entry.user_id)
+        entry.rank = board.filter(ahead).count() + 1
+        return entry
+
+    @staticmethod
+    def rebuild():
+        # Dựng lại toàn bộ bảng xếp hạng từ lịch sử GameSession
+        with transaction.atomic():
+            LeaderboardEntry.objects.all().delete()
+            today = timezone.localdate()
+            week_start = today - timedelta(days=today.weekday())
+            since = {
+                'all_time': None,
+                'weekly': week_start,
+                'daily': today,
+            }
+            entries = []
+            for window, start in since.items():
+                sessions = GameSession.objects.order_by()
+                if start is not None:
+                    sessions = sessions.filter(completed_at__date__gte=start)
+                period = LeaderboardService.period_for(window, today)
+                for by_type in (True, False):
+                    fields = ['user_id', 'game_type'] if by_type else ['user_id']
+                    for row in sessions.values(*fields).annotate(best=Max('score'), games=Count('id')):
+                        entries.append(LeaderboardEntry(
+                            user_id=row['user_id'],
+                            game_type=row['game_type'] if by_type else LeaderboardEntry.ALL_GAMES,
+                            window=window, period=period,
+                            best_score=row['best'], total_games=row['games'],
+                        ))
+            LeaderboardEntry.objects.bulk_create(entries, batch_size=1000)
+        return len(entries)
@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from api.achievement_service import AchievementService, AchievementEvent
+from api.models import User
+
+
+class Command(BaseCommand):
+    help = 'So sánh số query và thời gian giữa kiểm tra toàn bộ thành tích và engine theo sự kiện'
+
+    def add_arguments(self, parser):
+        parser.add_argument('user_id', type=int)
+        parser.add_argument('--iterations', type=int, default=20)
+
+    def _measure(self, iterations, func):
+        # Chạy trong transaction rồi rollback để không thay đổi dữ liệu thật
+        queries = 0
+        started = time.perf_counter()
+        with transaction.atomic():
+            for _ in range(iterations):
+                with CaptureQueriesContext(connection) as ctx:
+                    func()
+                queries += len(ctx.captured_queries)
+            transaction.set_rollback(True)
+        elapsed = time.perf_counter() - started
+        return queries / iterations, elapsed / iterations * 1000
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(id=options['user_id'])
+        except User.DoesNotExist:
+            raise CommandError('User không tồn tại')
+
+        iterations = options['iterations']
+        AchievementService._get_stats(user)
+
+        results = [
+            ('check_and_award_achievements', lambda: AchievementService.check_and_award_achievements(user)),
+            ('handle_event(card_reviewed)', lambda: AchievementService.handle_event(
+                user, AchievementEvent.CARD_REVIEWED, delta=0)),
+            ('handle_event(game_finished)', lambda: AchievementService.handle_event(
+                user, AchievementEvent.GAME_FINISHED)),
+            ('handle_event(set_saved)', lambda: AchievementService.handle_event(
+                user, AchievementEvent.SET_SAVED)),
+        ]
+        for name, func in results:
+            queries, ms = self._measure(iterations, func)
+            self.stdout.write(f'{name:32} {queries:8.1f} queries/lần {ms:10.2f} ms/lần')
@@ -0,0 +1,47 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+
+from api.token_cache import get_token_cache
+
+
+class Command(BaseCommand):
+    help = 'Đo số request/giây của FirebaseAuthentication khi bật và tắt cache token đã xác thực'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--token', default=os.getenv('FIREBASE_BENCHMARK_TOKEN'),
+                            help='Firebase ID token còn hạn (mặc định lấy từ FIREBASE_BENCHMARK_TOKEN)')
+        parser.add_argument('--requests', type=int, default=200)
+
+    def _measure(self, authentication, request, count):
+        started = time.perf_counter()
+        for _ in range(count):
+            authentication.authenticate(request)
+        elapsed = time.perf_counter() - started
+        return count / elapsed, elapsed / count * 1000
+
+    def handle(self, *args, **options):
+        if not options['token']:
+            raise CommandError('Cần --token hoặc biến môi trường FIREBASE_BENCHMARK_TOKEN')
+
+        from api.authentication import FirebaseAuthentication
+
+        authentication = FirebaseAuthentication()
+        request = RequestFactory().get('/', HTTP_FIREBASE_TOKEN=options['token'])
+        token_cache = get_token_cache()
+        configured_size = token_cache.max_entries
+
+        # Lần đầu có thể tạo user và tải chứng chỉ của Google, không tính vào kết quả
+        authentication.authenticate(request)
+
+        try:
+            for name, max_entries in (('không cache', 0), ('có cache', configured_size or 10000)):
+                token_cache.clear()
+                token_cache.max_entries = max_entries
+                rps, ms = self._measure(authentication, request, options['requests'])
+                self.stdout.write(f'{name:12} {rps:10.1f} req/s {ms:10.3f} ms/req')
+            self.stdout.write(f'cache: {token_cache.stats()}')
+        finally:
+            token_cache.max_entries = configured_size
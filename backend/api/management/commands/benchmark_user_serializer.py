@@ -0,0 +1,58 @@
+import time
+
+from cloudinary import CloudinaryResource
+from django.core.management.base import BaseCommand
+
+from api import models
+from api.models import User
+from api.serializers import UserSerializer
+
+
+class Command(BaseCommand):
+    help = 'Đo thời gian serialize N user có avatar: dựng URL mỗi lần so với URL đã nhớ theo public_id'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--iterations', type=int, default=10)
+        parser.add_argument('--distinct-avatars', type=int, default=None,
+                            help='Số avatar khác nhau (mặc định mỗi user 1 avatar)')
+
+    def _measure(self, iterations, func):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        return (time.perf_counter() - started) / iterations * 1000
+
+    def handle(self, *args, **options):
+        distinct = options['distinct_avatars'] or options['users']
+        # User trong bộ nhớ, không chạm DB: chỉ đo phần serialize
+        users = [
+            User(id=i, username=f'user{i}', avatar=CloudinaryResource(
+                f'avatars/user{i % distinct}', format='jpg', version=1700000000 + i % distinct, resource_type='image'
+            ))
+            for i in range(options['users'])
+        ]
+        iterations = options['iterations']
+
+        def uncached():
+            # Cách cũ: mỗi user gọi avatar.url (UserSerializer cũ gọi 3 lần/user)
+            for user in users:
+                for _ in range(3):
+                    user.avatar.url
+
+        def cold():
+            models._cloudinary_url.cache_clear()
+            UserSerializer(users, many=True).data
+
+        def warm():
+            UserSerializer(users, many=True).data
+
+        warm()
+        results = [
+            ('avatar.url x3 (cách cũ)', self._measure(iterations, uncached)),
+            ('serialize, cache rỗng', self._measure(iterations, cold)),
+            ('serialize, cache đã có', self._measure(iterations, warm)),
+        ]
+        for name, ms in results:
+            self.stdout.write(f'{name:28} {ms:10.2f} ms / {len(users)} user')
+        self.stdout.write(f'cache: {models._cloudinary_url.cache_info()}')
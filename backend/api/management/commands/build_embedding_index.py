@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from api.ai_suggestion import AISuggestionService
+
+
+class Command(BaseCommand):
+    help = 'Encode các bộ flashcard công khai chưa có embedding và báo thời gian dựng chỉ mục'
+
+    def handle(self, *args, **options):
+        service = AISuggestionService.get_instance()
+        if not service.load_model():
+            self.stdout.write(self.style.WARNING('Không nạp được model SBERT'))
+            return
+        if not service.index.ensure_fresh():
+            self.stdout.write(self.style.WARNING('Không dựng được chỉ mục'))
+            return
+
+        stats = service.get_stats()
+        self.stdout.write(self.style.SUCCESS(
+            f"Đã dựng chỉ mục {stats['index_size']} vector ({stats['backend']}), "
+            f"encode mới {stats['encoded_on_build']} bộ trong {stats['index_build_ms']:.1f} ms"
+        ))
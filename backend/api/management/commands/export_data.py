@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.exporters import EXPORT_FORMATS, export_flashcards, history_rows, iter_ndjson
+from api.models import FlashcardSet, User
+
+
+class Command(BaseCommand):
+    help = 'Xuất flashcard (CSV/NDJSON) hoặc lịch sử học của user (NDJSON), ghi dần ra file/stdout'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=['sets', 'history'])
+        parser.add_argument('--file-format', choices=list(EXPORT_FORMATS), default='csv',
+                            help='Định dạng khi xuất sets (history luôn là NDJSON)')
+        parser.add_argument('--set', type=int, action='append', help='Chỉ xuất bộ có id này (lặp lại được)')
+        parser.add_argument('--topic', type=int, help='Chỉ xuất các bộ thuộc chủ đề này')
+        parser.add_argument('--user', type=int, help='User cần xuất lịch sử (bắt buộc với history)')
+        parser.add_argument('--output', help='Đường dẫn file, mặc định ghi ra stdout')
+
+    def handle(self, *args, **options):
+        if options['kind'] == 'sets':
+            flashcard_sets = FlashcardSet.objects.all()
+            if options['set']:
+                flashcard_sets = flashcard_sets.filter(id__in=options['set'])
+            if options['topic']:
+                flashcard_sets = flashcard_sets.filter(topic_id=options['topic'])
+            chunks = export_flashcards(flashcard_sets, options['file_format'])
+        else:
+            if not options['user']:
+                raise CommandError('Cần --user khi xuất history')
+            user = User.objects.filter(pk=options['user']).first()
+            if user is None:
+                raise CommandError(f"Không tìm thấy user {options['user']}")
+            chunks = iter_ndjson(history_rows(user))
+
+        if not options['output']:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+
+        with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+            for chunk in chunks:
+                output.write(chunk)
+        self.stderr.write(self.style.SUCCESS(f"Đã xuất ra {options['output']}"))
@@ -0,0 +1,42 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from api.daily_stats_buffer import DailyStatsBuffer
+
+
+class Command(BaseCommand):
+    help = 'Ghi dồn các delta DailyStats đang chờ (chế độ DAILY_STATS_WRITE_BEHIND) xuống DB'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Chạy liên tục, flush sau mỗi --interval giây')
+        parser.add_argument('--interval', type=float, default=5)
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        if not DailyStatsBuffer.enabled():
+            raise CommandError('DAILY_STATS_WRITE_BEHIND đang tắt, không có gì để flush')
+        # Store 'local' nằm trong bộ nhớ của từng web worker, process này không đọc được
+        if getattr(settings, 'DAILY_STATS_BUFFER_STORE', 'local') != 'redis':
+            raise CommandError(
+                "DAILY_STATS_BUFFER_STORE='local' được mỗi worker tự flush; đặt REDIS_URL để dùng store chung"
+            )
+
+        if not options['loop']:
+            flushed = DailyStatsBuffer.flush(batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Đã ghi {flushed} bản ghi thống kê'))
+            return
+
+        self.stdout.write(self.style.SUCCESS(f"Flush DailyStats mỗi {options['interval']} giây"))
+        try:
+            while True:
+                close_old_connections()
+                flushed = DailyStatsBuffer.flush(batch_size=options['batch_size'])
+                if flushed:
+                    self.stdout.write(f'Đã ghi {flushed} bản ghi thống kê')
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            # Ghi nốt phần còn lại trước khi thoát
+            DailyStatsBuffer.flush(batch_size=options['batch_size'])
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from api.leaderboard_service import LeaderboardService
+
+
+class Command(BaseCommand):
+    help = 'Dựng lại bảng xếp hạng game (hôm nay, tuần này, mọi thời điểm) từ lịch sử GameSession'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--prune-only', action='store_true',
+            help='Chỉ xóa các dòng ngày/tuần của kỳ đã qua (chạy định kỳ, ví dụ cron mỗi ngày)'
+        )
+
+    def handle(self, *args, **options):
+        if options['prune_only']:
+            deleted = LeaderboardService.prune_stale_periods()
+            self.stdout.write(self.style.SUCCESS(f'Đã xóa {deleted} dòng bảng xếp hạng của kỳ cũ'))
+            return
+        count = LeaderboardService.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Đã tạo {count} dòng bảng xếp hạng'))
@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Sum
+
+from api.models import User, UserStats, UserProgress
+
+
+class Command(BaseCommand):
+    help = 'Đếm lại bộ đếm UserStats từ dữ liệu gốc để sửa sai lệch'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, help='Chỉ đếm lại cho user có id này')
+        parser.add_argument(
+            '--reviews-only', action='store_true',
+            help='Chỉ đếm lại tổng số lần ôn/đúng từ UserProgress (1 truy vấn GROUP BY)'
+        )
+
+    def handle(self, *args, **options):
+        if options['reviews_only']:
+            return self._rebuild_review_totals(options['user'])
+
+        users = User.objects.all()
+        if options['user']:
+            users = users.filter(id=options['user'])
+
+        count = 0
+        for user in users.iterator(chunk_size=500):
+            UserStats.rebuild_for(user)
+            count += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Đã đếm lại thống kê cho {count} người dùng'))
+
+    def _rebuild_review_totals(self, user_id):
+        stats_qs = UserStats.objects.all()
+        progress_qs = UserProgress.objects.all()
+        if user_id:
+            stats_qs = stats_qs.filter(user_id=user_id)
+            progress_qs = progress_qs.filter(user_id=user_id)
+
+        totals = {
+            row['user_id']: row
+            for row in progress_qs.values('user_id').order_by().annotate(
+                total_reviewed=Sum('times_reviewed'), total_correct=Sum('times_correct')
+            )
+        }
+
+        # Chỉ ghi lại những bản ghi bị lệch
+        drifted = []
+        for stats in stats_qs.iterator(chunk_size=500):
+            row = totals.get(stats.user_id, {})
+            total_reviewed = row.get('total_reviewed') or 0
+            total_correct = row.get('total_correct') or 0
+            if (stats.total_reviewed, stats.total_correct) != (total_reviewed, total_correct):
+                stats.total_reviewed = total_reviewed
+                stats.total_correct = total_correct
+                drifted.append(stats)
+        UserStats.objects.bulk_update(drifted, ['total_reviewed', 'total_correct'], batch_size=500)
+
+        self.stdout.write(self.style.SUCCESS(f'Đã sửa tổng số lần ôn tập cho {len(drifted)} người dùng'))
@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from api.models import FlashcardSet, Flashcard, SavedFlashcardSet
+
+
+class Command(BaseCommand):
+    help = 'Đếm lại total_cards/total_saves/rating_sum/rating_count của FlashcardSet để sửa sai lệch'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--set', type=int, help='Chỉ đếm lại cho bộ flashcard có id này')
+        parser.add_argument('--dry-run', action='store_true', help='Chỉ báo cáo, không ghi')
+
+    @staticmethod
+    def _subquery(queryset, aggregate):
+        # Đếm theo từng bộ trong 1 truy vấn con tương quan
+        return Coalesce(Subquery(
+            queryset.filter(flashcard_set=OuterRef('pk')).order_by().values('flashcard_set')
+            .annotate(value=aggregate).values('value'),
+            output_field=IntegerField()
+        ), Value(0))
+
+    def handle(self, *args, **options):
+        sets = FlashcardSet.objects.all()
+        if options['set']:
+            sets = sets.filter(id=options['set'])
+
+        rated = SavedFlashcardSet.objects.filter(rating__isnull=False)
+        sets = sets.annotate(
+            actual_cards=self._subquery(Flashcard.objects.all(), Count('id')),
+            actual_saves=self._subquery(SavedFlashcardSet.objects.all(), Count('id')),
+            actual_rating_sum=self._subquery(rated, Sum('rating')),
+            actual_rating_count=self._subquery(rated, Count('id')),
+        ).only(*FlashcardSet.COUNTER_FIELDS)
+
+        drifted = []
+        for flashcard_set in sets.iterator(chunk_size=500):
+            actual = (
+                flashcard_set.actual_cards, flashcard_set.actual_saves,
+                flashcard_set.actual_rating_sum, flashcard_set.actual_rating_count,
+            )
+            stored = (
+                flashcard_set.total_cards, flashcard_set.total_saves,
+                flashcard_set.rating_sum, flashcard_set.rating_count,
+            )
+            if actual == stored:
+                continue
+            (flashcard_set.total_cards, flashcard_set.total_saves,
+             flashcard_set.rating_sum, flashcard_set.rating_count) = actual
+            flashcard_set.average_rating = (
+                round(flashcard_set.rating_sum / flashcard_set.rating_count, 1) if flashcard_set.rating_count else 0.0
+            )
+            drifted.append(flashcard_set)
+            self.stdout.write(f'Bộ #{flashcard_set.pk}: {stored} -> {actual}')
+
+        if not options['dry_run']:
+            # bulk_update không phát post_save nên không làm index gợi ý bị đánh dấu cũ
+            FlashcardSet.objects.bulk_update(drifted, FlashcardSet.COUNTER_FIELDS, batch_size=500)
+
+        self.stdout.write(self.style.SUCCESS(f'Đã sửa bộ đếm cho {len(drifted)} bộ flashcard'))
@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.ai_suggestion import load_sentence_transformer, worker_authkey
+from api.embedding_worker import EmbeddingWorker
+
+
+class Command(BaseCommand):
+    help = 'Chạy process encode SBERT dùng chung cho các gunicorn worker qua Unix socket'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--socket', default=settings.AI_EMBEDDING_WORKER_SOCKET,
+                            help='Đường dẫn Unix socket (mặc định AI_EMBEDDING_WORKER_SOCKET)')
+        parser.add_argument('--max-batch-size', type=int, default=64)
+        parser.add_argument('--max-wait-ms', type=float, default=5)
+        parser.add_argument('--timeout', type=float, default=settings.AI_EMBEDDING_WORKER_TIMEOUT,
+                            help='Số giây tối đa cho bắt tay/đọc/ghi của mỗi kết nối (mặc định AI_EMBEDDING_WORKER_TIMEOUT)')
+
+    def handle(self, *args, **options):
+        if not options['socket']:
+            raise CommandError('Cần --socket hoặc biến môi trường AI_EMBEDDING_WORKER_SOCKET')
+
+        encoder = load_sentence_transformer()
+        worker = EmbeddingWorker(
+            encoder, options['socket'], worker_authkey(),
+            max_batch_size=options['max_batch_size'], max_wait_ms=options['max_wait_ms'], timeout=options['timeout'],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Embedding worker đang lắng nghe tại {options['socket']}"))
+        try:
+            worker.serve_forever()
+        except KeyboardInterrupt:
+            worker.stop()
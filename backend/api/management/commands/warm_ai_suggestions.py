@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.ai_suggestion import AISuggestionService, MAX_TOP_K, is_shared_cache
+from api.models import Topic
+
+
+class Command(BaseCommand):
+    help = 'Tính trước và cache gợi ý AI cho tất cả chủ đề đang hoạt động'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, nargs='+', default=[10],
+                            help='Các giá trị limit cần cache (mặc định 10)')
+
+    def handle(self, *args, **options):
+        # Cache riêng của process này mất khi lệnh kết thúc => web worker không bao giờ đọc được
+        if not is_shared_cache():
+            raise CommandError('CACHES đang dùng cache trong process; đặt REDIS_URL để các worker dùng chung cache')
+        service = AISuggestionService.get_instance()
+        if not service.load_model():
+            self.stdout.write(self.style.WARNING('Không nạp được model SBERT'))
+            return
+        top_ks = sorted({max(1, min(MAX_TOP_K, k)) for k in options['top_k']})
+
+        started = time.perf_counter()
+        topics = 0
+        for topic in Topic.objects.filter(is_active=True).iterator():
+            for top_k in top_ks:
+                service.suggest_sets_for_topic(topic, top_k=top_k)
+            topics += 1
+        elapsed = time.perf_counter() - started
+
+        stats = service.get_stats()
+        self.stdout.write(self.style.SUCCESS(
+            f"Đã cache gợi ý cho {topics} chủ đề x {len(top_ks)} limit trong {elapsed:.2f} s "
+            f"(chỉ mục {stats['index_size']} vector, dựng trong {stats['index_build_ms'] or 0:.1f} ms)"
+        ))
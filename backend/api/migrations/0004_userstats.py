@@ -0,0 +1,30 @@
+# Generated by Django 5.1.6 on 2026-10-17 01:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_user_role'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('words_learned', models.IntegerField(default=0, verbose_name='Số từ đã học')),
+                ('games_played', models.IntegerField(default=0, verbose_name='Số game đã chơi')),
+                ('sets_saved', models.IntegerField(default=0, verbose_name='Số bộ đã lưu')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to=settings.AUTH_USER_MODEL, verbose_name='Người dùng')),
+            ],
+            options={
+                'verbose_name': 'Thống kê người dùng',
+                'verbose_name_plural': 'Thống kê người dùng',
+            },
+        ),
+    ]
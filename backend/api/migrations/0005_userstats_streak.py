@@ -0,0 +1,23 @@
+# Generated by Django 5.1.6 on 2026-10-17 01:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_userstats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userstats',
+            name='current_streak',
+            field=models.IntegerField(default=0, verbose_name='Chuỗi ngày học hiện tại'),
+        ),
+        migrations.AddField(
+            model_name='userstats',
+            name='last_active_date',
+            field=models.DateField(blank=True, null=True, verbose_name='Ngày học gần nhất'),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.1.6 on 2026-10-17 01:36
+
+from datetime import timedelta
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max
+from django.utils import timezone
+
+
+def backfill_leaderboard(apps, schema_editor):
+    # Giống LeaderboardService.rebuild() nhưng dùng model lịch sử của migration
+    GameSession = apps.get_model('api', 'GameSession')
+    LeaderboardEntry = apps.get_model('api', 'LeaderboardEntry')
+    today = timezone.localdate()
+    year, week, _ = today.isocalendar()
+    windows = [
+        ('all_time', 'all', None),
+        ('weekly', f'{year}-W{week:02d}', today - timedelta(days=today.weekday())),
+        ('daily', today.isoformat(), today),
+    ]
+    entries = []
+    for window, period, start in windows:
+        sessions = GameSession.objects.order_by()
+        if start is not None:
+            sessions = sessions.filter(completed_at__date__gte=start)
+        for fields in (['user_id', 'game_type'], ['user_id']):
+            for row in sessions.values(*fields).annotate(best=Max('score'), games=Count('id')):
+                entries.append(LeaderboardEntry(
+                    user_id=row['user_id'], game_type=row.get('game_type', 'all'),
+                    window=window, period=period, best_score=row['best'], total_games=row['games'],
+                ))
+    LeaderboardEntry.objects.bulk_create(entries, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_userstats_streak'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('game_type', models.CharField(max_length=20, verbose_name='Loại game')),
+                ('window', models.CharField(choices=[('daily', 'Hôm nay'), ('weekly', 'Tuần này'), ('all_time', 'Mọi thời điểm')], max_length=10, verbose_name='Khung thời gian')),
+                ('period', models.CharField(max_length=10, verbose_name='Kỳ')),
+                ('best_score', models.IntegerField(default=0, verbose_name='Điểm cao nhất')),
+                ('total_games', models.IntegerField(default=0, verbose_name='Số ván')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Người chơi')),
+            ],
+            options={
+                'verbose_name': 'Bảng xếp hạng',
+                'verbose_name_plural': 'Bảng xếp hạng',
+                'indexes': [models.Index(fields=['game_type', 'window', 'period', '-best_score'], name='api_leaderb_game_ty_e32e19_idx')],
+                'unique_together': {('game_type', 'window', 'period', 'user')},
+            },
+        ),
+        migrations.RunPython(backfill_leaderboard, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.6 on 2026-10-17 01:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_leaderboardentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FlashcardSetEmbedding',
+            fields=[
+                ('flashcard_set', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='embedding', serialize=False, to='api.flashcardset')),
+                ('content_hash', models.CharField(max_length=64, verbose_name='Mã băm nội dung')),
+                ('vector', models.BinaryField(verbose_name='Vector (float32)')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Embedding bộ flashcard',
+                'verbose_name_plural': 'Embedding bộ flashcard',
+            },
+        ),
+    ]
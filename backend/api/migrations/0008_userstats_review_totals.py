@@ -0,0 +1,39 @@
+# Generated by Django 5.1.6 on 2026-10-17 01:45
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def backfill_review_totals(apps, schema_editor):
+    # Điền tổng số lần ôn/đúng cho các bản ghi UserStats đã có
+    UserStats = apps.get_model('api', 'UserStats')
+    UserProgress = apps.get_model('api', 'UserProgress')
+    totals = UserProgress.objects.values('user_id').order_by().annotate(
+        total_reviewed=Sum('times_reviewed'), total_correct=Sum('times_correct')
+    )
+    for row in totals:
+        UserStats.objects.filter(user_id=row['user_id']).update(
+            total_reviewed=row['total_reviewed'] or 0,
+            total_correct=row['total_correct'] or 0
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_flashcardsetembedding'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userstats',
+            name='total_correct',
+            field=models.IntegerField(default=0, verbose_name='Tổng số lần đúng'),
+        ),
+        migrations.AddField(
+            model_name='userstats',
+            name='total_reviewed',
+            field=models.IntegerField(default=0, verbose_name='Tổng số lần ôn tập'),
+        ),
+        migrations.RunPython(backfill_review_totals, migrations.RunPython.noop),
+    ]
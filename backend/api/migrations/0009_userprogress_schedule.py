@@ -0,0 +1,45 @@
+# Generated by Django 5.1.6 on 2026-10-17 01:47
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def schedule_reviewed_cards(apps, schema_editor):
+    # Thẻ đã từng ôn được xếp đến hạn ngay để đưa vào hàng đợi ôn tập
+    UserProgress = apps.get_model('api', 'UserProgress')
+    UserProgress.objects.filter(last_reviewed__isnull=False).update(due_at=F('last_reviewed'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_userstats_review_totals'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprogress',
+            name='due_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Hạn ôn tiếp theo'),
+        ),
+        migrations.AddField(
+            model_name='userprogress',
+            name='ease_factor',
+            field=models.FloatField(default=2.5, verbose_name='Hệ số dễ'),
+        ),
+        migrations.AddField(
+            model_name='userprogress',
+            name='interval_days',
+            field=models.IntegerField(default=0, verbose_name='Khoảng cách ôn (ngày)'),
+        ),
+        migrations.AddField(
+            model_name='userprogress',
+            name='repetitions',
+            field=models.IntegerField(default=0, verbose_name='Số lần nhớ liên tiếp'),
+        ),
+        migrations.AddIndex(
+            model_name='userprogress',
+            index=models.Index(fields=['user', 'due_at'], name='api_userpro_user_id_971ca0_idx'),
+        ),
+        migrations.RunPython(schedule_reviewed_cards, migrations.RunPython.noop),
+    ]
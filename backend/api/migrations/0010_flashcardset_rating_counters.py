@@ -0,0 +1,37 @@
+# Generated by Django 5.1.6 on 2026-10-17 01:51
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_rating_counters(apps, schema_editor):
+    FlashcardSet = apps.get_model('api', 'FlashcardSet')
+    SavedFlashcardSet = apps.get_model('api', 'SavedFlashcardSet')
+    totals = SavedFlashcardSet.objects.filter(rating__isnull=False).values('flashcard_set_id').order_by().annotate(
+        rating_sum=Sum('rating'), rating_count=Count('id')
+    )
+    for row in totals:
+        FlashcardSet.objects.filter(pk=row['flashcard_set_id']).update(
+            rating_sum=row['rating_sum'], rating_count=row['rating_count']
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_userprogress_schedule'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flashcardset',
+            name='rating_count',
+            field=models.IntegerField(default=0, verbose_name='Số lượt đánh giá'),
+        ),
+        migrations.AddField(
+            model_name='flashcardset',
+            name='rating_sum',
+            field=models.IntegerField(default=0, verbose_name='Tổng điểm đánh giá'),
+        ),
+        migrations.RunPython(backfill_rating_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.6 on 2026-10-17 01:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_flashcardset_rating_counters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='flashcard',
+            index=models.Index(fields=['flashcard_set', 'created_at', 'id'], name='api_flashca_flashca_810e2b_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.6 on 2026-10-17 01:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_flashcard_cursor_index'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='flashcardset',
+            index=models.Index(fields=['is_public', 'id'], name='api_flashca_is_publ_b3e88d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['role', 'id'], name='api_user_role_db0f39_idx'),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.1.6 on 2026-10-17 02:00
+
+from django.db import migrations, models
+
+from api.text_normalize import normalize_text
+
+FULLTEXT_INDEXES = {
+    'api_flashcardset': 'api_flashcardset_search_ft',
+    'api_flashcard': 'api_flashcard_search_ft',
+}
+
+
+def backfill_search_text(apps, schema_editor):
+    FlashcardSet = apps.get_model('api', 'FlashcardSet')
+    Flashcard = apps.get_model('api', 'Flashcard')
+    for model, fields in ((FlashcardSet, ('title', 'description')), (Flashcard, ('english', 'vietnamese'))):
+        batch = []
+        for row in model.objects.only('id', *fields).order_by('pk').iterator(chunk_size=2000):
+            row.search_text = normalize_text(*(getattr(row, field) for field in fields))
+            batch.append(row)
+            if len(batch) >= 2000:
+                model.objects.bulk_update(batch, ['search_text'])
+                batch = []
+        if batch:
+            model.objects.bulk_update(batch, ['search_text'])
+
+
+def add_fulltext_indexes(apps, schema_editor):
+    # Django không khai báo được FULLTEXT index nên chỉ tạo trên MySQL
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    for table, name in FULLTEXT_INDEXES.items():
+        schema_editor.execute(f'ALTER TABLE {table} ADD FULLTEXT INDEX {name} (search_text)')
+
+
+def drop_fulltext_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    for table, name in FULLTEXT_INDEXES.items():
+        schema_editor.execute(f'ALTER TABLE {table} DROP INDEX {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_admin_list_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flashcard',
+            name='search_text',
+            field=models.TextField(blank=True, editable=False, verbose_name='Nội dung tìm kiếm'),
+        ),
+        migrations.AddField(
+            model_name='flashcardset',
+            name='search_text',
+            field=models.TextField(blank=True, editable=False, verbose_name='Nội dung tìm kiếm'),
+        ),
+        migrations.RunPython(backfill_search_text, migrations.RunPython.noop),
+        migrations.RunPython(add_fulltext_indexes, drop_fulltext_indexes),
+    ]
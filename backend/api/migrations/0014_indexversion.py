@@ -0,0 +1,25 @@
+# Generated by Django 5.1.6 on 2026-10-17 02:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_search_text'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndexVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='Tên chỉ mục')),
+                ('version', models.BigIntegerField(default=0, verbose_name='Phiên bản')),
+            ],
+            options={
+                'verbose_name': 'Phiên bản chỉ mục',
+                'verbose_name_plural': 'Phiên bản chỉ mục',
+            },
+        ),
+    ]
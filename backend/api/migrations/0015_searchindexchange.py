@@ -0,0 +1,26 @@
+# Generated by Django 5.1.6 on 2026-10-17 02:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_indexversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchIndexChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('set', 'Bộ flashcard'), ('card', 'Thẻ'), ('set_cards', 'Các thẻ của bộ')], max_length=10, verbose_name='Loại')),
+                ('object_id', models.BigIntegerField(verbose_name='ID đối tượng')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Thay đổi chỉ mục tìm kiếm',
+                'verbose_name_plural': 'Thay đổi chỉ mục tìm kiếm',
+            },
+        ),
+    ]
@@ -1,11 +1,37 @@
-from django.db import models
+from django.db import IntegrityError, connection, models, transaction
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
+from django.db.models import Count, F, FloatField, Sum, Value
+from django.db.models.functions import Cast, Coalesce, NullIf, Round, TruncDate
+from datetime import timedelta
+from functools import lru_cache
+from cloudinary import CloudinaryResource
 from cloudinary.models import CloudinaryField
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 
+from api.text_normalize import normalize_text
+
+
+@lru_cache(maxsize=4096)
+def _cloudinary_url(public_id, format, version, type, resource_type):
+    return CloudinaryResource(public_id, format=format, version=version, type=type, resource_type=resource_type).url
+
+
+def cloudinary_url_for(resource):
+    """URL ảnh Cloudinary, nhớ theo (public_id, version, ...) vì CloudinaryResource.url dựng lại URL mỗi lần gọi."""
+    if not resource:
+        return None
+    if isinstance(resource, str):
+        # Giá trị vừa gán bằng public_id, chưa nạp lại từ DB
+        return _cloudinary_url(resource, None, None, 'upload', 'image')
+    if resource.url_options:
+        return resource.url
+    return _cloudinary_url(
+        resource.public_id, resource.format, resource.version, resource.type, resource.resource_type or 'image'
+    )
+
 
 class User(AbstractUser):
     ROLE_CHOICES = [
@@ -23,8 +49,13 @@ class User(AbstractUser):
         verbose_name_plural = "Người dùng"
         indexes = [
             models.Index(fields=['total_points']),
+            models.Index(fields=['role', 'id']),
         ]
 
+    @property
+    def avatar_url(self):
+        return cloudinary_url_for(self.avatar)
+
     @property
     def is_admin(self):
         return self.role == 'admin'
@@ -62,6 +93,10 @@ class FlashcardSet(models.Model):
     total_cards = models.IntegerField(default=0, verbose_name="Tổng số thẻ")
     total_saves = models.IntegerField(default=0, verbose_name="Lượt lưu")
     average_rating = models.FloatField(default=0.0, verbose_name="Điểm trung bình")
+    rating_sum = models.IntegerField(default=0, verbose_name="Tổng điểm đánh giá")
+    rating_count = models.IntegerField(default=0, verbose_name="Số lượt đánh giá")
+    # Tiêu đề + mô tả đã bỏ dấu, có FULLTEXT index trên MySQL (xem api/search.py)
+    search_text = models.TextField(blank=True, editable=False, verbose_name="Nội dung tìm kiếm")
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -73,29 +108,149 @@ class FlashcardSet(models.Model):
         indexes = [
             models.Index(fields=['topic', 'difficulty']),
             models.Index(fields=['is_public', 'created_at']),
+            models.Index(fields=['is_public', 'id']),
             models.Index(fields=['total_saves']),
         ]
 
     def __str__(self):
         return self.title
 
+    SEARCH_SOURCE_FIELDS = {'title', 'description'}
+
+    def refresh_search_text(self):
+        self.search_text = normalize_text(self.title, self.description)
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or self.SEARCH_SOURCE_FIELDS & set(update_fields):
+            self.refresh_search_text()
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'search_text'}
+        super().save(*args, **kwargs)
+
+    # Các bộ đếm phi chuẩn hóa, cập nhật bằng delta qua signal
+    COUNTER_FIELDS = ['total_cards', 'total_saves', 'rating_sum', 'rating_count', 'average_rating']
+
+    @classmethod
+    def apply_counter_deltas(cls, set_id, cards=0, saves=0, rating_sum=0, rating_count=0):
+        """Cộng/trừ bộ đếm bằng 1 câu UPDATE với F(), không COUNT/AVG lại bảng con."""
+        updates = {}
+        if rating_sum or rating_count:
+            # average_rating phải đứng trước rating_sum/rating_count: MySQL tính SET từ trái sang phải
+            # với giá trị đã cập nhật, còn SQLite/PostgreSQL dùng giá trị cũ, nên biểu thức tự cộng delta
+            new_sum = Cast(F('rating_sum') + rating_sum, FloatField())
+            new_count = NullIf(F('rating_count') + rating_count, Value(0))
+            updates['average_rating'] = Coalesce(Round(new_sum / new_count, 1), Value(0.0))
+            updates['rating_sum'] = F('rating_sum') + rating_sum
+            updates['rating_count'] = F('rating_count') + rating_count
+        if cards:
+            updates['total_cards'] = F('total_cards') + cards
+        if saves:
+            updates['total_saves'] = F('total_saves') + saves
+        if updates:
+            cls.objects.filter(pk=set_id).update(**updates)
+
+    def recount_counters(self):
+        # Đếm lại toàn bộ từ bảng con (dùng để sửa sai lệch, xem reconcile_set_counters)
+        saved = SavedFlashcardSet.objects.filter(flashcard_set=self).aggregate(
+            saves=Count('id'), rating_sum=Sum('rating'), rating_count=Count('rating')
+        )
+        self.total_cards = self.flashcards.count()
+        self.total_saves = saved['saves']
+        self.rating_sum = saved['rating_sum'] or 0
+        self.rating_count = saved['rating_count']
+        self.average_rating = round(self.rating_sum / self.rating_count, 1) if self.rating_count else 0.0
+        self.save(update_fields=self.COUNTER_FIELDS)
+
     def update_total_cards(self):
         self.total_cards = self.flashcards.count()
         self.save(update_fields=['total_cards'])
 
-    def update_average_rating(self):
-        from django.db.models import Avg
-        avg_rating = SavedFlashcardSet.objects.filter(
-            flashcard_set=self,
-            rating__isnull=False
-        ).aggregate(avg=Avg('rating'))['avg']
 
-        self.average_rating = round(avg_rating, 1) if avg_rating else 0.0
-        self.save(update_fields=['average_rating'])
+class FlashcardSetEmbedding(models.Model):
+    """Vector SBERT của tiêu đề + mô tả bộ flashcard, chỉ encode lại khi nội dung đổi."""
+
+    flashcard_set = models.OneToOneField(
+        FlashcardSet, on_delete=models.CASCADE, primary_key=True, related_name='embedding'
+    )
+    content_hash = models.CharField(max_length=64, verbose_name="Mã băm nội dung")
+    vector = models.BinaryField(verbose_name="Vector (float32)")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Embedding bộ flashcard"
+        verbose_name_plural = "Embedding bộ flashcard"
 
-    def update_total_saves(self):
-        self.total_saves = SavedFlashcardSet.objects.filter(flashcard_set=self).count()
-        self.save(update_fields=['total_saves'])
+    def __str__(self):
+        return f"Embedding - {self.flashcard_set_id}"
+
+
+class IndexVersion(models.Model):
+    """Phiên bản của các chỉ mục giữ trong bộ nhớ (embedding, tìm kiếm), dùng chung giữa mọi worker.
+    Ghi trong cùng transaction với thay đổi dữ liệu nên worker khác thấy phiên bản mới đúng lúc dữ liệu được commit.
+    """
+
+    name = models.CharField(max_length=50, unique=True, verbose_name="Tên chỉ mục")
+    version = models.BigIntegerField(default=0, verbose_name="Phiên bản")
+
+    class Meta:
+        verbose_name = "Phiên bản chỉ mục"
+        verbose_name_plural = "Phiên bản chỉ mục"
+
+    def __str__(self):
+        return f"{self.name} - {self.version}"
+
+    @classmethod
+    def current(cls, name):
+        return cls.objects.filter(name=name).values_list('version', flat=True).first() or 0
+
+    @classmethod
+    def bump(cls, name):
+        if cls.objects.filter(name=name).update(version=F('version') + 1):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(name=name, version=1)
+        except IntegrityError:
+            # Request khác vừa tạo dòng này
+            cls.objects.filter(name=name).update(version=F('version') + 1)
+
+
+class SearchIndexChange(models.Model):
+    """Nhật ký bộ/thẻ vừa thay đổi, dùng chung qua DB cho chỉ mục tìm kiếm trong bộ nhớ của từng worker.
+    Mỗi worker đọc các dòng có id lớn hơn lần đọc trước và chỉ cập nhật lại những tài liệu đó.
+    """
+
+    SET = 'set'
+    CARD = 'card'
+    SET_CARDS = 'set_cards'  # mọi thẻ của 1 bộ (nhập hàng loạt bằng bulk_create)
+    KIND_CHOICES = [
+        (SET, 'Bộ flashcard'),
+        (CARD, 'Thẻ'),
+        (SET_CARDS, 'Các thẻ của bộ'),
+    ]
+    # Giữ nhật ký 1 ngày; worker lâu không đồng bộ hơn thế sẽ dựng lại toàn bộ
+    RETENTION = timedelta(days=1)
+    PRUNE_EVERY = 500
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, verbose_name="Loại")
+    object_id = models.BigIntegerField(verbose_name="ID đối tượng")
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = "Thay đổi chỉ mục tìm kiếm"
+        verbose_name_plural = "Thay đổi chỉ mục tìm kiếm"
+
+    def __str__(self):
+        return f"{self.kind} - {self.object_id}"
+
+    @classmethod
+    def record(cls, kind, object_id):
+        change = cls.objects.create(kind=kind, object_id=object_id)
+        # Dọn dòng cũ thỉnh thoảng thay vì mỗi lần ghi
+        if change.pk % cls.PRUNE_EVERY == 0:
+            cls.objects.filter(created_at__lt=timezone.now() - cls.RETENTION).delete()
+        return change
 
 
 class Flashcard(models.Model):
@@ -117,6 +272,8 @@ class Flashcard(models.Model):
         blank=True,
         verbose_name="Loại từ"
     )
+    # Tiếng Anh + tiếng Việt đã bỏ dấu, có FULLTEXT index trên MySQL (xem api/search.py)
+    search_text = models.TextField(blank=True, editable=False, verbose_name="Nội dung tìm kiếm")
 
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -127,11 +284,26 @@ class Flashcard(models.Model):
         indexes = [
             models.Index(fields=['vietnamese']),
             models.Index(fields=['english']),
+            models.Index(fields=['flashcard_set', 'created_at', 'id']),
         ]
 
     def __str__(self):
         return f"{self.vietnamese} - {self.english}"
 
+    SEARCH_SOURCE_FIELDS = {'vietnamese', 'english'}
+
+    def refresh_search_text(self):
+        # bulk_create không gọi save() nên nơi tạo hàng loạt phải gọi hàm này trước
+        self.search_text = normalize_text(self.english, self.vietnamese)
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or self.SEARCH_SOURCE_FIELDS & set(update_fields):
+            self.refresh_search_text()
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'search_text'}
+        super().save(*args, **kwargs)
+
 
 class SavedFlashcardSet(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name="Người dùng")
@@ -152,6 +324,13 @@ class SavedFlashcardSet(models.Model):
     def __str__(self):
         return f"{self.user.username} - {self.flashcard_set.title}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # Ghi nhớ rating đã lưu để signal tính được delta cho rating_sum/rating_count
+        instance = super().from_db(db, field_names, values)
+        instance._stored_rating = instance.__dict__.get('rating')
+        return instance
+
 
 class UserProgress(models.Model):
     DIFFICULTY_LEVELS = [
@@ -180,6 +359,11 @@ class UserProgress(models.Model):
     )
     is_learned = models.BooleanField(default=False, verbose_name="Đã học")
     is_difficult = models.BooleanField(default=False, verbose_name="Từ khó")
+    # Lịch ôn tập theo thuật toán SM-2
+    due_at = models.DateTimeField(null=True, blank=True, verbose_name="Hạn ôn tiếp theo")
+    interval_days = models.IntegerField(default=0, verbose_name="Khoảng cách ôn (ngày)")
+    ease_factor = models.FloatField(default=2.5, verbose_name="Hệ số dễ")
+    repetitions = models.IntegerField(default=0, verbose_name="Số lần nhớ liên tiếp")
 
     class Meta:
         unique_together = ('user', 'flashcard')
@@ -189,8 +373,16 @@ class UserProgress(models.Model):
         indexes = [
             models.Index(fields=['user', 'is_difficult']),
             models.Index(fields=['user', 'mastery_level']),
+            models.Index(fields=['user', 'due_at']),
         ]
 
+    # Các trường thay đổi sau mỗi lần ôn (dùng cho bulk_update)
+    REVIEW_FIELDS = [
+        'times_reviewed', 'times_correct', 'mastery_level', 'is_difficult', 'last_reviewed',
+        'difficulty_rating', 'due_at', 'interval_days', 'ease_factor', 'repetitions',
+    ]
+    MIN_EASE_FACTOR = 1.3
+
     def __str__(self):
         return f"{self.user.username} - {self.flashcard.vietnamese}"
 
@@ -200,6 +392,57 @@ class UserProgress(models.Model):
             return 0
         return round((self.times_correct / self.times_reviewed) * 100, 1)
 
+    def apply_review(self, is_correct, difficulty_rating=None, reviewed_at=None):
+        # Cập nhật số lần ôn tập/đúng và mastery_level cho 1 lần ôn (chưa lưu DB)
+        self.times_reviewed += 1
+
+        if is_correct:
+            self.times_correct += 1
+            # Tăng mastery_level nhưng không vượt quá 100
+            self.mastery_level = min(100, self.mastery_level + 10)
+        else:
+            # Giảm mastery_level nhưng không xuống dưới 0
+            self.mastery_level = max(0, self.mastery_level - 5)
+            self.is_difficult = True
+
+        self.last_reviewed = reviewed_at or timezone.now()
+        if difficulty_rating:
+            self.difficulty_rating = difficulty_rating
+
+        self.schedule_next(self.review_quality(is_correct, difficulty_rating))
+
+    @staticmethod
+    def review_quality(is_correct, difficulty_rating=None):
+        # Quy đổi kết quả ôn sang điểm chất lượng 0-5 của SM-2
+        if not is_correct:
+            return 1 if difficulty_rating == 1 else 2
+        if difficulty_rating is None:
+            return 4
+        rating = int(difficulty_rating)
+        if rating not in dict(UserProgress.DIFFICULTY_LEVELS):
+            raise ValueError(f"difficulty_rating phải từ 1 đến 5, nhận {difficulty_rating!r}")
+        return {1: 3, 2: 3, 3: 4, 4: 5, 5: 5}[rating]
+
+    def schedule_next(self, quality):
+        # SM-2: nhớ được (quality >= 3) thì giãn khoảng cách, quên thì ôn lại sau 1 ngày
+        if quality >= 3:
+            if self.repetitions == 0:
+                self.interval_days = 1
+            elif self.repetitions == 1:
+                self.interval_days = 6
+            else:
+                self.interval_days = round(self.interval_days * self.ease_factor)
+            self.repetitions += 1
+        else:
+            self.repetitions = 0
+            self.interval_days = 1
+
+        self.ease_factor = max(
+            self.MIN_EASE_FACTOR,
+            self.ease_factor + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02)
+        )
+        self.due_at = self.last_reviewed + timedelta(days=self.interval_days)
+
 
 class GameSession(models.Model):
     GAME_TYPES = [
@@ -341,33 +584,269 @@ class DailyStats(models.Model):
     def __str__(self):
         return f"{self.user.username} - {self.date}"
 
+    # Các bộ đếm được cộng dồn trong ngày
+    COUNTER_FIELDS = (
+        'cards_studied', 'new_words_learned', 'words_reviewed',
+        'games_played', 'points_earned', 'time_spent',
+    )
+
+    @classmethod
+    def check_counters(cls, deltas):
+        unknown = set(deltas) - set(cls.COUNTER_FIELDS)
+        if unknown:
+            raise ValueError(f"Không hỗ trợ bộ đếm: {', '.join(sorted(unknown))}")
+
+    @classmethod
+    def accumulate(cls, user, day=None, accuracy_rate=None, **deltas):
+        """Cộng các delta vào bản ghi (user, ngày) bằng 1 câu INSERT ... ON DUPLICATE KEY UPDATE
+        (MySQL) hoặc INSERT ... ON CONFLICT DO UPDATE (SQLite/PostgreSQL).
+        - accuracy_rate: ghi đè giá trị trong ngày nếu được truyền vào.
+        """
+        cls.check_counters(deltas)
+        cls.accumulate_many([(getattr(user, 'pk', user), day or timezone.localdate(), deltas, accuracy_rate)])
+
+    @classmethod
+    def accumulate_many(cls, rows, batch_size=500):
+        """Như accumulate nhưng cho nhiều bản ghi: rows gồm (user_id, ngày, deltas, accuracy_rate).
+        Gộp thành 1 câu INSERT nhiều dòng cho mỗi batch (tách riêng dòng có/không ghi đè accuracy_rate).
+        """
+        for with_accuracy in (False, True):
+            group = [row for row in rows if (row[3] is not None) == with_accuracy]
+            for start in range(0, len(group), batch_size):
+                cls._upsert(group[start:start + batch_size], with_accuracy)
+
+    @classmethod
+    def _upsert(cls, rows, with_accuracy):
+        qn = connection.ops.quote_name
+        table = qn(cls._meta.db_table)
+        columns = ['user_id', 'date', *cls.COUNTER_FIELDS, 'accuracy_rate']
+
+        params = []
+        for user_id, day, deltas, accuracy_rate in rows:
+            params.extend([user_id, day, *(deltas.get(field, 0) for field in cls.COUNTER_FIELDS), accuracy_rate or 0.0])
+
+        if connection.vendor == 'mysql':
+            incoming = 'VALUES({})'.format
+            assignments = [f"{qn(f)} = {qn(f)} + {incoming(qn(f))}" for f in cls.COUNTER_FIELDS]
+            conflict = 'ON DUPLICATE KEY UPDATE'
+        else:
+            incoming = 'excluded.{}'.format
+            assignments = [f"{qn(f)} = {table}.{qn(f)} + {incoming(qn(f))}" for f in cls.COUNTER_FIELDS]
+            conflict = f"ON CONFLICT ({qn('user_id')}, {qn('date')}) DO UPDATE SET"
+        if with_accuracy:
+            assignments.append(f"{qn('accuracy_rate')} = {incoming(qn('accuracy_rate'))}")
+
+        placeholders = f"({', '.join(['%s'] * len(columns))})"
+        sql = (
+            f"INSERT INTO {table} ({', '.join(qn(c) for c in columns)}) "
+            f"VALUES {', '.join([placeholders] * len(rows))} "
+            f"{conflict} {', '.join(assignments)}"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+
+
+class UserStats(models.Model):
+    """Bộ đếm tích lũy theo user, cập nhật tăng dần khi có hoạt động (xem AchievementService)."""
+
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='stats', verbose_name="Người dùng")
+    words_learned = models.IntegerField(default=0, verbose_name="Số từ đã học")
+    games_played = models.IntegerField(default=0, verbose_name="Số game đã chơi")
+    sets_saved = models.IntegerField(default=0, verbose_name="Số bộ đã lưu")
+    current_streak = models.IntegerField(default=0, verbose_name="Chuỗi ngày học hiện tại")
+    last_active_date = models.DateField(null=True, blank=True, verbose_name="Ngày học gần nhất")
+    total_reviewed = models.IntegerField(default=0, verbose_name="Tổng số lần ôn tập")
+    total_correct = models.IntegerField(default=0, verbose_name="Tổng số lần đúng")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Thống kê người dùng"
+        verbose_name_plural = "Thống kê người dùng"
+
+    def __str__(self):
+        return f"{self.user.username} - thống kê"
+
+    @property
+    def accuracy_rate(self):
+        # Độ chính xác trọn đời, tính từ bộ đếm thay vì Sum trên toàn bộ UserProgress
+        if self.total_reviewed == 0:
+            return 0.0
+        return round((self.total_correct / self.total_reviewed) * 100, 1)
+
+    def get_current_streak(self, today=None):
+        # Chuỗi chỉ còn hiệu lực nếu hôm nay (giờ địa phương) đã có hoạt động
+        today = today or timezone.localdate()
+        return self.current_streak if self.last_active_date == today else 0
+
+    def record_activity(self, day=None):
+        # Cập nhật chuỗi ngày tăng dần, tối đa 1 query và chỉ khi sang ngày mới
+        day = day or timezone.localdate()
+        if self.last_active_date == day:
+            return
+        if self.last_active_date == day - timedelta(days=1):
+            self.current_streak += 1
+        else:
+            self.current_streak = 1
+        self.last_active_date = day
+        UserStats.objects.filter(pk=self.pk).update(
+            current_streak=self.current_streak, last_active_date=day
+        )
+
+    @staticmethod
+    def calculate_streak(user, today=None):
+        # Lấy các ngày có hoạt động trong 1 năm gần nhất bằng 2 query rồi duyệt trong bộ nhớ
+        today = today or timezone.localdate()
+        since = today - timedelta(days=365)
+        active_dates = set(DailyStats.objects.filter(
+            user=user, date__gte=since, date__lte=today, cards_studied__gt=0
+        ).values_list('date', flat=True))
+        active_dates.update(
+            UserProgress.objects.filter(user=user, last_reviewed__isnull=False)
+            .annotate(day=TruncDate('last_reviewed'))
+            .filter(day__gte=since, day__lte=today)
+            .order_by().values_list('day', flat=True).distinct()
+        )
+        if not active_dates:
+            return 0, None
+
+        # Chuỗi kết thúc ở ngày hoạt động gần nhất
+        last_active_date = max(active_dates)
+        streak = 0
+        day = last_active_date
+        while day in active_dates:
+            streak += 1
+            day -= timedelta(days=1)
+        return streak, last_active_date
+
+    @staticmethod
+    def review_totals(user):
+        agg = UserProgress.objects.filter(user=user).aggregate(
+            total_reviewed=Sum('times_reviewed'),
+            total_correct=Sum('times_correct')
+        )
+        return {
+            'total_reviewed': agg['total_reviewed'] or 0,
+            'total_correct': agg['total_correct'] or 0,
+        }
+
+    @classmethod
+    def rebuild_for(cls, user):
+        # Đếm lại từ đầu (dùng khi chưa có bản ghi hoặc cần sửa sai lệch)
+        current_streak, last_active_date = cls.calculate_streak(user)
+        values = {
+            **cls.review_totals(user),
+            'words_learned': UserProgress.objects.filter(user=user, times_reviewed__gte=1).count(),
+            'games_played': GameSession.objects.filter(user=user).count(),
+            'sets_saved': SavedFlashcardSet.objects.filter(user=user).count(),
+            'current_streak': current_streak,
+            'last_active_date': last_active_date,
+        }
+        stats, _ = cls.objects.update_or_create(user=user, defaults=values)
+        return stats
+
+
+class LeaderboardEntry(models.Model):
+    """Điểm cao nhất của user theo loại game và khung thời gian (cập nhật khi tạo GameSession)."""
+
+    WINDOW_CHOICES = [
+        ('daily', 'Hôm nay'),
+        ('weekly', 'Tuần này'),
+        ('all_time', 'Mọi thời điểm')
+    ]
+    ALL_GAMES = 'all'
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name="Người chơi")
+    game_type = models.CharField(max_length=20, verbose_name="Loại game")  # 'all' = mọi loại game
+    window = models.CharField(max_length=10, choices=WINDOW_CHOICES, verbose_name="Khung thời gian")
+    period = models.CharField(max_length=10, verbose_name="Kỳ")  # 'all', '2025-03-01', '2025-W09'
+    best_score = models.IntegerField(default=0, verbose_name="Điểm cao nhất")
+    total_games = models.IntegerField(default=0, verbose_name="Số ván")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('game_type', 'window', 'period', 'user')
+        verbose_name = "Bảng xếp hạng"
+        verbose_name_plural = "Bảng xếp hạng"
+        indexes = [
+            models.Index(fields=['game_type', 'window', 'period', '-best_score']),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.game_type} - {self.period} - {self.best_score}"
+
+    @classmethod
+    def upsert_scores(cls, user_id, keys, score):
+        """Cộng 1 ván điểm score vào các dòng (game_type, window, period) của user bằng 1 câu INSERT ... ON CONFLICT;
+        dòng chưa có thì tạo mới, kể cả khi request khác vừa tạo cùng dòng."""
+        qn = connection.ops.quote_name
+        table = qn(cls._meta.db_table)
+        columns = ['user_id', 'game_type', 'window', 'period', 'best_score', 'total_games', 'updated_at']
+        now = connection.ops.adapt_datetimefield_value(timezone.now())
+
+        params = []
+        for game_type, window, period in keys:
+            params.extend([user_id, game_type, window, period, score, 1, now])
+
+        if connection.vendor == 'mysql':
+            best = f"GREATEST({qn('best_score')}, VALUES({qn('best_score')}))"
+            assignments = [
+                f"{qn('best_score')} = {best}",
+                f"{qn('total_games')} = {qn('total_games')} + 1",
+                f"{qn('updated_at')} = VALUES({qn('updated_at')})",
+            ]
+            conflict = 'ON DUPLICATE KEY UPDATE'
+        else:
+            greatest = 'MAX' if connection.vendor == 'sqlite' else 'GREATEST'
+            assignments = [
+                f"{qn('best_score')} = {greatest}({table}.{qn('best_score')}, excluded.{qn('best_score')})",
+                f"{qn('total_games')} = {table}.{qn('total_games')} + 1",
+                f"{qn('updated_at')} = excluded.{qn('updated_at')}",
+            ]
+            unique = ', '.join(qn(c) for c in ('game_type', 'window', 'period', 'user_id'))
+            conflict = f"ON CONFLICT ({unique}) DO UPDATE SET"
+
+        placeholders = f"({', '.join(['%s'] * len(columns))})"
+        sql = (
+            f"INSERT INTO {table} ({', '.join(qn(c) for c in columns)}) "
+            f"VALUES {', '.join([placeholders] * len(keys))} "
+            f"{conflict} {', '.join(assignments)}"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
 
 
 @receiver(post_save, sender=Flashcard)
 def update_flashcard_count_on_save(sender, instance, created, **kwargs):
     if created:
-        instance.flashcard_set.update_total_cards()
+        FlashcardSet.apply_counter_deltas(instance.flashcard_set_id, cards=1)
 
 
 @receiver(post_delete, sender=Flashcard)
 def update_flashcard_count_on_delete(sender, instance, **kwargs):
-    try:
-        instance.flashcard_set.update_total_cards()
-    except FlashcardSet.DoesNotExist:
-        pass
+    # Bộ đã bị xóa thì UPDATE không khớp dòng nào
+    FlashcardSet.apply_counter_deltas(instance.flashcard_set_id, cards=-1)
+
+
+def _rating_value(rating):
+    return int(rating) if rating else 0
 
 
 @receiver(post_save, sender=SavedFlashcardSet)
 def update_flashcard_set_stats_on_save(sender, instance, created, **kwargs):
-    instance.flashcard_set.update_total_saves()
-    if instance.rating:
-        instance.flashcard_set.update_average_rating()
+    old_rating = None if created else getattr(instance, '_stored_rating', None)
+    old_value, new_value = _rating_value(old_rating), _rating_value(instance.rating)
+    FlashcardSet.apply_counter_deltas(
+        instance.flashcard_set_id,
+        saves=1 if created else 0,
+        rating_sum=new_value - old_value,
+        rating_count=(1 if new_value else 0) - (1 if old_value else 0)
+    )
+    instance._stored_rating = instance.rating
 
 
 @receiver(post_delete, sender=SavedFlashcardSet)
 def update_flashcard_set_stats_on_delete(sender, instance, **kwargs):
-    try:
-        instance.flashcard_set.update_total_saves()
-        instance.flashcard_set.update_average_rating()
-    except FlashcardSet.DoesNotExist:
-        pass
+    value = _rating_value(getattr(instance, '_stored_rating', instance.rating))
+    FlashcardSet.apply_counter_deltas(
+        instance.flashcard_set_id, saves=-1, rating_sum=-value, rating_count=-1 if value else 0
+    )
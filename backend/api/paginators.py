@@ -0,0 +1,23 @@
+from rest_framework.pagination import CursorPagination
+
+
+class FlashcardCursorPagination(CursorPagination):
+    """Phân trang thẻ theo (created_at, id), khớp Flashcard.Meta.ordering và index (flashcard_set, created_at, id).
+    Gọi paginate_queryset không kèm view: OrderingFilter của FlashcardSetViewSet sẽ ghi đè ordering này.
+    """
+
+    ordering = ('created_at', 'id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+
+class AdminCursorPagination(CursorPagination):
+    """Phân trang keyset theo id giảm dần cho các danh sách quản trị (không COUNT(*), không OFFSET).
+    Các bộ lọc đi kèm (topic, creator, is_public, role) đều có index kết thúc bằng id.
+    """
+
+    ordering = '-id'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
@@ -0,0 +1,351 @@
+import heapq
+import logging
+import math
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import FloatField, Func, Max, Q, Value
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from api.models import Flashcard, FlashcardSet, SearchIndexChange
+from api.text_normalize import tokenize
+
+logger = logging.getLogger(__name__)
+
+MAX_QUERY_TOKENS = 8
+# Số token tối đa mà token cuối (đang gõ dở) được mở rộng thành
+MAX_PREFIX_EXPANSIONS = 50
+SET_TITLE_WEIGHT = 2
+# Nhiều thay đổi hơn mức này kể từ lần đồng bộ trước thì dựng lại toàn bộ cho nhanh
+MAX_DELTA_CHANGES = 2000
+
+
+def record_search_change(kind: str, object_id: int) -> None:
+    # Chỉ mục trong bộ nhớ chỉ dùng khi không có FULLTEXT; trên MySQL không cần ghi nhật ký
+    if not SearchService.uses_fulltext():
+        SearchIndexChange.record(kind, object_id)
+
+
+def query_tokens(query: Optional[str]) -> List[str]:
+    return tokenize(query)[:MAX_QUERY_TOKENS]
+
+
+def boolean_query(tokens: List[str]) -> str:
+    """Câu truy vấn BOOLEAN MODE: mọi token đều bắt buộc, token cuối khớp theo tiền tố.
+    Token đã qua normalize_text chỉ còn [0-9a-z] nên không chứa toán tử của MySQL.
+    Bỏ các token ngắn hơn innodb_ft_min_token_size vì server không index chúng.
+    """
+    min_size = settings.SEARCH_FULLTEXT_MIN_TOKEN_SIZE
+    terms = []
+    for position, token in enumerate(tokens):
+        if len(token) < min_size:
+            continue
+        terms.append(f"+{token}*" if position == len(tokens) - 1 else f"+{token}")
+    return " ".join(terms)
+
+
+class FullTextMatch(Func):
+    """MATCH (cột) AGAINST (truy vấn IN BOOLEAN MODE), chỉ dùng trên MySQL."""
+
+    output_field = FloatField()
+
+    def __init__(self, column: str, query: str):
+        super().__init__(column, Value(query))
+
+    def as_sql(self, compiler, connection, **extra_context):
+        column_sql, column_params = compiler.compile(self.source_expressions[0])
+        query_sql, query_params = compiler.compile(self.source_expressions[1])
+        return f"MATCH ({column_sql}) AGAINST ({query_sql} IN BOOLEAN MODE)", (*column_params, *query_params)
+
+
+class InvertedIndex:
+    """Chỉ mục ngược trong bộ nhớ: token -> {doc id: trọng số}, xếp hạng theo tf-idf."""
+
+    def __init__(self) -> None:
+        self.postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+        self.documents: Dict[int, Set[str]] = {}  # doc id -> token, để gỡ khi tài liệu đổi
+        self.vocabulary: List[str] = []
+
+    @property
+    def doc_count(self) -> int:
+        return len(self.documents)
+
+    def add(self, doc_id: int, weighted_texts: List[Tuple[Optional[str], int]]) -> List[str]:
+        """Thêm tài liệu, trả về các token lần đầu xuất hiện trong chỉ mục."""
+        tokens = self.documents.setdefault(doc_id, set())
+        new_tokens = []
+        for text, weight in weighted_texts:
+            for token in tokenize(text):
+                postings = self.postings[token]
+                if not postings:
+                    new_tokens.append(token)
+                postings[doc_id] = postings.get(doc_id, 0) + weight
+                tokens.add(token)
+        return new_tokens
+
+    def remove(self, doc_id: int) -> None:
+        for token in self.documents.pop(doc_id, ()):
+            postings = self.postings[token]
+            postings.pop(doc_id, None)
+            if not postings:
+                del self.postings[token]
+                position = bisect_left(self.vocabulary, token)
+                if position < len(self.vocabulary) and self.vocabulary[position] == token:
+                    del self.vocabulary[position]
+
+    def update(self, doc_id: int, weighted_texts: Optional[List[Tuple[Optional[str], int]]]) -> None:
+        # Thay nội dung 1 tài liệu sau khi đã finalize; None => gỡ khỏi chỉ mục
+        self.remove(doc_id)
+        if weighted_texts is not None:
+            for token in self.add(doc_id, weighted_texts):
+                insort(self.vocabulary, token)
+
+    def finalize(self) -> None:
+        # Danh sách token đã sắp xếp để mở rộng tiền tố bằng bisect
+        self.vocabulary = sorted(self.postings)
+
+    def _expand(self, token: str, prefix: bool) -> List[str]:
+        if not prefix:
+            return [token] if token in self.postings else []
+        terms = []
+        for term in self.vocabulary[bisect_left(self.vocabulary, token):]:
+            if not term.startswith(token) or len(terms) >= MAX_PREFIX_EXPANSIONS:
+                break
+            terms.append(term)
+        return terms
+
+    def search(self, tokens: List[str], limit: int) -> List[Tuple[int, float]]:
+        scores: Optional[Dict[int, float]] = None
+        for position, token in enumerate(tokens):
+            token_scores: Dict[int, float] = {}
+            for term in self._expand(token, prefix=position == len(tokens) - 1):
+                postings = self.postings[term]
+                idf = math.log(1 + self.doc_count / len(postings))
+                for doc_id, weight in postings.items():
+                    # tf bão hòa để từ lặp lại nhiều lần không lấn át
+                    score = idf * weight / (weight + 1)
+                    if score > token_scores.get(doc_id, 0):
+                        token_scores[doc_id] = score
+            if scores is None:
+                scores = token_scores
+            else:
+                scores = {doc_id: scores[doc_id] + score for doc_id, score in token_scores.items() if doc_id in scores}
+            if not scores:
+                return []
+        return heapq.nlargest(limit, (scores or {}).items(), key=lambda item: item[1])
+
+
+class MemorySearchIndex:
+    """Chỉ mục tìm kiếm trong process cho DB không có FULLTEXT (SQLite khi dev/test).
+    - Gồm bộ flashcard công khai (tiêu đề nặng gấp đôi mô tả) và thẻ thuộc các bộ đó.
+    - Dựng toàn bộ lần đầu, sau đó đọc SearchIndexChange (dùng chung qua DB) và chỉ cập nhật bộ/thẻ đã đổi.
+    - Dựng lại toàn bộ sau SEARCH_MEMORY_INDEX_MAX_AGE giây: thay đổi commit muộn với id nhỏ hơn lần đọc trước
+      (transaction chạy song song) sẽ bị bỏ qua khi đọc theo id, lần dựng lại định kỳ sẽ sửa chúng.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.RLock()
+        self._last_change_id: Optional[int] = None
+        self._built_at: Optional[float] = None
+        self.sets = InvertedIndex()
+        self.cards = InvertedIndex()
+        self.build_ms: Optional[float] = None
+        self.applied_changes = 0
+
+    def _pending_changes(self) -> List[Tuple[int, str, int]]:
+        return list(
+            SearchIndexChange.objects.filter(id__gt=self._last_change_id).order_by("id")
+            .values_list("id", "kind", "object_id")[:MAX_DELTA_CHANGES + 1]
+        )
+
+    def ensure_fresh(self) -> None:
+        if self._built_at is None or time.monotonic() - self._built_at > settings.SEARCH_MEMORY_INDEX_MAX_AGE:
+            with self.lock:
+                self._build()
+            return
+        if not self._pending_changes():
+            return
+        with self.lock:
+            # Đọc lại trong lock: thread khác có thể vừa áp dụng xong
+            changes = self._pending_changes()
+            if len(changes) > MAX_DELTA_CHANGES:
+                self._build()
+            elif changes:
+                self._apply(changes)
+
+    def _build(self) -> None:
+        started = time.perf_counter()
+        # Lấy mốc nhật ký trước khi đọc dữ liệu: thay đổi xen giữa sẽ được áp dụng lại (idempotent)
+        last_change_id = SearchIndexChange.objects.aggregate(last=Max("id"))["last"] or 0
+        sets, cards = InvertedIndex(), InvertedIndex()
+        for set_id, title, description in FlashcardSet.objects.filter(
+                is_public=True).order_by().values_list("id", "title", "description").iterator():
+            sets.add(set_id, [(title, SET_TITLE_WEIGHT), (description, 1)])
+        for card_id, english, vietnamese in Flashcard.objects.filter(
+                flashcard_set__is_public=True).order_by().values_list("id", "english", "vietnamese").iterator():
+            cards.add(card_id, [(english, 1), (vietnamese, 1)])
+        sets.finalize()
+        cards.finalize()
+
+        self.sets, self.cards = sets, cards
+        self._last_change_id, self._built_at = last_change_id, time.monotonic()
+        self.build_ms = (time.perf_counter() - started) * 1000
+        logger.info(
+            "MemorySearchIndex: built %d sets, %d cards in %.1f ms",
+            sets.doc_count, cards.doc_count, self.build_ms,
+        )
+
+    def _apply(self, changes: List[Tuple[int, str, int]]) -> None:
+        started = time.perf_counter()
+        set_ids = {object_id for _, kind, object_id in changes if kind == SearchIndexChange.SET}
+        card_ids = {object_id for _, kind, object_id in changes if kind == SearchIndexChange.CARD}
+        card_set_ids = {object_id for _, kind, object_id in changes if kind == SearchIndexChange.SET_CARDS}
+
+        public_sets = {
+            set_id: [(title, SET_TITLE_WEIGHT), (description, 1)]
+            for set_id, title, description in FlashcardSet.objects.filter(
+                id__in=set_ids, is_public=True).values_list("id", "title", "description")
+        }
+        for set_id in set_ids:
+            # Bộ đổi trạng thái công khai => các thẻ của bộ cũng vào/ra khỏi chỉ mục
+            if (set_id in public_sets) != (set_id in self.sets.documents):
+                card_set_ids.add(set_id)
+            self.sets.update(set_id, public_sets.get(set_id))
+
+        if card_set_ids:
+            card_ids.update(Flashcard.objects.filter(flashcard_set_id__in=card_set_ids).values_list("id", flat=True))
+        public_cards = {
+            card_id: [(english, 1), (vietnamese, 1)]
+            for card_id, english, vietnamese in Flashcard.objects.filter(
+                id__in=card_ids, flashcard_set__is_public=True).values_list("id", "english", "vietnamese")
+        }
+        for card_id in card_ids:
+            self.cards.update(card_id, public_cards.get(card_id))
+
+        self._last_change_id = changes[-1][0]
+        self.applied_changes += len(changes)
+        logger.debug(
+            "MemorySearchIndex: applied %d changes (%d sets, %d cards) in %.2f ms",
+            len(changes), len(set_ids), len(card_ids), (time.perf_counter() - started) * 1000,
+        )
+
+    def search(self, index_name: str, tokens: List[str], limit: int) -> List[Tuple[int, float]]:
+        self.ensure_fresh()
+        with self.lock:
+            return getattr(self, index_name).search(tokens, limit)
+
+
+class SearchService:
+    """Tìm kiếm bộ flashcard và thẻ, không phân biệt dấu tiếng Việt.
+    - MySQL: FULLTEXT index trên cột search_text (đã bỏ dấu), xếp hạng theo điểm MATCH.
+    - DB khác: MemorySearchIndex trong process.
+    """
+
+    DEFAULT_LIMIT = 20
+    MAX_LIMIT = 50
+
+    _memory_index: Optional[MemorySearchIndex] = None
+    _memory_index_lock = threading.Lock()
+
+    @staticmethod
+    def uses_fulltext() -> bool:
+        backend = settings.SEARCH_BACKEND
+        if backend == "auto":
+            return connection.vendor == "mysql"
+        return backend == "fulltext"
+
+    @classmethod
+    def memory_index(cls) -> MemorySearchIndex:
+        if cls._memory_index is None:
+            with cls._memory_index_lock:
+                if cls._memory_index is None:
+                    cls._memory_index = MemorySearchIndex()
+        return cls._memory_index
+
+    @staticmethod
+    def _rank(queryset, tokens: List[str], limit: int):
+        # None nếu không còn token nào đủ dài để tra FULLTEXT
+        match = boolean_query(tokens)
+        if not match:
+            return None
+        return list(
+            queryset.annotate(relevance=FullTextMatch("search_text", match))
+            .filter(relevance__gt=0)
+            .order_by("-relevance", "-id")[:limit]
+        )
+
+    @staticmethod
+    def _contains_filter(tokens: List[str]) -> Q:
+        condition = Q()
+        for token in tokens:
+            condition &= Q(search_text__contains=token)
+        return condition
+
+    @classmethod
+    def _search(cls, queryset, index_name: str, query: str, limit: int) -> list:
+        tokens = query_tokens(query)
+        if not tokens:
+            return []
+        started = time.perf_counter()
+        if cls.uses_fulltext():
+            results = cls._rank(queryset, tokens, limit)
+            if results is None:
+                # Toàn token quá ngắn so với FULLTEXT => quét có giới hạn
+                results = list(queryset.filter(cls._contains_filter(tokens)).order_by("-id")[:limit])
+        else:
+            hits = cls.memory_index().search(index_name, tokens, limit)
+            objects = queryset.in_bulk([doc_id for doc_id, _ in hits])
+            results = [objects[doc_id] for doc_id, _ in hits if doc_id in objects]
+        logger.debug("SearchService: %s %r in %.2f ms", index_name, query, (time.perf_counter() - started) * 1000)
+        return results
+
+    @classmethod
+    def search_sets(cls, query: str, limit: int = DEFAULT_LIMIT) -> List[FlashcardSet]:
+        queryset = FlashcardSet.objects.select_related("creator", "topic").filter(is_public=True)
+        return cls._search(queryset, "sets", query, limit)
+
+    @classmethod
+    def search_cards(cls, query: str, limit: int = DEFAULT_LIMIT) -> List[Flashcard]:
+        queryset = Flashcard.objects.select_related("flashcard_set").filter(flashcard_set__is_public=True)
+        return cls._search(queryset, "cards", query, limit)
+
+    @classmethod
+    def filter_sets(cls, queryset, query: str):
+        """Lọc queryset bộ flashcard theo từ khóa (tham số ?q= của danh sách), giữ nguyên thứ tự sắp xếp."""
+        tokens = query_tokens(query)
+        if not tokens:
+            return queryset
+        match = boolean_query(tokens) if cls.uses_fulltext() else ""
+        if match:
+            return queryset.alias(relevance=FullTextMatch("search_text", match)).filter(relevance__gt=0)
+        return queryset.filter(cls._contains_filter(tokens))
+
+
+@receiver(post_save, sender=FlashcardSet)
+def record_set_change_on_save(sender, instance, created, update_fields=None, **kwargs):
+    # Bỏ qua các lần lưu chỉ cập nhật bộ đếm
+    if created or update_fields is None or {"title", "description", "is_public"} & set(update_fields):
+        record_search_change(SearchIndexChange.SET, instance.pk)
+
+
+@receiver(post_save, sender=Flashcard)
+def record_card_change_on_save(sender, instance, created, update_fields=None, **kwargs):
+    if created or update_fields is None or Flashcard.SEARCH_SOURCE_FIELDS & set(update_fields):
+        record_search_change(SearchIndexChange.CARD, instance.pk)
+
+
+@receiver(post_delete, sender=FlashcardSet)
+def record_set_change_on_delete(sender, instance, **kwargs):
+    # Thẻ của bộ bị xóa trước (cascade) và tự ghi nhật ký ở handler bên dưới
+    record_search_change(SearchIndexChange.SET, instance.pk)
+
+
+@receiver(post_delete, sender=Flashcard)
+def record_card_change_on_delete(sender, instance, **kwargs):
+    record_search_change(SearchIndexChange.CARD, instance.pk)
@@ -1,26 +1,34 @@
+from django.db import models
+from django.db.models import Count
 from rest_framework import serializers
 from api.models import (
     User, Topic, FlashcardSet, Flashcard, SavedFlashcardSet,
     UserProgress, GameSession, Achievement, UserAchievement,
-    UserFeedback, DailyStats
+    UserFeedback, DailyStats, cloudinary_url_for
 )
 
 
+class AvatarField(serializers.ImageField):
+    # Nhận file ảnh khi ghi, trả URL Cloudinary đã nhớ khi đọc
+    def to_representation(self, value):
+        return cloudinary_url_for(value)
+
+
 class BaseSerializer(serializers.ModelSerializer):
 
     def to_representation(self, instance):
         data = super().to_representation(instance)
 
-        # Xử lý avatar nếu có
-        if hasattr(instance, 'avatar') and instance.avatar:
-            data['avatar'] = instance.avatar.url
+        # Xử lý avatar nếu có (AvatarField đã tự trả URL)
+        if hasattr(instance, 'avatar') and instance.avatar and not isinstance(self.fields.get('avatar'), AvatarField):
+            data['avatar'] = cloudinary_url_for(instance.avatar)
 
         return data
 
 
 class UserSerializer(BaseSerializer):
     password = serializers.CharField(write_only=True, required=False)
-    avatar = serializers.ImageField(required=False, allow_null=True)
+    avatar = AvatarField(required=False, allow_null=True)
 
     def create(self, validated_data):
         # Lấy password và avatar trước khi tạo user
@@ -61,15 +69,6 @@ class UserSerializer(BaseSerializer):
         instance.save()
         return instance
 
-    def to_representation(self, instance):
-        data = super().to_representation(instance)
-        # Đảm bảo avatar URL được trả về đúng
-        if instance.avatar:
-            data['avatar'] = instance.avatar.url
-        else:
-            data['avatar'] = None
-        return data
-
     class Meta:
         model = User
         fields = ['id', 'username', 'email', 'first_name', 'last_name',
@@ -85,43 +84,147 @@ class TopicSerializer(serializers.ModelSerializer):
     flashcard_sets_count = serializers.SerializerMethodField() # thêm một field không có trong model nhưng được tính toán động
 
     def get_flashcard_sets_count(self, obj):
-        return obj.flashcardset_set.filter(is_public=True).count()
+        # Ưu tiên giá trị đã annotate/nạp sẵn để tránh 1 COUNT mỗi chủ đề
+        count = getattr(obj, 'public_sets_count', None)
+        if count is None:
+            count = obj.flashcardset_set.filter(is_public=True).count()
+        return count
 
     class Meta:
         model = Topic
         fields = ['id', 'name', 'description', 'icon', 'flashcard_sets_count'] # thêm custom field
 
 
+def attach_public_sets_count(topics):
+    # Gắn public_sets_count cho các chủ đề lồng trong danh sách bằng 1 query GROUP BY
+    pending = {}
+    for topic in topics:
+        if getattr(topic, 'public_sets_count', None) is None:
+            pending.setdefault(topic.pk, []).append(topic)
+    if not pending:
+        return
+    counts = dict(
+        FlashcardSet.objects.filter(topic_id__in=pending.keys(), is_public=True)
+        .values('topic_id').annotate(count=Count('id')).values_list('topic_id', 'count')
+    )
+    for topic_id, same_topics in pending.items():
+        for topic in same_topics:
+            topic.public_sets_count = counts.get(topic_id, 0)
+
+
 class CreateTopicSerializer(serializers.ModelSerializer):
     class Meta:
         model = Topic
         fields = ['name', 'description', 'icon']
 
 
+class UserRowLoader:
+    """Nạp theo lô các bản ghi gắn với user hiện tại (đã lưu, tiến trình...).
+    - Mỗi lần load() chỉ tốn 1 query cho tất cả khóa chưa có trong cache.
+    - Được lưu trong context của serializer nên chỉ sống trong 1 request.
+    """
+
+    model = None
+    key = None  # tên cột khóa ngoại dùng để tra cứu
+
+    def __init__(self, user):
+        self.user = user
+        self._rows = {}
+
+    def prime(self, rows):
+        # Nạp sẵn từ các bản ghi đã có trong tay (không cần query)
+        for row in rows:
+            self._rows[getattr(row, self.key)] = row
+
+    def load(self, ids):
+        missing = {pk for pk in ids if pk not in self._rows}
+        if not missing:
+            return
+        for pk in missing:
+            self._rows[pk] = None
+        self.prime(self.model.objects.filter(user=self.user, **{f'{self.key}__in': missing}))
+
+    def get(self, pk):
+        self.load([pk])
+        return self._rows[pk]
+
+
+class SavedFlashcardSetLoader(UserRowLoader):
+    model = SavedFlashcardSet
+    key = 'flashcard_set_id'
+
+
+class UserProgressLoader(UserRowLoader):
+    model = UserProgress
+    key = 'flashcard_id'
+
+
+def get_user_row_loader(context, loader_class):
+    # Lấy (hoặc tạo) loader dùng chung cho cả cây serializer của request hiện tại
+    request = context.get('request')
+    if not request or not request.user.is_authenticated:
+        return None
+    loader = context.get(loader_class.__name__)
+    if loader is None or loader.user != request.user:
+        loader = loader_class(request.user)
+        context[loader_class.__name__] = loader
+    return loader
+
+
+class UserRowListSerializer(serializers.ListSerializer):
+    loader_class = None
+
+    def preload(self, loader, items):
+        loader.load([obj.pk for obj in items])
+
+    def prepare(self, items):
+        # Nạp dữ liệu theo user cho cả danh sách bằng 1 query thay vì 1 query/dòng
+        loader = get_user_row_loader(self.context, self.loader_class)
+        if loader is not None:
+            self.preload(loader, items)
+
+    def to_representation(self, data):
+        items = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        self.prepare(items)
+        return super().to_representation(items)
+
+
+class FlashcardListSerializer(UserRowListSerializer):
+    loader_class = UserProgressLoader
+
+
 class FlashcardSerializer(serializers.ModelSerializer):
     user_progress = serializers.SerializerMethodField()
 
     def get_user_progress(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            try:
-                progress = UserProgress.objects.get(user=request.user, flashcard=obj)
-                return {
-                    'mastery_level': progress.mastery_level,
-                    'times_reviewed': progress.times_reviewed,
-                    'is_learned': progress.is_learned,
-                    'is_difficult': progress.is_difficult
-                }
-            except UserProgress.DoesNotExist:
-                return None
-        return None
+        loader = get_user_row_loader(self.context, UserProgressLoader)
+        if loader is None:
+            return None
+        progress = loader.get(obj.pk)
+        if progress is None:
+            return None
+        return {
+            'mastery_level': progress.mastery_level,
+            'times_reviewed': progress.times_reviewed,
+            'is_learned': progress.is_learned,
+            'is_difficult': progress.is_difficult
+        }
 
     class Meta:
         model = Flashcard
+        list_serializer_class = FlashcardListSerializer
         fields = ['id', 'vietnamese', 'english',
                   'example_sentence_en', 'word_type', 'user_progress']
 
 
+class FlashcardSetListSerializer(UserRowListSerializer):
+    loader_class = SavedFlashcardSetLoader
+
+    def prepare(self, items):
+        super().prepare(items)
+        attach_public_sets_count(obj.topic for obj in items)
+
+
 class FlashcardSetSerializer(BaseSerializer):
     creator = UserSerializer(read_only=True)
     topic = TopicSerializer(read_only=True)
@@ -129,40 +232,26 @@ class FlashcardSetSerializer(BaseSerializer):
     is_favorite = serializers.SerializerMethodField()
     user_rating = serializers.SerializerMethodField()
 
+    def _get_saved(self, obj):
+        loader = get_user_row_loader(self.context, SavedFlashcardSetLoader)
+        if loader is None:
+            return None
+        return loader.get(obj.pk)
+
     def get_is_saved(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return SavedFlashcardSet.objects.filter(
-                user=request.user, flashcard_set=obj
-            ).exists()
-        return False
+        return self._get_saved(obj) is not None
 
     def get_is_favorite(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            try:
-                saved = SavedFlashcardSet.objects.get(
-                    user=request.user, flashcard_set=obj
-                )
-                return saved.is_favorite
-            except SavedFlashcardSet.DoesNotExist:
-                return False
-        return False
+        saved = self._get_saved(obj)
+        return saved.is_favorite if saved else False
 
     def get_user_rating(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            try:
-                saved = SavedFlashcardSet.objects.get(
-                    user=request.user, flashcard_set=obj
-                )
-                return saved.rating
-            except SavedFlashcardSet.DoesNotExist:
-                return None
-        return None
+        saved = self._get_saved(obj)
+        return saved.rating if saved else None
 
     class Meta:
         model = FlashcardSet
+        list_serializer_class = FlashcardSetListSerializer
         fields = ['id', 'title', 'description', 'topic', 'creator',
                   'is_public', 'difficulty', 'total_cards', 'total_saves',
                   'average_rating', 'created_at', 'is_saved', 'is_favorite', 'user_rating']
@@ -176,26 +265,49 @@ class FlashcardSetDetailSerializer(FlashcardSetSerializer):
         fields = FlashcardSetSerializer.Meta.fields + ['flashcards']
 
 
+class SavedFlashcardSetListSerializer(UserRowListSerializer):
+    loader_class = SavedFlashcardSetLoader
+
+    def preload(self, loader, items):
+        # Bản ghi đã lưu chính là trạng thái của user => nạp sẵn, không cần query thêm
+        loader.prime(saved for saved in items if saved.user_id == loader.user.pk)
+
+    def prepare(self, items):
+        super().prepare(items)
+        attach_public_sets_count(saved.flashcard_set.topic for saved in items)
+
+
 class SavedFlashcardSetSerializer(serializers.ModelSerializer):
     flashcard_set = FlashcardSetSerializer(read_only=True)
 
     class Meta:
         model = SavedFlashcardSet
+        list_serializer_class = SavedFlashcardSetListSerializer
         fields = ['id', 'flashcard_set', 'saved_at', 'is_favorite', 'rating']
         extra_kwargs = {
             'user': {'write_only': True}
         }
 
 
+class UserProgressListSerializer(UserRowListSerializer):
+    loader_class = UserProgressLoader
+
+    def preload(self, loader, items):
+        # Tiến trình của thẻ chính là các dòng đang serialize
+        loader.prime(progress for progress in items if progress.user_id == loader.user.pk)
+
+
 class UserProgressSerializer(serializers.ModelSerializer):
     flashcard = FlashcardSerializer(read_only=True)
     accuracy_rate = serializers.ReadOnlyField()
 
     class Meta:
         model = UserProgress
+        list_serializer_class = UserProgressListSerializer
         fields = ['id', 'flashcard', 'mastery_level', 'times_reviewed',
                   'times_correct', 'last_reviewed', 'difficulty_rating',
-                  'is_learned', 'is_difficult', 'accuracy_rate']
+                  'is_learned', 'is_difficult', 'accuracy_rate',
+                  'due_at', 'interval_days', 'ease_factor', 'repetitions']
         extra_kwargs = {
             'user': {'write_only': True}
         }
@@ -301,3 +413,28 @@ class LeaderboardSerializer(serializers.Serializer):
     total_points = serializers.IntegerField()
     cards_learned = serializers.IntegerField()
     achievements_count = serializers.IntegerField()
+
+
+class StudySerializer(serializers.Serializer):
+    is_correct = serializers.BooleanField(default=False)
+    difficulty_rating = serializers.ChoiceField(
+        choices=UserProgress.DIFFICULTY_LEVELS, required=False, allow_null=True
+    )
+
+
+class StudyReviewSerializer(StudySerializer):
+    flashcard_id = serializers.IntegerField()
+
+
+class StudyBatchSerializer(serializers.Serializer):
+    # Giới hạn số lượt ôn mỗi lần gửi để giữ transaction ngắn
+    reviews = StudyReviewSerializer(many=True, allow_empty=False, max_length=500)
+
+
+class SearchCardSerializer(serializers.ModelSerializer):
+    flashcard_set_id = serializers.IntegerField(source='flashcard_set.id', read_only=True)
+    flashcard_set_title = serializers.CharField(source='flashcard_set.title', read_only=True)
+
+    class Meta:
+        model = Flashcard
+        fields = ['id', 'vietnamese', 'english', 'word_type', 'flashcard_set_id', 'flashcard_set_title']
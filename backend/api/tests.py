@@ -1,3 +1,1566 @@
-from django.test import TestCase
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+from urllib.parse import urlencode
+from unittest import mock
 
-# Create your tests here.
+import csv
+import hashlib
+import importlib
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+
+import cloudinary
+import numpy as np
+from cloudinary import CloudinaryResource
+from django.apps import apps as django_apps
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from api.achievement_service import AchievementService, AchievementEvent
+from api.avatar_import import AvatarImportQueue, backoff_key
+from api.daily_stats_buffer import DailyStatsBuffer
+from api.ai_suggestion import AISuggestionService, SetEmbeddingIndex
+from api.exporters import flashcard_rows, keyset_rows
+from api.embedding_worker import EmbeddingWorker, EmbeddingWorkerUnavailable, RemoteEncoder
+from api.leaderboard_service import LeaderboardService
+from api.serializers import UserSerializer
+from api.search import FullTextMatch, MemorySearchIndex, SearchService, boolean_query
+from api.text_normalize import normalize_text
+from api.token_cache import VerifiedTokenCache
+from api.typeahead import PrefixTrie, SuggestionIndex
+from api import models as api_models
+from api.models import (
+    User, Topic, FlashcardSet, Flashcard, SavedFlashcardSet, UserProgress,
+    GameSession, Achievement, UserAchievement, UserStats, DailyStats, LeaderboardEntry,
+    FlashcardSetEmbedding, IndexVersion, SearchIndexChange
+)
+
+
+class FlashcardSetListQueryTests(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='learner', password='secret')
+        self.creator = User.objects.create_user(username='creator', password='secret')
+        self.topic = Topic.objects.create(name='Travel')
+
+    def _create_sets(self, count):
+        sets = [
+            FlashcardSet.objects.create(
+                title=f'Set {i}', topic=self.topic, creator=self.creator, is_public=True
+            )
+            for i in range(count)
+        ]
+        SavedFlashcardSet.objects.create(user=self.user, flashcard_set=sets[0], is_favorite=True, rating=4)
+        return sets
+
+    def _saved_set_queries(self, path):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        table = SavedFlashcardSet._meta.db_table
+        return response, [q for q in ctx.captured_queries if table in q['sql']]
+
+    def test_list_loads_saved_state_in_one_query(self):
+        sets = self._create_sets(20)
+        self.client.force_authenticate(self.user)
+
+        response, queries = self._saved_set_queries('/flashcard-sets/')
+
+        self.assertEqual(len(queries), 1)
+        rows = {row['id']: row for row in response.data['results']}
+        self.assertTrue(rows[sets[0].id]['is_saved'])
+        self.assertTrue(rows[sets[0].id]['is_favorite'])
+        self.assertEqual(rows[sets[0].id]['user_rating'], 4)
+        self.assertFalse(rows[sets[1].id]['is_saved'])
+        self.assertIsNone(rows[sets[1].id]['user_rating'])
+
+    def test_topic_sets_load_saved_state_in_one_query(self):
+        self._create_sets(30)
+        self.client.force_authenticate(self.user)
+
+        response, queries = self._saved_set_queries(f'/topics/{self.topic.id}/flashcard-sets/')
+
+        self.assertEqual(len(response.data), 30)
+        self.assertEqual(len(queries), 1)
+
+    def test_list_query_count_is_constant(self):
+        other_topic = Topic.objects.create(name='Work')
+        self._create_sets(5)
+        self.client.force_authenticate(self.user)
+
+        # count + page + saved state + nested topic counts
+        with self.assertNumQueries(4):
+            self.client.get('/flashcard-sets/')
+
+        for i in range(15):
+            FlashcardSet.objects.create(
+                title=f'Work {i}', topic=other_topic, creator=self.creator, is_public=True
+            )
+        with self.assertNumQueries(4):
+            response = self.client.get('/flashcard-sets/')
+        counts = {row['topic']['id']: row['topic']['flashcard_sets_count'] for row in response.data['results']}
+        self.assertEqual(counts, {self.topic.id: 5, other_topic.id: 15})
+
+    def test_topic_list_uses_annotated_count(self):
+        self._create_sets(3)
+        FlashcardSet.objects.create(title='Private', topic=self.topic, creator=self.creator)
+
+        with self.assertNumQueries(2):
+            response = self.client.get('/topics/')
+        self.assertEqual(response.data['results'][0]['flashcard_sets_count'], 3)
+
+    def test_anonymous_list_skips_saved_state(self):
+        self._create_sets(5)
+
+        response, queries = self._saved_set_queries('/flashcard-sets/')
+
+        self.assertEqual(queries, [])
+        self.assertFalse(any(row['is_saved'] for row in response.data['results']))
+
+
+class FlashcardCursorPaginationTests(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='pager')
+        self.flashcard_set = FlashcardSet.objects.create(
+            title='Long set', topic=Topic.objects.create(name='Paging'), creator=self.user, is_public=True
+        )
+        created_at = timezone.now()
+        # Cùng created_at để kiểm tra thứ tự phụ theo id
+        Flashcard.objects.bulk_create(
+            Flashcard(flashcard_set=self.flashcard_set, vietnamese=f'từ {i}', english=f'word {i}') for i in range(7)
+        )
+        Flashcard.objects.filter(flashcard_set=self.flashcard_set).update(created_at=created_at)
+        self.card_ids = list(Flashcard.objects.order_by('id').values_list('id', flat=True))
+
+    def test_cursor_pages_walk_every_card_once(self):
+        seen = []
+        url = f'/flashcard-sets/{self.flashcard_set.id}/flashcards/?page_size=3'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(card['id'] for card in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(seen, self.card_ids)
+
+        # Không có tham số phân trang thì giữ dạng danh sách cũ
+        self.assertEqual(len(self.client.get(f'/flashcard-sets/{self.flashcard_set.id}/flashcards/').data), 7)
+
+    def test_detail_can_return_metadata_and_first_page(self):
+        response = self.client.get(f'/flashcard-sets/{self.flashcard_set.id}/', {'cards': 'none'})
+        self.assertNotIn('flashcards', response.data)
+        self.assertEqual(response.data['title'], 'Long set')
+
+        response = self.client.get(f'/flashcard-sets/{self.flashcard_set.id}/', {'cards': 'first_page', 'page_size': 5})
+        self.assertEqual([card['id'] for card in response.data['flashcards']], self.card_ids[:5])
+        rest = self.client.get(response.data['flashcards_next'])
+        self.assertEqual([card['id'] for card in rest.data['results']], self.card_ids[5:])
+
+
+class AdminListPaginationTests(APITestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create(username='admin', role='admin')
+        self.topic = Topic.objects.create(name='Admin')
+        for i in range(5):
+            FlashcardSet.objects.create(title=f'Set {i}', topic=self.topic, creator=self.admin, is_public=i % 2 == 0)
+        self.client.force_authenticate(self.admin)
+
+    def walk(self, url):
+        seen = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(row['id'] for row in response.data['results'])
+            url = response.data['next']
+        return seen
+
+    def test_flashcard_sets_cursor_pages_with_filters(self):
+        expected = list(FlashcardSet.objects.filter(is_public=True).order_by('-id').values_list('id', flat=True))
+        self.assertEqual(self.walk('/flashcard-sets/admin_list/?page_size=2&is_public=true'), expected)
+
+        # Số truy vấn mỗi trang không phụ thuộc số dòng
+        with self.assertNumQueries(2):
+            response = self.client.get('/flashcard-sets/admin_list/', {'page_size': 5})
+        self.assertEqual(len(response.data['results']), 5)
+
+    def test_users_cursor_pages_and_ndjson_stream(self):
+        for i in range(3):
+            User.objects.create(username=f'learner{i}')
+        expected = list(User.objects.order_by('-id').values_list('id', flat=True))
+        self.assertEqual(self.walk('/users/admin_list/?page_size=2'), expected)
+        self.assertEqual(len(self.walk('/users/admin_list/?role=admin')), 1)
+
+        # Trang keyset nhỏ hơn số dòng => luồng phải nối đúng qua nhiều trang
+        with mock.patch('api.exporters.EXPORT_CHUNK_SIZE', 2):
+            response = self.client.get('/users/admin_list/', {'stream': 'ndjson', 'q': 'learner'})
+            self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+            rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row['username'] for row in rows], ['learner2', 'learner1', 'learner0'])
+
+    def test_non_admin_is_forbidden(self):
+        self.client.force_authenticate(User.objects.create(username='plain'))
+        self.assertEqual(self.client.get('/flashcard-sets/admin_list/').status_code, 403)
+        self.assertEqual(self.client.get('/users/admin_list/').status_code, 403)
+
+
+class SearchTests(APITestCase):
+
+    def setUp(self):
+        SearchService._memory_index = None
+        self.addCleanup(setattr, SearchService, '_memory_index', None)
+        self.user = User.objects.create(username='searcher')
+        topic = Topic.objects.create(name='Search')
+        self.food = FlashcardSet.objects.create(
+            title='Món ăn Việt Nam', description='Từ vựng về đồ ăn', topic=topic, creator=self.user, is_public=True
+        )
+        self.travel = FlashcardSet.objects.create(
+            title='Du lịch', description='Các món ăn khi đi du lịch', topic=topic, creator=self.user, is_public=True
+        )
+        self.hidden = FlashcardSet.objects.create(title='Món ăn riêng', topic=topic, creator=self.user)
+        Flashcard.objects.create(flashcard_set=self.food, vietnamese='phở bò', english='beef noodle soup')
+        Flashcard.objects.create(flashcard_set=self.food, vietnamese='bánh mì', english='bread')
+        Flashcard.objects.create(flashcard_set=self.hidden, vietnamese='bánh xèo', english='sizzling pancake')
+
+    def test_normalize_strips_vietnamese_diacritics(self):
+        self.assertEqual(normalize_text('Tiếng Việt ĐẸP!', None, 'Đi-học'), 'tieng viet dep di hoc')
+        self.assertEqual(self.food.search_text, 'mon an viet nam tu vung ve do an')
+
+    def test_search_ranks_public_sets_without_diacritics(self):
+        response = self.client.get('/search/', {'q': 'mon an', 'type': 'sets'})
+        self.assertEqual(response.status_code, 200)
+        # Khớp ở tiêu đề xếp trên khớp ở mô tả, bộ riêng tư không xuất hiện
+        self.assertEqual([row['id'] for row in response.data['sets']], [self.food.id, self.travel.id])
+        self.assertNotIn('cards', response.data)
+
+    def test_search_cards_with_prefix_on_last_token(self):
+        response = self.client.get('/search/', {'q': 'Bánh'})
+        self.assertEqual([row['english'] for row in response.data['cards']], ['bread'])
+        self.assertEqual(response.data['cards'][0]['flashcard_set_title'], self.food.title)
+
+        response = self.client.get('/search/', {'q': 'beef nood', 'type': 'cards'})
+        self.assertEqual([row['vietnamese'] for row in response.data['cards']], ['phở bò'])
+        self.assertEqual(self.client.get('/search/', {'q': ' !! '}).status_code, 400)
+
+    def test_index_follows_edits(self):
+        self.assertEqual(SearchService.search_sets('bien'), [])
+        self.travel.title = 'Biển đảo'
+        self.travel.save(update_fields=['title'])
+        self.travel.refresh_from_db()
+        self.assertEqual(self.travel.search_text, 'bien dao cac mon an khi di du lich')
+        self.assertEqual(SearchService.search_sets('bien'), [self.travel])
+
+    def test_other_workers_apply_changes_without_rebuilding(self):
+        worker_a, worker_b = MemorySearchIndex(), MemorySearchIndex()
+        self.assertEqual(worker_b.search('sets', ['bien'], 10), [])
+        built_ms = worker_b.build_ms
+
+        # Worker A sửa dữ liệu; worker B chỉ thấy qua nhật ký trong DB (không qua cache của process)
+        self.travel.title = 'Biển đảo'
+        self.travel.save(update_fields=['title'])
+        self.food.is_public = False
+        self.food.save(update_fields=['is_public'])
+        cache.clear()
+
+        self.assertEqual([doc for doc, _ in worker_b.search('sets', ['bien'], 10)], [self.travel.id])
+        self.assertEqual(worker_b.search('sets', ['vung'], 10), [])
+        # Bộ chuyển sang riêng tư => thẻ của bộ cũng ra khỏi chỉ mục
+        self.assertEqual(worker_b.search('cards', ['pho'], 10), [])
+        self.assertIs(worker_b.build_ms, built_ms)
+        self.assertEqual(worker_b.applied_changes, 2)
+        self.assertEqual(worker_b.cards.doc_count, 0)
+        self.assertNotIn('vung', worker_b.sets.vocabulary)
+
+        self.food.is_public = True
+        self.food.save(update_fields=['is_public'])
+        self.assertEqual(len(worker_b.search('cards', ['banh'], 10)), 1)
+        self.assertEqual(worker_a.search('cards', ['banh'], 10), worker_b.search('cards', ['banh'], 10))
+
+    def test_imported_cards_are_applied_as_one_change(self):
+        index = SearchService.memory_index()
+        index.search('cards', ['ca'], 10)
+        upload = SimpleUploadedFile('cards.csv', 'vietnamese,english\ncà phê,coffee\ncá,fish\n'.encode('utf-8'))
+        self.client.force_authenticate(self.user)
+
+        response = self.client.post(f'/flashcard-sets/{self.food.id}/import/', {'file': upload}, format='multipart')
+
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(SearchIndexChange.objects.filter(kind=SearchIndexChange.SET_CARDS).count(), 1)
+        self.assertEqual(
+            sorted(card.english for card in SearchService.search_cards('ca')), ['coffee', 'fish']
+        )
+
+    def test_list_query_filter_is_diacritic_insensitive(self):
+        response = self.client.get('/flashcard-sets/', {'q': 'du lich'})
+        self.assertEqual([row['id'] for row in response.data['results']], [self.travel.id])
+
+    def test_fulltext_query_building(self):
+        self.assertEqual(boolean_query(['mon', 'an', 'viet']), '+mon +viet*')
+        with override_settings(SEARCH_FULLTEXT_MIN_TOKEN_SIZE=1):
+            self.assertEqual(boolean_query(['mon', 'an']), '+mon +an*')
+        sql = str(FlashcardSet.objects.alias(
+            relevance=FullTextMatch('search_text', '+mon*')).filter(relevance__gt=0).query)
+        self.assertIn('MATCH ("api_flashcardset"."search_text") AGAINST (+mon* IN BOOLEAN MODE)', sql)
+
+
+class PrefixTrieTests(SimpleTestCase):
+
+    def test_top_k_orders_by_count_and_prunes_removed_phrases(self):
+        trie = PrefixTrie(max_terms=100)
+        trie.add('bánh mì', 3)
+        trie.add('Banh xeo')
+        trie.add('bàn', 2)
+        trie.add('book', 5)
+
+        self.assertEqual(trie.top_k('ban', 10), [('bánh mì', 3), ('bàn', 2), ('Banh xeo', 1)])
+        self.assertEqual(trie.top_k('BÁNH', 1), [('bánh mì', 3)])
+        self.assertEqual(trie.top_k('x', 10), [])
+
+        trie.add('banh mi', -3)
+        self.assertEqual(trie.top_k('banh', 10), [('Banh xeo', 1)])
+        self.assertNotIn('m', trie.root.children['b'].children['a'].children['n'].children['h'].children[' '].children)
+        self.assertEqual(trie.root.best, 5)
+        self.assertEqual(trie.size, 3)
+
+    def test_max_terms_bounds_new_phrases(self):
+        trie = PrefixTrie(max_terms=2)
+        for phrase in ('one', 'two', 'three'):
+            trie.add(phrase)
+        trie.add('one')
+        self.assertEqual((trie.size, trie.dropped), (2, 1))
+        self.assertEqual(trie.top_k('t', 5), [('two', 1)])
+        self.assertEqual(trie.top_k('o', 5), [('one', 2)])
+
+
+class SuggestionIndexTests(APITestCase):
+
+    def setUp(self):
+        SuggestionIndex.reset()
+        self.addCleanup(SuggestionIndex.reset)
+        self.user = User.objects.create(username='typer')
+        self.topic = Topic.objects.create(name='Động vật')
+        self.animals = FlashcardSet.objects.create(title='Động vật hoang dã', topic=self.topic,
+                                                   creator=self.user, is_public=True)
+        self.hidden = FlashcardSet.objects.create(title='Đồ dùng', topic=self.topic, creator=self.user)
+        for english, vietnamese in (('dog', 'con chó'), ('dolphin', 'cá heo'), ('dog', 'con chó')):
+            Flashcard.objects.create(flashcard_set=self.animals, english=english, vietnamese=vietnamese)
+        Flashcard.objects.create(flashcard_set=self.hidden, english='door', vietnamese='cửa')
+
+    def suggest(self, prefix):
+        response = self.client.get('/search/suggest/', {'prefix': prefix})
+        self.assertEqual(response.status_code, 200)
+        return [(row['text'], row['count']) for row in response.data['suggestions']]
+
+    def test_suggests_terms_titles_and_topics_by_prefix(self):
+        self.assertEqual(self.suggest('do'), [('dog', 2), ('dolphin', 1), ('Động vật', 1), ('Động vật hoang dã', 1)])
+        self.assertEqual(self.suggest('dong'), [('Động vật', 1), ('Động vật hoang dã', 1)])
+        self.assertEqual(self.suggest('con ch'), [('con chó', 2)])
+        self.assertEqual(self.suggest(''), [])
+
+        # Đã dựng xong thì trả lời từ bộ nhớ, không truy vấn DB
+        with self.assertNumQueries(0):
+            self.client.get('/search/suggest/', {'prefix': 'd'})
+
+    def test_signals_update_index_incrementally(self):
+        self.suggest('d')
+        with self.captureOnCommitCallbacks(execute=True):
+            card = Flashcard.objects.create(flashcard_set=self.animals, english='dove', vietnamese='chim bồ câu')
+        self.assertIn(('dove', 1), self.suggest('dov'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            card.english = 'duck'
+            card.save()
+        self.assertEqual(self.suggest('dov'), [])
+        self.assertEqual(self.suggest('duc'), [('duck', 1)])
+
+        # Bộ chuyển sang riêng tư => bỏ tiêu đề và từ vựng; công khai bộ khác => thêm vào
+        with self.captureOnCommitCallbacks(execute=True):
+            self.animals.is_public = False
+            self.animals.save()
+            self.hidden.is_public = True
+            self.hidden.save()
+        self.assertEqual(self.suggest('do'), [('door', 1), ('Đồ dùng', 1), ('Động vật', 1)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.hidden.delete()
+        self.assertEqual(self.suggest('do'), [('Động vật', 1)])
+
+
+class FlashcardSetCounterTests(APITestCase):
+
+    def setUp(self):
+        self.creator = User.objects.create(username='owner')
+        self.users = [User.objects.create(username=f'rater{i}') for i in range(3)]
+        self.flashcard_set = FlashcardSet.objects.create(
+            title='Colors', topic=Topic.objects.create(name='Art'), creator=self.creator, is_public=True
+        )
+
+    def tearDown(self):
+        cache.clear()
+
+    def _reload(self):
+        self.flashcard_set.refresh_from_db()
+        return self.flashcard_set
+
+    def test_card_counter_uses_single_update(self):
+        with CaptureQueriesContext(connection) as ctx:
+            card = Flashcard.objects.create(flashcard_set=self.flashcard_set, vietnamese='đỏ', english='red')
+        self.assertFalse(any('COUNT(' in q['sql'].upper() for q in ctx.captured_queries))
+        Flashcard.objects.create(flashcard_set=self.flashcard_set, vietnamese='xanh', english='blue')
+        card.delete()
+        self.assertEqual(self._reload().total_cards, 1)
+
+    def test_rating_average_is_maintained_from_sum_and_count(self):
+        for user, rating in zip(self.users, [5, 4, 2]):
+            self.client.force_authenticate(user)
+            response = self.client.post(f'/flashcard-sets/{self.flashcard_set.id}/rate/', {'rating': rating})
+        self.assertEqual(response.data['average_rating'], 3.7)
+
+        self.client.post(f'/flashcard-sets/{self.flashcard_set.id}/rate/', {'rating': 5})
+        SavedFlashcardSet.objects.get(user=self.users[0]).delete()
+        flashcard_set = self._reload()
+        self.assertEqual((flashcard_set.total_saves, flashcard_set.rating_sum, flashcard_set.rating_count), (2, 9, 2))
+        self.assertEqual(flashcard_set.average_rating, 4.5)
+
+        self.client.post(f'/flashcard-sets/{self.flashcard_set.id}/save/')
+        self.assertEqual(self._reload().total_saves, 1)
+        self.assertEqual(self.flashcard_set.average_rating, 4.0)
+
+    def test_reconcile_command_repairs_drift(self):
+        Flashcard.objects.create(flashcard_set=self.flashcard_set, vietnamese='vàng', english='yellow')
+        SavedFlashcardSet.objects.create(user=self.users[0], flashcard_set=self.flashcard_set, rating=4)
+        FlashcardSet.objects.filter(pk=self.flashcard_set.pk).update(
+            total_cards=9, total_saves=0, rating_sum=0, rating_count=0, average_rating=0
+        )
+
+        call_command('reconcile_set_counters', stdout=StringIO())
+        flashcard_set = self._reload()
+        self.assertEqual(
+            (flashcard_set.total_cards, flashcard_set.total_saves, flashcard_set.rating_count, flashcard_set.average_rating),
+            (1, 1, 1, 4.0)
+        )
+
+
+class FlashcardImportTests(APITestCase):
+
+    def setUp(self):
+        self.creator = User.objects.create(username='importer')
+        self.flashcard_set = FlashcardSet.objects.create(
+            title='Imported', topic=Topic.objects.create(name='Bulk'), creator=self.creator
+        )
+        self.client.force_authenticate(self.creator)
+
+    def _import(self, name, content, **params):
+        upload = SimpleUploadedFile(name, content.encode('utf-8'))
+        return self.client.post(
+            f'/flashcard-sets/{self.flashcard_set.id}/import/?{urlencode(params)}', {'file': upload}, format='multipart'
+        )
+
+    def test_csv_rows_are_validated_and_bulk_inserted(self):
+        content = 'vietnamese,english,word_type\nmèo,cat,noun\n,dog,noun\nchạy,run,verbish\nnhảy,jump,verb\n'
+        response = self._import('cards.csv', content)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['created'], response.data['error_count']), (2, 2))
+        self.assertEqual([error['line'] for error in response.data['errors']], [3, 4])
+        self.assertIn('vietnamese', response.data['errors'][0]['errors'])
+        self.assertEqual(response.data['total_cards'], 2)
+
+    def test_jsonl_import_uses_chunked_inserts(self):
+        lines = '\n'.join(json.dumps({'vietnamese': f'từ {i}', 'english': f'word {i}'}) for i in range(2500))
+        with mock.patch.object(Flashcard.objects, 'bulk_create', wraps=Flashcard.objects.bulk_create) as bulk:
+            response = self._import('cards.jsonl', lines + '\nnot json\n')
+
+        self.assertEqual((response.data['created'], response.data['error_count']), (2500, 1))
+        self.assertEqual([len(call.args[0]) for call in bulk.call_args_list], [1000, 1000, 500])
+        self.flashcard_set.refresh_from_db()
+        self.assertEqual(self.flashcard_set.total_cards, 2500)
+
+    def test_tsv_missing_column_and_other_users_are_rejected(self):
+        response = self._import('cards.txt', 'vietnamese\tmeaning\nmèo\tcat\n', file_format='tsv')
+        self.assertEqual(response.status_code, 400)
+
+        self.client.force_authenticate(User.objects.create(username='stranger'))
+        response = self._import('cards.csv', 'vietnamese,english\nmèo,cat\n')
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Flashcard.objects.exists())
+
+
+class ExportTests(APITestCase):
+
+    def setUp(self):
+        self.creator = User.objects.create(username='exporter')
+        topic = Topic.objects.create(name='Music')
+        self.flashcard_set = FlashcardSet.objects.create(title='Instruments', topic=topic, creator=self.creator)
+        self.cards = [
+            Flashcard.objects.create(flashcard_set=self.flashcard_set, vietnamese=f'từ, {i}', english=f'word {i}')
+            for i in range(5)
+        ]
+        self.client.force_authenticate(self.creator)
+
+    def _content(self, response):
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode('utf-8')
+
+    def test_set_export_as_csv_and_ndjson(self):
+        content = self._content(self.client.get(f'/flashcard-sets/{self.flashcard_set.id}/export/'))
+        rows = list(csv.DictReader(StringIO(content)))
+        self.assertEqual([row['vietnamese'] for row in rows], [card.vietnamese for card in self.cards])
+        self.assertEqual(rows[0]['set_title'], 'Instruments')
+
+        content = self._content(
+            self.client.get(f'/flashcard-sets/{self.flashcard_set.id}/export/', {'file_format': 'ndjson'})
+        )
+        self.assertEqual(
+            [json.loads(line)['english'] for line in content.splitlines()], [card.english for card in self.cards]
+        )
+
+    def test_history_export_streams_each_source(self):
+        UserProgress.objects.create(user=self.creator, flashcard=self.cards[0], times_reviewed=2)
+        DailyStats.objects.create(user=self.creator, date=date(2025, 3, 1), cards_studied=2)
+        GameSession.objects.create(user=self.creator, game_type='word_match', score=40)
+
+        content = self._content(self.client.get('/users/export_history/'))
+        records = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual([record['type'] for record in records], ['progress', 'daily_stats', 'game_session'])
+        self.assertEqual(records[1]['date'], '2025-03-01')
+
+        self.client.force_authenticate(User.objects.create(username='curious'))
+        self.assertEqual(self.client.get('/users/export_history/', {'user_id': self.creator.id}).status_code, 403)
+
+    def test_exports_page_by_keyset_instead_of_iterator(self):
+        other_set = FlashcardSet.objects.create(title='Songs', topic=self.flashcard_set.topic, creator=self.creator)
+        Flashcard.objects.create(flashcard_set=other_set, vietnamese='bài hát', english='song')
+        sets = FlashcardSet.objects.filter(pk__in=[self.flashcard_set.pk, other_set.pk])
+
+        with mock.patch('api.exporters.EXPORT_CHUNK_SIZE', 2), CaptureQueriesContext(connection) as ctx:
+            rows = list(flashcard_rows(sets))
+        self.assertEqual([row['id'] for row in rows], [card.id for card in self.cards] + [rows[-1]['id']])
+        self.assertEqual(rows[-1]['set_title'], 'Songs')
+        self.assertEqual(len(ctx.captured_queries), 4)  # 6 thẻ / trang 2 => 3 trang đầy + 1 trang rỗng để dừng
+        self.assertTrue(all('LIMIT 2' in query['sql'] for query in ctx.captured_queries))
+
+        with mock.patch('api.exporters.EXPORT_CHUNK_SIZE', 2):
+            newest_first = list(keyset_rows(Flashcard.objects.all(), ['english'], descending=True))
+        self.assertEqual(newest_first[0], {'english': 'song'})
+        self.assertEqual(len(newest_first), 6)
+
+    def test_export_command_writes_rows(self):
+        out = StringIO()
+        call_command('export_data', 'sets', '--file-format', 'ndjson', '--set', str(self.flashcard_set.id), stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 5)
+
+
+class FlashcardProgressQueryTests(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='learner', password='secret')
+        topic = Topic.objects.create(name='Food')
+        self.flashcard_set = FlashcardSet.objects.create(
+            title='Food words', topic=topic, creator=self.user, is_public=True
+        )
+        self.cards = [
+            Flashcard.objects.create(flashcard_set=self.flashcard_set, vietnamese=f'từ {i}', english=f'word {i}')
+            for i in range(25)
+        ]
+        UserProgress.objects.create(user=self.user, flashcard=self.cards[0], mastery_level=30, times_reviewed=3)
+        self.client.force_authenticate(self.user)
+
+    def _progress_queries(self, path):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        table = UserProgress._meta.db_table
+        return response, [q for q in ctx.captured_queries if table in q['sql']]
+
+    def test_set_detail_loads_progress_in_one_query(self):
+        response, queries = self._progress_queries(f'/flashcard-sets/{self.flashcard_set.id}/')
+
+        self.assertEqual(len(queries), 1)
+        cards = {card['id']: card for card in response.data['flashcards']}
+        self.assertEqual(len(cards), 25)
+        self.assertEqual(cards[self.cards[0].id]['user_progress'], {
+            'mastery_level': 30, 'times_reviewed': 3, 'is_learned': False, 'is_difficult': False
+        })
+        self.assertIsNone(cards[self.cards[1].id]['user_progress'])
+
+    def test_card_listing_loads_progress_in_one_query(self):
+        response, queries = self._progress_queries(f'/flashcard-sets/{self.flashcard_set.id}/flashcards/')
+
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(len(response.data), 25)
+
+
+class StudyBatchTests(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='learner')
+        topic = Topic.objects.create(name='Work')
+        flashcard_set = FlashcardSet.objects.create(title='Office', topic=topic, creator=self.user)
+        self.cards = [
+            Flashcard.objects.create(flashcard_set=flashcard_set, vietnamese=f'từ {i}', english=f'word {i}')
+            for i in range(3)
+        ]
+        UserProgress.objects.create(
+            user=self.user, flashcard=self.cards[0], mastery_level=50, times_reviewed=4, times_correct=4
+        )
+        self.client.force_authenticate(self.user)
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_batch_applies_reviews_in_order(self):
+        reviews = [
+            {'flashcard_id': self.cards[0].id, 'is_correct': True},
+            {'flashcard_id': self.cards[1].id, 'is_correct': True},
+            {'flashcard_id': self.cards[1].id, 'is_correct': False, 'difficulty_rating': 3},
+            {'flashcard_id': self.cards[2].id, 'is_correct': True},
+        ]
+        response = self.client.post('/flashcards/study-batch/', {'reviews': reviews}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['reviewed'], 4)
+        first = UserProgress.objects.get(user=self.user, flashcard=self.cards[0])
+        self.assertEqual((first.mastery_level, first.times_reviewed, first.times_correct), (60, 5, 5))
+        second = UserProgress.objects.get(user=self.user, flashcard=self.cards[1])
+        self.assertEqual((second.mastery_level, second.times_reviewed, second.times_correct), (5, 2, 1))
+        self.assertTrue(second.is_difficult)
+        self.assertEqual(second.difficulty_rating, 3)
+
+        daily = DailyStats.objects.get(user=self.user)
+        self.assertEqual((daily.cards_studied, daily.new_words_learned, daily.words_reviewed), (4, 2, 2))
+        self.assertEqual(daily.accuracy_rate, 87.5)
+        self.assertEqual(UserStats.objects.get(user=self.user).words_learned, 3)
+
+    def test_rows_created_by_concurrent_batch_do_not_conflict(self):
+        # Batch song song đã chèn (và ôn) cards[1], còn cards[2] mới chỉ được chèn
+        UserProgress.objects.create(user=self.user, flashcard=self.cards[1], times_reviewed=1, times_correct=1)
+        UserProgress.objects.create(user=self.user, flashcard=self.cards[2])
+        reviews = [{'flashcard_id': card.id, 'is_correct': True} for card in self.cards]
+
+        response = self.client.post('/flashcards/study-batch/', {'reviews': reviews}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(UserProgress.objects.filter(user=self.user).count(), 3)
+        self.assertEqual(
+            list(UserProgress.objects.filter(user=self.user).order_by('flashcard_id').values_list(
+                'times_reviewed', flat=True)),
+            [5, 2, 1]
+        )
+        self.assertEqual(DailyStats.objects.get(user=self.user).new_words_learned, 1)
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        def post(cards):
+            reviews = [{'flashcard_id': card.id, 'is_correct': True} for card in cards]
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.post('/flashcards/study-batch/', {'reviews': reviews}, format='json')
+            self.assertEqual(response.status_code, 200)
+            return len(ctx.captured_queries)
+
+        post(self.cards)  # lần đầu dựng UserStats, DailyStats và tiến trình các thẻ
+        self.assertEqual(post(self.cards[:1]), post(self.cards))
+
+    def test_accuracy_uses_lifetime_counters(self):
+        self.client.post(f'/flashcards/{self.cards[1].id}/study/', {'is_correct': False}, format='json')
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.post(f'/flashcards/{self.cards[2].id}/study/', {'is_correct': True}, format='json')
+        self.assertFalse(any('SUM(' in q['sql'].upper() for q in ctx.captured_queries))
+        stats = UserStats.objects.get(user=self.user)
+        self.assertEqual((stats.total_reviewed, stats.total_correct), (6, 5))
+        self.assertEqual(DailyStats.objects.get(user=self.user).accuracy_rate, 83.3)
+
+    def test_rebuild_command_repairs_review_totals(self):
+        UserStats.rebuild_for(self.user)
+        UserStats.objects.filter(user=self.user).update(total_reviewed=100, total_correct=1)
+
+        call_command('rebuild_user_stats', '--reviews-only', stdout=StringIO())
+        stats = UserStats.objects.get(user=self.user)
+        self.assertEqual((stats.total_reviewed, stats.total_correct), (4, 4))
+
+    def test_unknown_flashcard_rejects_whole_batch(self):
+        reviews = [
+            {'flashcard_id': self.cards[1].id, 'is_correct': True},
+            {'flashcard_id': 999999, 'is_correct': True},
+        ]
+        response = self.client.post('/flashcards/study-batch/', {'reviews': reviews}, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['missing_ids'], [999999])
+        self.assertEqual(UserProgress.objects.filter(user=self.user).count(), 1)
+        self.assertFalse(DailyStats.objects.filter(user=self.user).exists())
+
+
+class DailyStatsAccumulateTests(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='daily')
+        self.day = date(2025, 3, 1)
+
+    def test_accumulate_inserts_then_adds_in_one_statement(self):
+        with self.assertNumQueries(1):
+            DailyStats.accumulate(self.user, self.day, cards_studied=2, new_words_learned=1, accuracy_rate=50.0)
+        with self.assertNumQueries(1):
+            DailyStats.accumulate(self.user, self.day, cards_studied=3, games_played=1, time_spent=4)
+        DailyStats.accumulate(self.user, self.day, points_earned=7, accuracy_rate=75.0)
+
+        stats = DailyStats.objects.get(user=self.user, date=self.day)
+        self.assertEqual(
+            (stats.cards_studied, stats.new_words_learned, stats.games_played, stats.time_spent, stats.points_earned),
+            (5, 1, 1, 4, 7)
+        )
+        self.assertEqual(stats.accuracy_rate, 75.0)
+
+    def test_unknown_counter_is_rejected(self):
+        with self.assertRaises(ValueError):
+            DailyStats.accumulate(self.user, self.day, accuracy=1)
+
+    def test_game_updates_daily_stats_once(self):
+        UserStats.rebuild_for(self.user)
+        self.client.force_authenticate(self.user)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.post('/game-sessions/', {
+                'game_type': 'word_match', 'score': 30, 'total_questions': 10,
+                'correct_answers': 6, 'time_spent': 61
+            }, format='json')
+        cache.clear()
+
+        table = DailyStats._meta.db_table
+        self.assertEqual(len([q for q in ctx.captured_queries if table in q['sql']]), 1)
+        stats = DailyStats.objects.get(user=self.user)
+        self.assertEqual((stats.games_played, stats.points_earned, stats.time_spent), (1, 30, 2))
+
+
+@override_settings(
+    DAILY_STATS_WRITE_BEHIND=True, DAILY_STATS_BUFFER_STORE='local', DAILY_STATS_LOCAL_FLUSH_INTERVAL=3600
+)
+class DailyStatsWriteBehindTests(APITestCase):
+
+    def setUp(self):
+        DailyStatsBuffer.reset_store()
+        self.user = User.objects.create(username='buffered')
+        topic = Topic.objects.create(name='Sport')
+        flashcard_set = FlashcardSet.objects.create(title='Ball', topic=topic, creator=self.user)
+        self.card = Flashcard.objects.create(flashcard_set=flashcard_set, vietnamese='bóng', english='ball')
+        self.client.force_authenticate(self.user)
+
+    def tearDown(self):
+        DailyStatsBuffer.reset_store()
+        cache.clear()
+
+    def test_reads_merge_pending_deltas_until_flushed(self):
+        self.client.post(f'/flashcards/{self.card.id}/study/', {'is_correct': True}, format='json')
+        self.client.post(f'/flashcards/{self.card.id}/study/', {'is_correct': False}, format='json')
+        self.assertFalse(DailyStats.objects.exists())
+
+        pending_view = self.client.get('/daily-stats/').data['results']
+        self.assertEqual(len(pending_view), 1)
+        self.assertEqual(
+            (pending_view[0]['cards_studied'], pending_view[0]['new_words_learned'], pending_view[0]['accuracy_rate']),
+            (2, 1, 50.0)
+        )
+
+        self.assertEqual(DailyStatsBuffer.flush(), 1)
+        stats = DailyStats.objects.get(user=self.user)
+        self.assertEqual((stats.cards_studied, stats.words_reviewed, stats.accuracy_rate), (2, 1, 50.0))
+        self.assertEqual(DailyStatsBuffer.pending_for(self.user), {})
+        flushed_view = self.client.get('/daily-stats/').data['results']
+        self.assertEqual(
+            [dict(row, id=None) for row in flushed_view], [dict(row, id=None) for row in pending_view]
+        )
+
+    def test_flush_writes_many_rows_in_one_statement(self):
+        other = User.objects.create(username='other')
+        day = timezone.localdate()
+        DailyStatsBuffer.record(self.user, day, cards_studied=1)
+        DailyStatsBuffer.record(other, day, games_played=1, accuracy_rate=90.0)
+        DailyStatsBuffer.record(self.user, day, cards_studied=2)
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(DailyStatsBuffer.flush(), 2)
+        inserts = [q for q in ctx.captured_queries if q['sql'].startswith('INSERT')]
+        self.assertEqual(len(inserts), 2)  # 1 câu cho dòng có accuracy, 1 câu cho dòng không có
+        self.assertEqual(DailyStats.objects.get(user=self.user).cards_studied, 3)
+        self.assertEqual(DailyStats.objects.get(user=other).accuracy_rate, 90.0)
+
+    def test_failed_flush_rolls_back_and_requeues_whole_batch(self):
+        other = User.objects.create(username='other')
+        day = timezone.localdate()
+        DailyStatsBuffer.record(self.user, day, cards_studied=1)
+        DailyStatsBuffer.record(other, day, games_played=1, accuracy_rate=90.0)
+
+        real_upsert = DailyStats._upsert.__func__
+        calls = []
+
+        def fail_second_batch(cls, rows, with_accuracy):
+            calls.append(with_accuracy)
+            if len(calls) == 2:
+                raise RuntimeError('db down')
+            real_upsert(cls, rows, with_accuracy)
+
+        with mock.patch.object(DailyStats, '_upsert', classmethod(fail_second_batch)):
+            with self.assertRaises(RuntimeError):
+                DailyStatsBuffer.flush()
+        self.assertFalse(DailyStats.objects.exists())
+
+        self.assertEqual(DailyStatsBuffer.flush(), 2)
+        self.assertEqual(DailyStats.objects.get(user=self.user).cards_studied, 1)
+        self.assertEqual(DailyStats.objects.get(user=other).games_played, 1)
+
+    def test_local_store_is_flushed_by_a_background_thread(self):
+        flushed = threading.Event()
+        DailyStatsBuffer.reset_store()
+        with override_settings(DAILY_STATS_LOCAL_FLUSH_INTERVAL=0.01), \
+                mock.patch.object(DailyStatsBuffer, 'flush', side_effect=lambda: flushed.set()):
+            DailyStatsBuffer.record(self.user, cards_studied=1)
+            self.assertTrue(flushed.wait(2))
+
+        DailyStatsBuffer.reset_store()
+        with override_settings(DAILY_STATS_LOCAL_FLUSH_INTERVAL=0):
+            with self.assertRaises(ImproperlyConfigured):
+                DailyStatsBuffer.get_store()
+
+    def test_flush_command_refuses_per_process_store(self):
+        # Lệnh chạy trong process riêng nên không thấy delta của các web worker
+        with self.assertRaises(CommandError):
+            call_command('flush_daily_stats', stdout=StringIO())
+
+    def test_redis_store_requires_django_redis_cache(self):
+        DailyStatsBuffer.reset_store()
+        with override_settings(DAILY_STATS_BUFFER_STORE='redis'):
+            with self.assertRaises(ImproperlyConfigured):
+                DailyStatsBuffer.get_store()
+
+
+class ReviewScheduleTests(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='scheduler')
+        topic = Topic.objects.create(name='Nature')
+        flashcard_set = FlashcardSet.objects.create(title='Trees', topic=topic, creator=self.user)
+        self.cards = [
+            Flashcard.objects.create(flashcard_set=flashcard_set, vietnamese=f'từ {i}', english=f'word {i}')
+            for i in range(4)
+        ]
+        self.client.force_authenticate(self.user)
+
+    def test_sm2_intervals_grow_and_reset_on_lapse(self):
+        progress = UserProgress(user=self.user, flashcard=self.cards[0])
+        reviewed_at = utc(2025, 3, 1, 8)
+
+        intervals = []
+        for is_correct in [True, True, True, False]:
+            progress.apply_review(is_correct, reviewed_at=reviewed_at)
+            intervals.append(progress.interval_days)
+        self.assertEqual(intervals, [1, 6, 15, 1])
+        self.assertEqual(progress.repetitions, 0)
+        self.assertAlmostEqual(progress.ease_factor, 2.18)
+        self.assertEqual(progress.due_at, utc(2025, 3, 2, 8))
+
+        for _ in range(10):
+            progress.apply_review(False, difficulty_rating=1, reviewed_at=reviewed_at)
+        self.assertEqual(progress.ease_factor, UserProgress.MIN_EASE_FACTOR)
+
+    def test_invalid_difficulty_rating_is_rejected(self):
+        for rating in [0, 6, -1, 'abc']:
+            response = self.client.post(
+                f'/flashcards/{self.cards[0].id}/study/', {'is_correct': True, 'difficulty_rating': rating},
+                format='json'
+            )
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('difficulty_rating', response.data)
+        self.assertFalse(UserProgress.objects.filter(user=self.user).exists())
+
+        for rating in [0, 6, 'abc']:
+            with self.assertRaises(ValueError):
+                UserProgress.review_quality(True, rating)
+        self.assertEqual(UserProgress.review_quality(True, '5'), 5)
+
+    def test_due_returns_overdue_cards_in_due_order(self):
+        now = timezone.now()
+        for card, offset in zip(self.cards, [-1, -3, 2, -2]):
+            UserProgress.objects.create(
+                user=self.user, flashcard=card, last_reviewed=now, due_at=now + timedelta(days=offset)
+            )
+
+        response = self.client.get('/progress/due/', {'limit': 2})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [row['flashcard']['id'] for row in response.data], [self.cards[1].id, self.cards[3].id]
+        )
+        self.assertEqual(len(self.client.get('/progress/due/').data), 3)
+
+    def test_study_schedules_next_review(self):
+        self.client.post(f'/flashcards/{self.cards[0].id}/study/', {'is_correct': True}, format='json')
+
+        progress = UserProgress.objects.get(user=self.user, flashcard=self.cards[0])
+        self.assertEqual((progress.interval_days, progress.repetitions), (1, 1))
+        self.assertEqual(progress.due_at, progress.last_reviewed + timedelta(days=1))
+        self.assertEqual(self.client.get('/progress/due/').data, [])
+
+
+class AchievementEngineTests(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='gamer', password='secret')
+        self.achievement = Achievement.objects.create(
+            name='Người chơi mới', description='Chơi 3 ván game đầu tiên', icon='puzzle-piece',
+            achievement_type='gaming', requirement_value=3, points=15
+        )
+        Achievement.objects.create(
+            name='Học viên chăm chỉ', description='Học được 20 từ vựng đầu tiên', icon='book-open',
+            achievement_type='learning', requirement_value=20, points=25
+        )
+
+    def tearDown(self):
+        # Danh sách thành tích được cache theo process, không tự xóa khi rollback
+        cache.clear()
+
+    def _finish_game(self):
+        GameSession.objects.create(user=self.user, game_type='word_match', score=10)
+        return AchievementService.handle_event(self.user, AchievementEvent.GAME_FINISHED)
+
+    def test_counters_are_rebuilt_then_incremented(self):
+        GameSession.objects.create(user=self.user, game_type='word_match')
+
+        self.assertEqual(self._finish_game(), [])
+        self.assertEqual(UserStats.objects.get(user=self.user).games_played, 2)
+        self.assertEqual(self._finish_game(), [self.achievement])
+        self.assertEqual(UserStats.objects.get(user=self.user).games_played, 3)
+        self.assertEqual(self._finish_game(), [])
+        self.assertEqual(UserAchievement.objects.filter(user=self.user).count(), 1)
+
+    def test_event_query_count_does_not_grow_with_history(self):
+        self._finish_game()
+        self.user = User.objects.get(pk=self.user.pk)
+        GameSession.objects.bulk_create(
+            GameSession(user=self.user, game_type='guess_word') for _ in range(50)
+        )
+        UserAchievement.objects.create(user=self.user, achievement=self.achievement)
+
+        # stats + tăng bộ đếm + thành tích đã đạt
+        with self.assertNumQueries(3):
+            AchievementService.handle_event(self.user, AchievementEvent.GAME_FINISHED)
+
+    def test_unsave_decrements_without_checking(self):
+        AchievementService.handle_event(self.user, AchievementEvent.SET_SAVED, delta=0)
+        AchievementService.handle_event(self.user, AchievementEvent.SET_SAVED)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(AchievementService.handle_event(self.user, AchievementEvent.SET_SAVED, delta=-1), [])
+        self.assertEqual(UserStats.objects.get(user=self.user).sets_saved, 0)
+
+
+def utc(*args):
+    return datetime(*args, tzinfo=dt_timezone.utc)
+
+
+class StreakTests(APITestCase):
+    # Asia/Ho_Chi_Minh là UTC+7: 17:00 UTC là nửa đêm giờ địa phương
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='streaker', password='secret')
+        topic = Topic.objects.create(name='Daily')
+        flashcard_set = FlashcardSet.objects.create(title='Daily', topic=topic, creator=self.user)
+        self.card = Flashcard.objects.create(flashcard_set=flashcard_set, vietnamese='ngày', english='day')
+
+    def _review_at(self, moment):
+        with mock.patch('django.utils.timezone.now', return_value=moment):
+            AchievementService.handle_event(self.user, AchievementEvent.CARD_REVIEWED, delta=0)
+
+    def _streak_at(self, moment):
+        with mock.patch('django.utils.timezone.now', return_value=moment):
+            return AchievementService._calculate_current_streak(self.user)
+
+    def test_local_midnight_starts_a_new_day(self):
+        UserStats.objects.create(user=self.user)
+        self._review_at(utc(2025, 3, 1, 16, 30))  # 23:30 ngày 1/3
+        self._review_at(utc(2025, 3, 1, 16, 59))  # vẫn ngày 1/3
+        self.assertEqual(self._streak_at(utc(2025, 3, 1, 16, 59)), 1)
+
+        self._review_at(utc(2025, 3, 1, 17, 1))  # 00:01 ngày 2/3
+        self.assertEqual(self._streak_at(utc(2025, 3, 1, 17, 1)), 2)
+        self.assertEqual(UserStats.objects.get(user=self.user).last_active_date, date(2025, 3, 2))
+
+    def test_gap_resets_and_idle_today_reads_zero(self):
+        UserStats.objects.create(user=self.user)
+        self._review_at(utc(2025, 3, 1, 10))
+        self._review_at(utc(2025, 3, 2, 10))
+        self.assertEqual(self._streak_at(utc(2025, 3, 3, 10)), 0)
+
+        self._review_at(utc(2025, 3, 4, 10))
+        self.assertEqual(self._streak_at(utc(2025, 3, 4, 10)), 1)
+
+    def test_rebuild_uses_local_dates_from_history(self):
+        DailyStats.objects.create(user=self.user, date=date(2025, 2, 28), cards_studied=4)
+        DailyStats.objects.create(user=self.user, date=date(2025, 2, 27), cards_studied=0)
+        # 17:10 UTC ngày 28/2 là 00:10 ngày 1/3 giờ Việt Nam
+        UserProgress.objects.create(user=self.user, flashcard=self.card, last_reviewed=utc(2025, 2, 28, 17, 10))
+
+        with mock.patch('django.utils.timezone.now', return_value=utc(2025, 3, 1, 9)):
+            with self.assertNumQueries(2):
+                streak, last_active_date = UserStats.calculate_streak(self.user)
+
+        self.assertEqual((streak, last_active_date), (2, date(2025, 3, 1)))
+        self.assertEqual(self._streak_at(utc(2025, 3, 1, 9)), 2)
+
+
+class LeaderboardTests(APITestCase):
+
+    def setUp(self):
+        self.users = [User.objects.create(username=f'player{i}') for i in range(12)]
+
+    def _play(self, user, score, game_type='word_match'):
+        self.client.force_authenticate(user)
+        response = self.client.post('/game-sessions/', {'game_type': game_type, 'score': score})
+        self.assertEqual(response.status_code, 201)
+
+    def test_top_scores_use_best_score_per_user(self):
+        for i, user in enumerate(self.users):
+            self._play(user, i * 10)
+        self._play(self.users[0], 500)
+        self._play(self.users[0], 20, game_type='guess_word')
+
+        self.client.force_authenticate(None)
+        with self.assertNumQueries(1):
+            response = self.client.get('/game-sessions/leaderboard/')
+        self.assertEqual(len(response.data), 10)
+        self.assertEqual(response.data[0]['user']['id'], self.users[0].id)
+        self.assertEqual(response.data[0]['best_score'], 500)
+        self.assertEqual(response.data[0]['total_games'], 3)
+        self.assertEqual(response.data[1]['best_score'], 110)
+
+        response = self.client.get('/game-sessions/leaderboard/', {'game_type': 'guess_word'})
+        self.assertEqual([row['best_score'] for row in response.data], [20])
+
+    def test_user_rank_and_windows(self):
+        with mock.patch('django.utils.timezone.now', return_value=utc(2025, 3, 3, 3)):
+            self._play(self.users[0], 300)
+        self._play(self.users[1], 100)
+        self._play(self.users[2], 200)
+
+        self.client.force_authenticate(self.users[1])
+        response = self.client.get('/game-sessions/leaderboard/me/')
+        self.assertEqual(response.data['rank'], 3)
+        response = self.client.get('/game-sessions/leaderboard/me/', {'window': 'daily'})
+        self.assertEqual(response.data['rank'], 2)
+
+        response = self.client.get('/game-sessions/leaderboard/', {'window': 'weekly'})
+        self.assertEqual([row['best_score'] for row in response.data], [200, 100])
+
+    def test_rebuild_matches_incremental_updates(self):
+        for i, user in enumerate(self.users[:4]):
+            self._play(user, 50 + i)
+            self._play(user, 10, game_type='crossword')
+        incremental = set(LeaderboardEntry.objects.values_list(
+            'user_id', 'game_type', 'window', 'period', 'best_score', 'total_games'
+        ))
+
+        LeaderboardService.rebuild()
+
+        rebuilt = set(LeaderboardEntry.objects.values_list(
+            'user_id', 'game_type', 'window', 'period', 'best_score', 'total_games'
+        ))
+        self.assertEqual(rebuilt, incremental)
+
+    def test_tied_scores_rank_matches_top_order(self):
+        for user in self.users[:3]:
+            self._play(user, 100)
+
+        self.client.force_authenticate(None)
+        top = self.client.get('/game-sessions/leaderboard/').data
+        for row in top:
+            self.client.force_authenticate(User.objects.get(pk=row['user']['id']))
+            response = self.client.get('/game-sessions/leaderboard/me/')
+            self.assertEqual(response.data['rank'], row['rank'])
+
+    def test_row_created_concurrently_still_counts_the_game(self):
+        user = self.users[0]
+        self._play(user, 10, game_type='guess_word')
+        real_prune = LeaderboardService.prune_stale_periods
+
+        def concurrent_insert(**kwargs):
+            # Request khác của cùng user tạo dòng 'word_match' sau khi UPDATE đầu tiên không khớp
+            LeaderboardEntry.objects.create(
+                user=user, game_type='word_match', window='all_time', period='all', best_score=80, total_games=1
+            )
+            return real_prune(**kwargs)
+
+        with mock.patch.object(LeaderboardService, 'prune_stale_periods', side_effect=concurrent_insert):
+            LeaderboardService.record_game(GameSession(user=user, game_type='word_match', score=30))
+
+        rows = {
+            (row.game_type, row.window): (row.best_score, row.total_games)
+            for row in LeaderboardEntry.objects.filter(user=user)
+        }
+        self.assertEqual(rows[('word_match', 'all_time')], (80, 2))
+        self.assertEqual(rows[('word_match', 'daily')], (30, 1))
+        self.assertEqual(rows[(LeaderboardEntry.ALL_GAMES, 'all_time')], (30, 2))
+
+    def test_stale_periods_are_pruned(self):
+        with mock.patch('django.utils.timezone.now', return_value=utc(2025, 3, 3, 3)):
+            self._play(self.users[0], 300)
+            self._play(self.users[1], 100)
+        self._play(self.users[0], 50)
+
+        user0 = set(LeaderboardEntry.objects.filter(user=self.users[0]).values_list('window', 'period'))
+        self.assertNotIn(('daily', '2025-03-03'), user0)
+        self.assertIn(('daily', LeaderboardService.period_for('daily')), user0)
+        self.assertTrue(LeaderboardEntry.objects.filter(user=self.users[1], window='daily').exists())
+
+        call_command('rebuild_leaderboard', '--prune-only', stdout=StringIO())
+        self.assertEqual(
+            set(LeaderboardEntry.objects.filter(user=self.users[1]).values_list('window', flat=True)), {'all_time'}
+        )
+
+    def test_migration_backfills_from_game_sessions(self):
+        backfill = importlib.import_module('api.migrations.0006_leaderboardentry').backfill_leaderboard
+        for i, user in enumerate(self.users[:4]):
+            self._play(user, 50 + i)
+            self._play(user, 10, game_type='crossword')
+        expected = set(LeaderboardEntry.objects.values_list(
+            'user_id', 'game_type', 'window', 'period', 'best_score', 'total_games'
+        ))
+        LeaderboardEntry.objects.all().delete()
+
+        backfill(django_apps, None)
+
+        self.assertEqual(set(LeaderboardEntry.objects.values_list(
+            'user_id', 'game_type', 'window', 'period', 'best_score', 'total_games'
+        )), expected)
+
+
+class FakeEncoder:
+    # Vector giả lập ổn định theo nội dung, đếm số văn bản đã encode
+
+    def __init__(self):
+        self.encoded = 0
+
+    def encode(self, texts, **kwargs):
+        return self(texts)
+
+    def __call__(self, texts):
+        self.encoded += len(texts)
+        vectors = []
+        for text in texts:
+            seed = int(hashlib.md5(text.encode('utf-8')).hexdigest()[:8], 16)
+            vector = np.random.default_rng(seed).normal(size=8).astype(np.float32)
+            vectors.append(vector / np.linalg.norm(vector))
+        return np.vstack(vectors)
+
+
+class SetEmbeddingIndexTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        creator = User.objects.create(username='author')
+        topic = Topic.objects.create(name='Animals')
+        self.sets = [
+            FlashcardSet.objects.create(title=f'Set {i}', topic=topic, creator=creator, is_public=True)
+            for i in range(5)
+        ]
+        FlashcardSet.objects.create(title='Private', topic=topic, creator=creator)
+
+    def test_only_changed_sets_are_reencoded(self):
+        encoder = FakeEncoder()
+        index = SetEmbeddingIndex(encoder)
+        self.assertTrue(index.ensure_fresh())
+        self.assertEqual((index.size, encoder.encoded), (5, 5))
+        self.assertEqual(FlashcardSetEmbedding.objects.count(), 5)
+
+        self.sets[0].total_saves = 3
+        self.sets[0].save(update_fields=['total_saves'])
+        index.ensure_fresh()
+        self.assertEqual(encoder.encoded, 5)
+
+        self.sets[1].title = 'Wild animals'
+        self.sets[1].save()
+        index.ensure_fresh()
+        self.assertEqual(encoder.encoded, 6)
+
+        # Process mới đọc lại vector đã lưu, không encode lại
+        fresh_encoder = FakeEncoder()
+        fresh_index = SetEmbeddingIndex(fresh_encoder)
+        fresh_index.ensure_fresh()
+        self.assertEqual((fresh_index.size, fresh_encoder.encoded), (5, 0))
+
+    def test_search_returns_nearest_sets(self):
+        encoder = FakeEncoder()
+        index = SetEmbeddingIndex(encoder)
+        index.ensure_fresh()
+
+        hits = index.search(encoder(['Set 3.'])[0], 2)
+
+        self.assertEqual(hits[0][0], self.sets[3].id)
+        self.assertAlmostEqual(hits[0][1], 1.0, places=5)
+        self.assertEqual(len(hits), 2)
+        self.assertIsNotNone(index.last_query_ms)
+
+    def test_index_version_is_shared_through_the_database(self):
+        index = SetEmbeddingIndex(FakeEncoder())
+        index.ensure_fresh()
+        version = IndexVersion.current('ai_set_embeddings')
+
+        self.sets[4].is_public = False
+        self.sets[4].save()
+        # Worker khác có cache riêng => phiên bản vẫn phải đọc được từ DB
+        cache.clear()
+
+        self.assertEqual(IndexVersion.current('ai_set_embeddings'), version + 1)
+        index.ensure_fresh()
+        self.assertEqual(index.size, 4)
+
+    def test_search_reads_one_snapshot_while_rebuilding(self):
+        encoder = FakeEncoder()
+        index = SetEmbeddingIndex(encoder)
+        index.ensure_fresh()
+        old_state = index._state
+        query = encoder(['Set 3.'])[0]
+
+        def rebuild_mid_search(matrix_query):
+            # Giả lập thread khác publish chỉ mục mới (ít bộ hơn) trong lúc đang tính điểm
+            index._state = (old_state[0][:1], old_state[1][:1], None)
+            return old_state[1] @ matrix_query
+
+        snapshot = (old_state[0], mock.Mock(__matmul__=mock.Mock(side_effect=rebuild_mid_search)), None)
+        index._state = snapshot
+        hits = index.search(query, 5)
+
+        self.assertEqual(hits[0][0], self.sets[3].id)
+        self.assertEqual(len(hits), 5)
+
+
+class SuggestionCacheTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.encoder = FakeEncoder()
+        self.service = AISuggestionService(encoder=self.encoder)
+
+        creator = User.objects.create(username='author')
+        self.topic = Topic.objects.create(name='Set 1')
+        self.sets = [
+            FlashcardSet.objects.create(title=f'Set {i}', topic=self.topic, creator=creator, is_public=True)
+            for i in range(3)
+        ]
+
+    def test_results_are_cached_until_sets_or_topic_change(self):
+        first = self.service.suggest_sets_for_topic(self.topic, top_k=2)
+        self.assertEqual(first, [self.sets[1]])
+        encoded = self.encoder.encoded
+
+        self.assertEqual(self.service.suggest_sets_for_topic(self.topic, top_k=2), first)
+        self.assertEqual(self.encoder.encoded, encoded)
+
+        # Đổi tên chủ đề => encode lại chủ đề, không encode lại các bộ
+        self.topic.name = 'Set 2'
+        self.topic.save()
+        self.assertEqual(self.service.suggest_sets_for_topic(self.topic, top_k=2), [self.sets[2]])
+        self.assertEqual(self.encoder.encoded, encoded + 1)
+
+        # Bộ chuyển sang riêng tư => chỉ mục dựng lại và không còn được gợi ý
+        self.sets[2].is_public = False
+        self.sets[2].save()
+        self.assertEqual(self.service.suggest_sets_for_topic(self.topic, top_k=2), [])
+
+    def test_warm_command_requires_shared_cache(self):
+        with mock.patch.object(AISuggestionService, 'get_instance', return_value=self.service):
+            with self.assertRaises(CommandError):
+                call_command('warm_ai_suggestions', stdout=StringIO())
+
+            with tempfile.TemporaryDirectory() as cache_dir, override_settings(CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': cache_dir,
+            }}):
+                call_command('warm_ai_suggestions', '--top-k', '2', stdout=StringIO())
+                encoded = self.encoder.encoded
+                # Process khác (service mới, cùng cache dùng chung) đọc được kết quả đã tính sẵn
+                fresh = AISuggestionService(encoder=FakeEncoder())
+                self.assertEqual(fresh.suggest_sets_for_topic(self.topic, top_k=2), [self.sets[1]])
+                self.assertEqual(fresh._encoder.encoded, 0)
+                self.assertGreater(encoded, 0)
+
+    def test_model_not_ready_serves_popularity_and_loads_in_background(self):
+        FlashcardSet.objects.filter(pk=self.sets[0].pk).update(total_saves=5)
+        service = AISuggestionService()
+
+        with mock.patch.object(AISuggestionService, 'start_background_load') as start:
+            suggestions = service.suggest_sets_for_topic(self.topic, top_k=2)
+
+        start.assert_called_once_with()
+        self.assertEqual(suggestions[0], self.sets[0])
+        self.assertEqual(service.get_stats()['model_state'], AISuggestionService.NOT_LOADED)
+
+    def test_get_instance_is_a_thread_safe_singleton(self):
+        AISuggestionService._instance = None
+        instances = []
+        threads = [threading.Thread(target=lambda: instances.append(AISuggestionService.get_instance()))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        AISuggestionService._instance = None
+
+        self.assertEqual(len({id(instance) for instance in instances}), 1)
+
+
+class EmbeddingWorkerTests(SimpleTestCase):
+
+    def setUp(self):
+        self.socket_path = os.path.join(tempfile.mkdtemp(), 'embed.sock')
+        self.encoder = FakeEncoder()
+        self.worker = EmbeddingWorker(self.encoder, self.socket_path, b'test-key', max_wait_ms=50)
+        threading.Thread(target=self.worker.serve_forever, daemon=True).start()
+        self.client_encoder = RemoteEncoder(self.socket_path, b'test-key')
+        for _ in range(100):
+            if os.path.exists(self.socket_path):
+                break
+            threading.Event().wait(0.01)
+
+    def tearDown(self):
+        self.worker.stop()
+
+    def test_concurrent_requests_are_batched(self):
+        self.assertTrue(self.client_encoder.ping())
+        results = {}
+
+        def encode(i):
+            results[i] = self.client_encoder.encode([f'text {i}', f'other {i}'])
+
+        threads = [threading.Thread(target=encode, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.worker.requests, 8)
+        self.assertLess(self.worker.batches, 8)
+        np.testing.assert_allclose(results[3], FakeEncoder()(['text 3', 'other 3']))
+
+    def test_wrong_authkey_is_rejected(self):
+        self.assertFalse(RemoteEncoder(self.socket_path, b'wrong').ping())
+
+    def test_service_uses_worker_and_falls_back_in_process(self):
+        with override_settings(AI_EMBEDDING_WORKER_SOCKET=self.socket_path, AI_EMBEDDING_WORKER_AUTHKEY='test-key'):
+            service = AISuggestionService()
+            self.assertTrue(service.load_model())
+            self.assertIsInstance(service._encoder, RemoteEncoder)
+
+        missing_socket = self.socket_path + '.missing'
+        with override_settings(AI_EMBEDDING_WORKER_SOCKET=missing_socket, AI_EMBEDDING_WORKER_AUTHKEY='test-key'):
+            with mock.patch('api.ai_suggestion.load_sentence_transformer', return_value=self.encoder) as load:
+                service = AISuggestionService()
+                self.assertTrue(service.load_model())
+            load.assert_called_once_with()
+            self.assertIs(service._encoder, self.encoder)
+
+    def test_stalled_client_does_not_block_others(self):
+        self.worker.timeout = 0.3
+        stalled = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.addCleanup(stalled.close)
+        stalled.connect(self.socket_path)  # kết nối rồi không bắt tay
+
+        started = time.monotonic()
+        self.assertTrue(RemoteEncoder(self.socket_path, b'test-key', timeout=0.2).ping())
+        self.assertLess(time.monotonic() - started, 0.2)
+
+        # Worker tự đóng kết nối treo sau timeout
+        stalled.settimeout(2)
+        stalled.recv(1024)  # thử thách authkey
+        self.assertEqual(stalled.recv(1024), b'')
+
+    def test_hung_worker_times_out(self):
+        hung_path = os.path.join(tempfile.mkdtemp(), 'hung.sock')
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(hung_path)
+        server.listen(1)
+        self.addCleanup(server.close)
+
+        started = time.monotonic()
+        with self.assertRaises(EmbeddingWorkerUnavailable):
+            RemoteEncoder(hung_path, b'test-key', timeout=0.2).encode(['text'])
+        self.assertLess(time.monotonic() - started, 2)
+
+    def test_worker_lost_after_startup_falls_back(self):
+        with override_settings(AI_EMBEDDING_WORKER_SOCKET=self.socket_path, AI_EMBEDDING_WORKER_AUTHKEY='test-key'):
+            service = AISuggestionService()
+            self.assertTrue(service.load_model())
+        self.worker.stop()
+
+        with mock.patch.object(AISuggestionService, 'start_background_load') as start:
+            self.assertIsNone(service._encode(['text']))
+
+        start.assert_called_once_with()
+        self.assertEqual(service.model_state, AISuggestionService.NOT_LOADED)
+
+
+def import_firebase_authentication():
+    # Module khởi tạo Firebase Admin SDK lúc import; giả lập app đã có để không cần file credentials
+    import firebase_admin
+    with mock.patch.dict(firebase_admin._apps, {'[DEFAULT]': mock.Mock()}):
+        from api import authentication
+    return authentication
+
+
+class VerifiedTokenCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        self.now = 1_000_000.0
+        self.cache = VerifiedTokenCache(max_entries=2, max_ttl=300, clock=lambda: self.now)
+
+    def test_entries_never_outlive_token_exp_or_ttl(self):
+        self.cache.set('short', {'uid': 'a', 'exp': self.now + 60}, 1)
+        self.cache.set('long', {'uid': 'b', 'exp': self.now + 3600}, 2)
+        self.assertEqual(self.cache.get('short'), ({'uid': 'a', 'exp': self.now + 60}, 1))
+
+        self.now += 61
+        self.assertIsNone(self.cache.get('short'))
+        self.assertEqual(self.cache.get('long')[1], 2)
+        self.now += 240
+        self.assertIsNone(self.cache.get('long'))
+
+        self.cache.set('expired', {'exp': self.now - 1}, 3)
+        self.assertEqual(self.cache.stats()['size'], 0)
+        self.assertEqual((self.cache.hits, self.cache.misses), (2, 2))
+
+    def test_lru_bound_and_disabled_cache(self):
+        for token in ('a', 'b'):
+            self.cache.set(token, {'exp': self.now + 60}, 1)
+        self.cache.get('a')
+        self.cache.set('c', {'exp': self.now + 60}, 1)
+        self.assertIsNone(self.cache.get('b'))
+        self.assertIsNotNone(self.cache.get('a'))
+        self.assertNotIn('a', self.cache._entries)  # chỉ lưu hash của token
+
+        disabled = VerifiedTokenCache(max_entries=0, max_ttl=300)
+        disabled.set('a', {'exp': time.time() + 60}, 1)
+        self.assertIsNone(disabled.get('a'))
+        self.assertEqual(disabled.misses, 0)
+
+
+class FirebaseAuthenticationCacheTests(APITestCase):
+
+    def setUp(self):
+        self.authentication = import_firebase_authentication()
+        self.user = User.objects.create(username='firebase-uid')
+        self.cache = VerifiedTokenCache(max_entries=10, max_ttl=300)
+        patcher = mock.patch.object(self.authentication, 'get_token_cache', return_value=self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_verified_token_is_reused_until_user_disappears(self):
+        claims = {'uid': 'firebase-uid', 'exp': time.time() + 3600}
+        request = RequestFactory().get('/', HTTP_FIREBASE_TOKEN='Bearer token-1')
+        authenticator = self.authentication.FirebaseAuthentication()
+
+        with mock.patch.object(self.authentication.auth, 'verify_id_token', return_value=claims) as verify:
+            self.assertEqual(authenticator.authenticate(request)[0], self.user)
+            with self.assertNumQueries(1):
+                self.assertEqual(authenticator.authenticate(request)[0], self.user)
+            self.assertEqual(verify.call_count, 1)
+
+            User.objects.filter(pk=self.user.pk).update(username='renamed')
+            User.objects.create(username='firebase-uid')
+            user, _ = authenticator.authenticate(request)
+            self.assertEqual(user.username, 'renamed')
+
+            User.objects.filter(username='renamed').delete()
+            user, _ = authenticator.authenticate(request)
+            self.assertEqual(user.username, 'firebase-uid')
+            self.assertEqual(verify.call_count, 2)
+
+        self.assertEqual((self.cache.hits, self.cache.misses), (3, 1))
+
+    def test_stats_endpoint_is_admin_only(self):
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get('/users/auth_cache_stats/').status_code, 403)
+        self.client.force_authenticate(User.objects.create(username='root', role='admin'))
+        self.assertIn('hit_rate', self.client.get('/users/auth_cache_stats/').data)
+
+
+@override_settings(AVATAR_IMPORT_WORKERS=0)
+class AvatarImportTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='no-avatar')
+        self.upload = mock.Mock(return_value={'public_id': 'avatars/abc'})
+        patcher = mock.patch.object(AvatarImportQueue, 'upload', self.upload)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_import_runs_after_commit_and_dedupes_in_flight_jobs(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(AvatarImportQueue.enqueue(self.user.pk, 'https://example.com/a.png'))
+            self.assertFalse(AvatarImportQueue.enqueue(self.user.pk, 'https://example.com/a.png'))
+            self.upload.assert_not_called()
+
+        self.upload.assert_called_once_with('https://example.com/a.png')
+        self.user.refresh_from_db()
+        self.assertEqual(str(self.user.avatar), 'avatars/abc')
+        self.assertFalse(AvatarImportQueue.enqueue(self.user.pk, None))
+
+    def test_failures_back_off_exponentially(self):
+        self.upload.side_effect = RuntimeError('cloudinary down')
+        with self.captureOnCommitCallbacks(execute=True):
+            AvatarImportQueue.enqueue(self.user.pk, 'https://example.com/a.png')
+        self.assertFalse(AvatarImportQueue.enqueue(self.user.pk, 'https://example.com/a.png'))
+
+        with mock.patch.object(cache, 'set', wraps=cache.set) as cache_set:
+            cache.delete(backoff_key(self.user.pk))
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertTrue(AvatarImportQueue.enqueue(self.user.pk, 'https://example.com/a.png'))
+        cache_set.assert_any_call(backoff_key(self.user.pk), 1, 120)
+        self.assertEqual(self.upload.call_count, 2)
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.avatar)
+
+    def test_authentication_only_enqueues(self):
+        authentication = import_firebase_authentication()
+        claims = {'uid': 'no-avatar', 'exp': time.time() + 3600, 'picture': 'https://example.com/a.png'}
+        request = RequestFactory().get('/', HTTP_FIREBASE_TOKEN='token-2')
+        with mock.patch.object(authentication.auth, 'verify_id_token', return_value=claims), \
+                mock.patch.object(AvatarImportQueue, 'enqueue') as enqueue:
+            user, _ = authentication.FirebaseAuthentication().authenticate(request)
+        enqueue.assert_called_once_with(self.user.pk, 'https://example.com/a.png')
+        self.upload.assert_not_called()
+        self.assertEqual(user, self.user)
+
+
+class AvatarUrlTests(SimpleTestCase):
+
+    def setUp(self):
+        api_models._cloudinary_url.cache_clear()
+        config = cloudinary.config()
+        self.addCleanup(setattr, config, 'cloud_name', config.cloud_name)
+        config.cloud_name = config.cloud_name or 'demo'
+
+    def avatar(self, version):
+        return CloudinaryResource('avatars/shared', format='jpg', version=version, resource_type='image')
+
+    def test_serializers_build_each_avatar_url_once(self):
+        users = [User(id=i, username=f'u{i}', avatar=self.avatar(1)) for i in range(5)]
+        users.append(User(id=99, username='plain'))
+        data = UserSerializer(users, many=True).data
+
+        self.assertEqual(data[0]['avatar'], self.avatar(1).url)
+        self.assertIsNone(data[-1]['avatar'])
+        info = api_models._cloudinary_url.cache_info()
+        self.assertEqual((info.misses, info.hits), (1, 4))
+
+        # Tải ảnh mới (version khác) thì URL đổi theo
+        self.assertEqual(User(avatar=self.avatar(2)).avatar_url, self.avatar(2).url)
+        self.assertNotEqual(self.avatar(2).url, data[0]['avatar'])
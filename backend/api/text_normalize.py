@@ -0,0 +1,18 @@
+import re
+import unicodedata
+
+# 'đ' không tách được dấu bằng NFD nên thay trực tiếp
+_SPECIAL_CHARS = str.maketrans({'đ': 'd', 'Đ': 'd'})
+_NON_WORD = re.compile(r'[^0-9a-z]+')
+
+
+def normalize_text(*parts):
+    """Chữ thường, bỏ dấu tiếng Việt và ký tự không phải chữ/số: 'Tiếng Việt đẹp!' -> 'tieng viet dep'."""
+    text = ' '.join(part for part in parts if part).translate(_SPECIAL_CHARS)
+    text = unicodedata.normalize('NFD', text.lower())
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return _NON_WORD.sub(' ', text).strip()
+
+
+def tokenize(*parts):
+    return normalize_text(*parts).split()
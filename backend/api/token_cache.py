@@ -0,0 +1,97 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from django.conf import settings
+
+
+class VerifiedTokenCache:
+    """Cache trong process cho Firebase ID token đã xác thực: sha256(token) -> (claims, user id).
+    - Entry hết hạn ở min(exp của token, lúc lưu + max_ttl), không bao giờ sống quá exp.
+    - Giới hạn max_entries theo LRU; max_entries=0 là tắt cache.
+    - Chỉ lưu hash của token, không lưu token gốc.
+    """
+
+    def __init__(self, max_entries: int, max_ttl: float, clock=time.time) -> None:
+        self.max_entries = max_entries
+        self.max_ttl = max_ttl
+        self._clock = clock
+        self._entries: "OrderedDict[str, Tuple[float, dict, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def get(self, token: str) -> Optional[Tuple[dict, int]]:
+        if not self.enabled:
+            return None
+        key = self.key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > self._clock():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1], entry[2]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, token: str, claims: dict, user_id: int) -> None:
+        if not self.enabled:
+            return
+        now = self._clock()
+        expires_at = min(float(claims.get("exp", now)), now + self.max_ttl)
+        if expires_at <= now:
+            return
+        key = self.key(token)
+        with self._lock:
+            self._entries[key] = (expires_at, claims, user_id)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, token: str) -> None:
+        with self._lock:
+            self._entries.pop(self.key(token), None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "max_ttl": self.max_ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else None,
+        }
+
+
+_token_cache: Optional[VerifiedTokenCache] = None
+_token_cache_lock = threading.Lock()
+
+
+def get_token_cache() -> VerifiedTokenCache:
+    global _token_cache
+    if _token_cache is None:
+        with _token_cache_lock:
+            if _token_cache is None:
+                _token_cache = VerifiedTokenCache(
+                    settings.FIREBASE_TOKEN_CACHE_SIZE, settings.FIREBASE_TOKEN_CACHE_TTL
+                )
+    return _token_cache
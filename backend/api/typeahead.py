@@ -0,0 +1,298 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Count
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+
+from api.models import Flashcard, FlashcardSet, Topic
+from api.text_normalize import normalize_text
+
+logger = logging.getLogger(__name__)
+
+MAX_PHRASE_LENGTH = 60
+CARD_TERM_FIELDS = ("english", "vietnamese")
+SET_SOURCE_FIELDS = {"title", "is_public"}
+CARD_SOURCE_FIELDS = {"english", "vietnamese", "flashcard_set"}
+
+
+class TrieNode:
+    __slots__ = ("children", "weight", "best", "text")
+
+    def __init__(self) -> None:
+        self.children: Dict[str, "TrieNode"] = {}
+        self.weight = 0  # số lần cụm từ kết thúc tại node này xuất hiện
+        self.best = 0  # weight lớn nhất trong cây con, dùng để duyệt top-k
+        self.text: Optional[str] = None  # cách viết gốc (có dấu) để hiển thị
+
+
+class PrefixTrie:
+    """Trie theo ký tự của cụm từ đã bỏ dấu.
+    - Mỗi node giữ weight lớn nhất của cây con nên top-k chỉ mở những nhánh có thể lọt vào kết quả.
+    - Giới hạn số cụm từ (max_terms); cụm từ mới vượt giới hạn bị bỏ qua.
+    """
+
+    def __init__(self, max_terms: int) -> None:
+        self.root = TrieNode()
+        self.max_terms = max_terms
+        self.size = 0
+        self.dropped = 0
+
+    def _path(self, key: str, create: bool) -> Optional[List[TrieNode]]:
+        path = [self.root]
+        for char in key:
+            child = path[-1].children.get(char)
+            if child is None:
+                if not create:
+                    return None
+                child = path[-1].children[char] = TrieNode()
+            path.append(child)
+        return path
+
+    def add(self, text: Optional[str], delta: int = 1) -> None:
+        key = normalize_text(text)[:MAX_PHRASE_LENGTH]
+        if not key or not delta:
+            return
+        path = self._path(key, create=False)
+        if path is None or not path[-1].weight:
+            if delta < 0:
+                return
+            if self.size >= self.max_terms:
+                self.dropped += 1
+                return
+            path = path or self._path(key, create=True)
+            path[-1].text = text.strip()
+            self.size += 1
+
+        leaf = path[-1]
+        leaf.weight = max(leaf.weight + delta, 0)
+        if not leaf.weight:
+            leaf.text = None
+            self.size -= 1
+
+        if delta > 0:
+            # Tăng thì best chỉ có thể tăng, không cần xét các nhánh con khác
+            for node in path:
+                node.best = max(node.best, leaf.weight)
+            return
+
+        # Giảm thì tính lại best từ dưới lên và cắt các nhánh đã rỗng
+        for depth in range(len(path) - 1, -1, -1):
+            node = path[depth]
+            node.best = max([node.weight, *(child.best for child in node.children.values())])
+            if depth and not node.best:
+                del path[depth - 1].children[key[depth - 1]]
+
+    def top_k(self, prefix: str, k: int) -> List[Tuple[str, int]]:
+        node = self.root
+        for char in normalize_text(prefix)[:MAX_PHRASE_LENGTH]:
+            node = node.children.get(char)
+            if node is None:
+                return []
+
+        # Heap theo (-weight, loại, -thứ tự): kết quả ra trước node cùng điểm, hòa thì đi sâu trước (DFS)
+        counter = itertools.count()
+        heap = [(-node.best, 1, 0, node)]
+        results = []
+        while heap and len(results) < k:
+            _, kind, _, current = heapq.heappop(heap)
+            if kind == 0:
+                results.append((current.text, current.weight))
+                continue
+            if current.weight:
+                heapq.heappush(heap, (-current.weight, 0, -next(counter), current))
+            for child in current.children.values():
+                heapq.heappush(heap, (-child.best, 1, -next(counter), child))
+        return results
+
+
+class SuggestionIndex:
+    """Gợi ý gõ tới đâu hiện tới đó (typeahead) từ tên chủ đề, tiêu đề bộ công khai và từ vựng của các bộ đó.
+    - Dựng lười ở request đầu (hoặc lúc khởi động nếu SEARCH_SUGGEST_PRELOAD), cụm từ phổ biến vào trước.
+    - Cập nhật từng phần qua signal sau khi transaction commit; chủ đề đổi thì dựng lại.
+    - Mỗi worker giữ bản riêng nên định kỳ (SEARCH_SUGGEST_MAX_AGE) dựng lại ở thread nền để đồng bộ.
+    """
+
+    DEFAULT_LIMIT = 10
+    MAX_LIMIT = 20
+
+    _trie: Optional[PrefixTrie] = None
+    _public_set_ids: set = set()
+    _built_at: Optional[float] = None
+    _lock = threading.RLock()
+    _rebuild_thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def is_built(cls) -> bool:
+        return cls._trie is not None
+
+    @classmethod
+    def reset(cls) -> None:
+        with cls._lock:
+            cls._trie, cls._public_set_ids, cls._built_at = None, set(), None
+
+    @classmethod
+    def build(cls) -> None:
+        started = time.perf_counter()
+        trie = PrefixTrie(settings.SEARCH_SUGGEST_MAX_TERMS)
+        for name in Topic.objects.filter(is_active=True).values_list("name", flat=True):
+            trie.add(name)
+        public_set_ids = set()
+        for set_id, title in FlashcardSet.objects.filter(is_public=True).order_by().values_list("id", "title").iterator():
+            public_set_ids.add(set_id)
+            trie.add(title)
+        for field in CARD_TERM_FIELDS:
+            # Đếm trùng trong DB, từ xuất hiện nhiều nhất vào trước để giới hạn bộ nhớ giữ lại chúng
+            terms = Flashcard.objects.filter(flashcard_set__is_public=True).values_list(field).annotate(
+                occurrences=Count("id")).order_by("-occurrences")
+            for term, occurrences in terms.iterator():
+                trie.add(term, occurrences)
+
+        # Delta commit trong lúc đang dựng (sau khi đã đọc DB) sẽ có ở lần dựng lại kế tiếp
+        with cls._lock:
+            cls._trie, cls._public_set_ids, cls._built_at = trie, public_set_ids, time.monotonic()
+        logger.info(
+            "SuggestionIndex: built %d phrases (%d dropped) in %.1f ms",
+            trie.size, trie.dropped, (time.perf_counter() - started) * 1000,
+        )
+
+    @classmethod
+    def _rebuild_in_background(cls) -> None:
+        with cls._lock:
+            if cls._rebuild_thread is not None and cls._rebuild_thread.is_alive():
+                return
+            cls._rebuild_thread = threading.Thread(target=cls._rebuild, name="suggestion-index-builder", daemon=True)
+            cls._rebuild_thread.start()
+
+    @classmethod
+    def _rebuild(cls) -> None:
+        try:
+            cls.build()
+        except Exception:
+            logger.exception("SuggestionIndex: rebuild failed")
+        finally:
+            close_old_connections()
+
+    @classmethod
+    def preload(cls) -> None:
+        cls._rebuild_in_background()
+
+    @classmethod
+    def invalidate(cls) -> None:
+        # Giữ bản cũ để phục vụ trong lúc dựng lại
+        if cls.is_built():
+            cls._built_at = None
+            cls._rebuild_in_background()
+
+    @classmethod
+    def suggest(cls, prefix: str, limit: int = DEFAULT_LIMIT) -> List[Tuple[str, int]]:
+        if not cls.is_built():
+            cls.build()
+        elif cls._built_at is not None and time.monotonic() - cls._built_at > settings.SEARCH_SUGGEST_MAX_AGE:
+            cls._rebuild_in_background()
+        with cls._lock:
+            return cls._trie.top_k(prefix, limit)
+
+    @classmethod
+    def _apply(cls, deltas: Iterable[Tuple[Optional[str], int]], public_add=(), public_remove=()) -> None:
+        with cls._lock:
+            if cls._trie is None:
+                return
+            for text, delta in deltas:
+                cls._trie.add(text, delta)
+            cls._public_set_ids.update(public_add)
+            cls._public_set_ids.difference_update(public_remove)
+
+    @classmethod
+    def apply_on_commit(cls, deltas, public_add=(), public_remove=()) -> None:
+        deltas = list(deltas)
+        if deltas or public_add or public_remove:
+            transaction.on_commit(lambda: cls._apply(deltas, public_add, public_remove))
+
+    @classmethod
+    def is_public_set(cls, set_id) -> bool:
+        return set_id in cls._public_set_ids
+
+    @classmethod
+    def record_new_cards(cls, flashcards: List[Flashcard]) -> None:
+        # Cho các nơi tạo thẻ bằng bulk_create (không phát post_save)
+        if cls.is_built():
+            cls.apply_on_commit(
+                (getattr(card, field), 1) for card in flashcards
+                if cls.is_public_set(card.flashcard_set_id) for field in CARD_TERM_FIELDS
+            )
+
+
+def _touches(update_fields, fields) -> bool:
+    return update_fields is None or bool(fields & set(update_fields))
+
+
+@receiver(pre_save, sender=FlashcardSet)
+def remember_set_before_save(sender, instance, update_fields=None, **kwargs):
+    if SuggestionIndex.is_built() and not instance._state.adding and _touches(update_fields, SET_SOURCE_FIELDS):
+        instance._suggest_previous = FlashcardSet.objects.filter(pk=instance.pk).values_list("title", "is_public").first()
+
+
+@receiver(post_save, sender=FlashcardSet)
+def update_suggestions_on_set_save(sender, instance, created, update_fields=None, **kwargs):
+    if not SuggestionIndex.is_built() or not _touches(update_fields, SET_SOURCE_FIELDS):
+        return
+    old_title, old_public = getattr(instance, "_suggest_previous", None) or (None, False)
+    deltas = []
+    if old_public:
+        deltas.append((old_title, -1))
+    if instance.is_public:
+        deltas.append((instance.title, 1))
+    if old_public != instance.is_public and not created:
+        # Đổi trạng thái công khai => thêm/bớt toàn bộ từ vựng của bộ
+        sign = 1 if instance.is_public else -1
+        for terms in Flashcard.objects.filter(flashcard_set=instance).values_list(*CARD_TERM_FIELDS).iterator():
+            deltas.extend((term, sign) for term in terms)
+    public_ids = [instance.pk]
+    SuggestionIndex.apply_on_commit(
+        deltas, public_add=public_ids if instance.is_public else (), public_remove=() if instance.is_public else public_ids
+    )
+
+
+@receiver(post_delete, sender=FlashcardSet)
+def update_suggestions_on_set_delete(sender, instance, **kwargs):
+    # Thẻ của bộ bị xóa trước (cascade) và tự trừ từ vựng của chúng ở handler bên dưới
+    if SuggestionIndex.is_public_set(instance.pk):
+        SuggestionIndex.apply_on_commit([(instance.title, -1)], public_remove=[instance.pk])
+
+
+@receiver(pre_save, sender=Flashcard)
+def remember_card_before_save(sender, instance, update_fields=None, **kwargs):
+    if SuggestionIndex.is_built() and not instance._state.adding and _touches(update_fields, CARD_SOURCE_FIELDS):
+        instance._suggest_previous = Flashcard.objects.filter(pk=instance.pk).values_list(
+            "flashcard_set_id", *CARD_TERM_FIELDS).first()
+
+
+@receiver(post_save, sender=Flashcard)
+def update_suggestions_on_card_save(sender, instance, created, update_fields=None, **kwargs):
+    if not SuggestionIndex.is_built() or not _touches(update_fields, CARD_SOURCE_FIELDS):
+        return
+    deltas = []
+    previous = getattr(instance, "_suggest_previous", None)
+    if previous and SuggestionIndex.is_public_set(previous[0]):
+        deltas.extend((term, -1) for term in previous[1:])
+    if SuggestionIndex.is_public_set(instance.flashcard_set_id):
+        deltas.extend((getattr(instance, field), 1) for field in CARD_TERM_FIELDS)
+    SuggestionIndex.apply_on_commit(deltas)
+
+
+@receiver(post_delete, sender=Flashcard)
+def update_suggestions_on_card_delete(sender, instance, **kwargs):
+    if SuggestionIndex.is_public_set(instance.flashcard_set_id):
+        SuggestionIndex.apply_on_commit((getattr(instance, field), -1) for field in CARD_TERM_FIELDS)
+
+
+@receiver([post_save, post_delete], sender=Topic)
+def rebuild_suggestions_on_topic_change(sender, instance, **kwargs):
+    transaction.on_commit(SuggestionIndex.invalidate)
@@ -12,6 +12,7 @@ router.register('progress', views.UserProgressViewSet, basename='userprogress')
 router.register('achievements', views.AchievementViewSet, basename='achievement')
 router.register('daily-stats', views.DailyStatsViewSet, basename='dailystats')
 router.register('feedback', views.UserFeedbackViewSet, basename='userfeedback')
+router.register('search', views.SearchViewSet, basename='search')
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -1,10 +1,11 @@
 from rest_framework import viewsets, generics, status, permissions, filters, parsers
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.db.models import Q, Count, Avg, F, Sum, Max
+from django.db.models import Q, Count, F, Sum, Max
 from django.utils import timezone
 from datetime import datetime, timedelta
 from django.db import transaction
+from django.urls import reverse
 from math import ceil
 
 from api.models import (
@@ -13,19 +14,40 @@ from api.models import (
     UserFeedback, DailyStats
 )
 from api import serializers
-from api.achievement_service import AchievementService
-from api.ai_suggestion import AISuggestionService
+from api.achievement_service import AchievementService, AchievementEvent
+from api.ai_suggestion import AISuggestionService, MAX_TOP_K
+from api.leaderboard_service import LeaderboardService
+from api.daily_stats_buffer import DailyStatsBuffer
+from api.flashcard_import import FlashcardImporter, FlashcardImportError
+from api.exporters import (
+    EXPORT_FORMATS, export_flashcards, history_rows, iter_ndjson, keyset_rows, streaming_export_response
+)
 from typing import List, Dict, Any, Optional
 from api.permissions import IsUser, IsAdmin
+from api.paginators import AdminCursorPagination, FlashcardCursorPagination
+from api.search import SearchService, query_tokens
+from api.typeahead import SuggestionIndex
+from api.token_cache import get_token_cache
 import random
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Cột xuất NDJSON của các danh sách quản trị (?stream=ndjson)
+ADMIN_SET_STREAM_FIELDS = (
+    'id', 'title', 'topic_id', 'topic__name', 'creator_id', 'creator__username', 'difficulty',
+    'is_public', 'total_cards', 'total_saves', 'average_rating', 'rating_count', 'created_at', 'updated_at',
+)
+ADMIN_USER_STREAM_FIELDS = (
+    'id', 'username', 'email', 'display_name', 'role', 'total_points', 'is_active', 'date_joined', 'last_login',
+)
+
 
 class TopicViewSet(viewsets.ViewSet, generics.ListAPIView, generics.CreateAPIView, generics.UpdateAPIView,
                    generics.DestroyAPIView, generics.RetrieveAPIView):
-    queryset = Topic.objects.filter(is_active=True)
+    queryset = Topic.objects.filter(is_active=True).annotate(
+        public_sets_count=Count('flashcardset', filter=Q(flashcardset__is_public=True))
+    ).order_by('name')  # truy vấn GROUP BY không tự áp dụng Meta.ordering
     serializer_class = serializers.TopicSerializer
     permission_classes = [permissions.AllowAny]
 
@@ -67,7 +89,7 @@ class TopicViewSet(viewsets.ViewSet, generics.ListAPIView, generics.CreateAPIVie
         try:
             limit_param = request.query_params.get('limit')
             limit = int(limit_param) if limit_param else 10
-            limit = max(1, min(50, limit))
+            limit = max(1, min(MAX_TOP_K, limit))
         except ValueError:
             limit = 10
 
@@ -100,9 +122,9 @@ class FlashcardSetViewSet(viewsets.ViewSet, generics.ListAPIView, generics.Retri
         user_only_actions = ['save', 'favorite', 'rate', 'favorites']
         if self.action in user_only_actions:
             return [IsUser()]
-        if self.action in ['admin_list']:
+        if self.action in ['admin_list', 'export_all']:
             return [IsAdmin()]
-        if self.action in ['create', 'update', 'partial_update', 'destroy']:
+        if self.action in ['create', 'update', 'partial_update', 'destroy', 'import_flashcards']:
             return [permissions.IsAuthenticated()]
         return [permissions.AllowAny()]
 
@@ -116,10 +138,10 @@ class FlashcardSetViewSet(viewsets.ViewSet, generics.ListAPIView, generics.Retri
             # Mặc định chỉ hiển thị public sets
             queryset = self.queryset
 
-        # Tìm kiếm theo tiêu đề
+        # Tìm kiếm theo tiêu đề/mô tả (FULLTEXT, không phân biệt dấu)
         q = self.request.query_params.get('q')
         if q:
-            queryset = queryset.filter(title__icontains=q)
+            queryset = SearchService.filter_sets(queryset, q)
 
         # Lọc theo chủ đề
         topic_id = self.request.query_params.get('topic_id')
@@ -157,6 +179,27 @@ class FlashcardSetViewSet(viewsets.ViewSet, generics.ListAPIView, generics.Retri
 
         return obj
 
+    def retrieve(self, request, *args, **kwargs):
+        # ?cards=none: chỉ metadata; ?cards=first_page: metadata + trang thẻ đầu tiên và link trang sau
+        cards = request.query_params.get('cards')
+        if cards not in ('none', 'first_page'):
+            return super().retrieve(request, *args, **kwargs)
+
+        flashcard_set = self.get_object()
+        data = serializers.FlashcardSetSerializer(flashcard_set, context={'request': request}).data
+        if cards == 'first_page':
+            paginator = FlashcardCursorPagination()
+            page = paginator.paginate_queryset(flashcard_set.flashcards.all(), request)
+            data['flashcards'] = serializers.FlashcardSerializer(page, many=True, context={'request': request}).data
+            # Trang tiếp theo lấy từ endpoint /flashcards/ của bộ (giữ page_size)
+            query = request.query_params.copy()
+            query.pop('cards', None)
+            paginator.base_url = request.build_absolute_uri(
+                reverse('flashcardset-get-flashcards', args=[flashcard_set.pk])
+            ) + (f'?{query.urlencode()}' if query else '')
+            data['flashcards_next'] = paginator.get_next_link()
+        return Response(data)
+
     def create(self, request):
         serializer = self.get_serializer(data=request.data, context={'request': request})
         serializer.is_valid(raise_exception=True)
@@ -190,6 +233,64 @@ class FlashcardSetViewSet(viewsets.ViewSet, generics.ListAPIView, generics.Retri
         instance.delete()
         return Response({'message': 'Đã xóa bộ flashcard'}, status=status.HTTP_204_NO_CONTENT)
 
+    @action(methods=['post'], detail=True, url_path='import', parser_classes=[parsers.MultiPartParser])
+    def import_flashcards(self, request, pk):
+        flashcard_set = self.get_object()
+        if flashcard_set.creator != request.user and getattr(request.user, 'role', 'user') != 'admin':
+            return Response({'error': 'Bạn không có quyền chỉnh sửa bộ flashcard này'},
+                            status=status.HTTP_403_FORBIDDEN)
+
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'error': 'Thiếu file (trường "file")'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # File lớn được Django ghi ra file tạm, importer đọc từng dòng nên bộ nhớ không tăng theo kích thước file
+        try:
+            fmt = FlashcardImporter.detect_format(upload.name, request.query_params.get('file_format'))
+            result = FlashcardImporter(flashcard_set).run(upload.file, fmt)
+        except FlashcardImportError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        flashcard_set.refresh_from_db(fields=['total_cards'])
+        return Response({
+            'message': f"Đã nhập {result['created']} flashcard",
+            'total_cards': flashcard_set.total_cards,
+            **result
+        }, status=status.HTTP_201_CREATED if result['created'] else status.HTTP_200_OK)
+
+    @staticmethod
+    def _export_format(request):
+        file_format = request.query_params.get('file_format', 'csv')
+        return file_format if file_format in EXPORT_FORMATS else None
+
+    @action(methods=['get'], detail=True)
+    def export(self, request, pk):
+        # Xuất thẻ của 1 bộ dạng CSV/NDJSON, stream theo chunk
+        flashcard_set = self.get_object()
+        file_format = self._export_format(request)
+        if file_format is None:
+            return Response({'error': 'file_format phải là csv hoặc ndjson'}, status=status.HTTP_400_BAD_REQUEST)
+
+        chunks = export_flashcards(FlashcardSet.objects.filter(pk=flashcard_set.pk), file_format)
+        return streaming_export_response(chunks, file_format, f'flashcard-set-{flashcard_set.pk}')
+
+    @action(methods=['get'], detail=False, url_path='export')
+    def export_all(self, request):
+        # Xuất toàn bộ bộ flashcard (chỉ admin), lọc theo chủ đề/người tạo
+        file_format = self._export_format(request)
+        if file_format is None:
+            return Response({'error': 'file_format phải là csv hoặc ndjson'}, status=status.HTTP_400_BAD_REQUEST)
+
+        flashcard_sets = FlashcardSet.objects.all()
+        topic_id = request.query_params.get('topic_id')
+        if topic_id:
+            flashcard_sets = flashcard_sets.filter(topic_id=topic_id)
+        creator_id = request.query_params.get('creator_id')
+        if creator_id:
+            flashcard_sets = flashcard_sets.filter(creator_id=creator_id)
+
+        return streaming_export_response(export_flashcards(flashcard_sets, file_format), file_format, 'flashcard-sets')
+
     @action(methods=['get'], detail=False)
     def admin_list(self, request):
         # Danh sách tất cả flashcard set (chỉ admin)
@@ -201,7 +302,7 @@ class FlashcardSetViewSet(viewsets.ViewSet, generics.ListAPIView, generics.Retri
         # Filter
         q = request.query_params.get('q')
         if q:
-            queryset = queryset.filter(title__icontains=q)
+            queryset = SearchService.filter_sets(queryset, q)
         topic_id = request.query_params.get('topic_id')
         if topic_id:
             queryset = queryset.filter(topic_id=topic_id)
@@ -213,8 +314,16 @@ class FlashcardSetViewSet(viewsets.ViewSet, generics.ListAPIView, generics.Retri
             value = is_public in ['true', '1']
             queryset = queryset.filter(is_public=value)
 
-        serializer = serializers.FlashcardSetSerializer(queryset, many=True, context={'request': request})
-        return Response(serializer.data)
+        # ?stream=ndjson: xuất toàn bộ kết quả lọc cho công cụ quản trị, đọc theo trang keyset
+        if request.query_params.get('stream') == 'ndjson':
+            rows = keyset_rows(queryset, ADMIN_SET_STREAM_FIELDS, keys=('id',), descending=True)
+            return streaming_export_response(iter_ndjson(rows), 'ndjson', 'admin-flashcard-sets')
+
+        paginator = AdminCursorPagination()
+        page = paginator.paginate_queryset(queryset, request)
+        # Không truyền request: bỏ qua trạng thái đã lưu/đánh giá của chính admin trên từng dòng
+        serializer = serializers.FlashcardSetSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
 
     @action(methods=['post'], detail=True, permission_classes=[IsUser])
     def save(self, request, pk):
@@ -241,11 +350,13 @@ class FlashcardSetViewSet(viewsets.ViewSet, generics.ListAPIView, generics.Retri
             message = "Đã lưu bộ flashcard"
             is_saved = True
 
-        # Cập nhật lại total_saves dựa trên số records thực tế
-        flashcard_set.update_total_saves()
+        # total_saves đã được signal cộng/trừ trong DB
+        flashcard_set.refresh_from_db(fields=['total_saves'])
 
         # Kiểm tra và trao thành tích sau khi lưu flashcard
-        new_achievements = AchievementService.check_and_award_achievements(request.user)
+        new_achievements = AchievementService.handle_event(
+            request.user, AchievementEvent.SET_SAVED, delta=1 if is_saved else -1
+        )
 
         response_data = {
             'message': message,
@@ -283,16 +394,13 @@ class FlashcardSetViewSet(viewsets.ViewSet, generics.ListAPIView, generics.Retri
         saved_set.rating = rating
         saved_set.save()
 
-        # Cập nhật điểm trung bình
-        avg_rating = SavedFlashcardSet.objects.filter(
-            flashcard_set=flashcard_set, rating__isnull=False
-        ).aggregate(avg=Avg('rating'))['avg']
+        # Điểm trung bình được signal cập nhật từ rating_sum/rating_count
+        flashcard_set.refresh_from_db(fields=['average_rating'])
 
-        flashcard_set.average_rating = avg_rating or 0
-        flashcard_set.save()
-
-        # Kiểm tra và trao thành tích sau khi đánh giá
-        new_achievements = AchievementService.check_and_award_achievements(request.user)
+        # Kiểm tra và trao thành tích sau khi đánh giá (đánh giá bộ chưa lưu sẽ lưu luôn)
+        new_achievements = AchievementService.handle_event(
+            request.user, AchievementEvent.SET_SAVED, delta=1 if created else 0
+        )
 
         response_data = {
             'message': 'Đã đánh giá thành công',
@@ -317,6 +425,13 @@ class FlashcardSetViewSet(viewsets.ViewSet, generics.ListAPIView, generics.Retri
         flashcard_set = self.get_object()
         flashcards = flashcard_set.flashcards.all()
 
+        # Có cursor/page_size thì phân trang theo cursor, không thì trả cả danh sách như cũ
+        if 'cursor' in request.query_params or 'page_size' in request.query_params:
+            paginator = FlashcardCursorPagination()
+            page = paginator.paginate_queryset(flashcards, request)
+            serializer = serializers.FlashcardSerializer(page, many=True, context={'request': request})
+            return paginator.get_paginated_response(serializer.data)
+
         serializer = serializers.FlashcardSerializer(
             flashcards, many=True, context={'request': request}
         )
@@ -350,14 +465,31 @@ class FlashcardSetViewSet(viewsets.ViewSet, generics.ListAPIView, generics.Retri
             message = "Đã lưu và thêm vào yêu thích"
             is_favorite = True
 
-            # Cập nhật lại total_saves
-            flashcard_set.update_total_saves()
+            # total_saves đã được signal cộng trong DB
+            flashcard_set.refresh_from_db(fields=['total_saves'])
 
-        return Response({
+            new_achievements = AchievementService.handle_event(request.user, AchievementEvent.SET_SAVED)
+        else:
+            new_achievements = []
+
+        response_data = {
             'message': message,
             'is_favorite': is_favorite,
             'total_saves': flashcard_set.total_saves
-        })
+        }
+
+        if new_achievements:
+            response_data['new_achievements'] = [
+                {
+                    'name': achievement.name,
+                    'description': achievement.description,
+                    'points': achievement.points,
+                    'rarity': achievement.rarity
+                }
+                for achievement in new_achievements
+            ]
+
+        return Response(response_data)
 
     @action(methods=['get'], detail=False, permission_classes=[IsUser])
     def favorites(self, request):
@@ -379,7 +511,7 @@ class FlashcardViewSet(viewsets.ViewSet, generics.CreateAPIView, generics.Update
     def get_permissions(self):
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
             return [permissions.IsAuthenticated()]
-        elif self.action == 'study':
+        elif self.action in ['study', 'study_batch']:
             return [IsUser()]
         return [permissions.AllowAny()]
 
@@ -393,89 +525,59 @@ class FlashcardViewSet(viewsets.ViewSet, generics.CreateAPIView, generics.Update
         serializer.is_valid(raise_exception=True)
         flashcard = serializer.save()
 
-        # Cập nhật tổng số thẻ
-        flashcard.flashcard_set.update_total_cards()
-
         return Response(
             serializers.FlashcardSerializer(flashcard, context={'request': request}).data,
             status=status.HTTP_201_CREATED
         )
 
+    @staticmethod
+    def _serialize_achievements(achievements):
+        return [
+            {
+                'name': achievement.name,
+                'description': achievement.description,
+                'points': achievement.points,
+                'rarity': achievement.rarity
+            }
+            for achievement in achievements
+        ]
+
+    @staticmethod
+    def _update_daily_study_stats(user, cards_studied, new_words, correct):
+        # Cập nhật thống kê hàng ngày (gọi trong transaction của view)
+        # accuracy_rate lấy từ bộ đếm trọn đời trong UserStats
+        daily_accuracy = AchievementService.record_reviews(user, cards_studied, correct)
+
+        DailyStatsBuffer.record(
+            user,
+            cards_studied=cards_studied,
+            new_words_learned=new_words,
+            words_reviewed=cards_studied - new_words,
+            accuracy_rate=daily_accuracy
+        )
+
     @action(methods=['post'], detail=True, permission_classes=[IsUser])
     def study(self, request, pk):
         flashcard = self.get_object()
-        is_correct = request.data.get('is_correct', False)
-        difficulty_rating = request.data.get('difficulty_rating')
+        serializer = serializers.StudySerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        is_correct = serializer.validated_data['is_correct']
+        difficulty_rating = serializer.validated_data.get('difficulty_rating')
 
         progress, created = UserProgress.objects.get_or_create(
             user=request.user, flashcard=flashcard
         )
 
         with transaction.atomic():  # nếu có ngoại lệ thì hoàn tác tất cả
-            # Cập nhật số lần ôn tập và số lần đúng
-            progress.times_reviewed += 1
-
-            if is_correct:
-                progress.times_correct += 1
-                # Tăng mastery_level nhưng không vượt quá 100
-                progress.mastery_level = min(100, progress.mastery_level + 10)
-            else:
-                # Giảm mastery_level nhưng không xuống dưới 0
-                progress.mastery_level = max(0, progress.mastery_level - 5)
-                progress.is_difficult = True
-
-            progress.last_reviewed = timezone.now()
-            if difficulty_rating:
-                progress.difficulty_rating = difficulty_rating
-
+            progress.apply_review(is_correct, difficulty_rating)
             progress.save()
 
-            # Cập nhật thống kê hàng ngày
-            today = timezone.now().date()
-            daily_stats, created_daily = DailyStats.objects.get_or_create(
-                user=request.user, date=today,
-                defaults={
-                    'cards_studied': 0,
-                    'new_words_learned': 0,
-                    'words_reviewed': 0,
-                    'time_spent': 0,
-                    'games_played': 0,
-                    'points_earned': 0,
-                    'accuracy_rate': 0.0
-                }
-            )
+            self._update_daily_study_stats(request.user, 1, 1 if created else 0, 1 if is_correct else 0)
 
-            if not created_daily:
-                # Nếu record đã tồn tại thì cập nhật
-                DailyStats.objects.filter(
-                    user=request.user, date=today
-                ).update(
-                    cards_studied=F('cards_studied') + 1,
-                    new_words_learned=F('new_words_learned') + (1 if created else 0),
-                    words_reviewed=F('words_reviewed') + (0 if created else 1)
-                )
-            else:
-                # Nếu record mới, cập nhật trực tiếp
-                daily_stats.cards_studied = 1
-                daily_stats.new_words_learned = 1 if created else 0
-                daily_stats.words_reviewed = 0 if created else 1
-                daily_stats.save()
-
-            # Cập nhật accuracy_rate theo trung bình toàn bộ UserProgress
-            agg = UserProgress.objects.filter(user=request.user).aggregate(
-                total_correct=Sum('times_correct'),
-                total_reviewed=Sum('times_reviewed')
-            )
-            total_correct = agg.get('total_correct') or 0
-            total_reviewed = agg.get('total_reviewed') or 0
-            daily_accuracy = round((total_correct / total_reviewed) * 100, 1) if total_reviewed > 0 else 0.0
-
-            DailyStats.objects.filter(user=request.user, date=today).update(
-                accuracy_rate=daily_accuracy
-            )
-
-        # Kiểm tra và trao thành tích sau khi học
-        new_achievements = AchievementService.check_and_award_achievements(request.user)
+        # Kiểm tra và trao thành tích sau khi học (chỉ thẻ mới làm tăng số từ đã học)
+        new_achievements = AchievementService.handle_event(
+            request.user, AchievementEvent.CARD_REVIEWED, delta=1 if created else 0
+        )
 
         response_data = {
             'message': 'Đã cập nhật tiến trình học tập',
@@ -484,15 +586,77 @@ class FlashcardViewSet(viewsets.ViewSet, generics.CreateAPIView, generics.Update
         }
 
         if new_achievements:
-            response_data['new_achievements'] = [
+            response_data['new_achievements'] = self._serialize_achievements(new_achievements)
+
+        return Response(response_data)
+
+    @action(methods=['post'], detail=False, url_path='study-batch', permission_classes=[IsUser])
+    def study_batch(self, request):
+        serializer = serializers.StudyBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        reviews = serializer.validated_data['reviews']
+
+        flashcard_ids = {review['flashcard_id'] for review in reviews}
+        existing_ids = set(
+            Flashcard.objects.filter(id__in=flashcard_ids).values_list('id', flat=True)
+        )
+        missing_ids = sorted(flashcard_ids - existing_ids)
+        if missing_ids:
+            return Response(
+                {'error': 'Không tìm thấy flashcard', 'missing_ids': missing_ids},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        now = timezone.now()
+        with transaction.atomic():
+            # Tạo trước các dòng còn thiếu (bỏ qua dòng request song song vừa tạo) rồi khóa tất cả:
+            # select_for_update chỉ khóa được dòng đã tồn tại
+            UserProgress.objects.bulk_create(
+                [UserProgress(user=request.user, flashcard_id=flashcard_id) for flashcard_id in flashcard_ids],
+                ignore_conflicts=True
+            )
+            progress_map = {
+                progress.flashcard_id: progress
+                for progress in UserProgress.objects.select_for_update().filter(
+                    user=request.user, flashcard_id__in=flashcard_ids
+                )
+            }
+            # Thẻ chưa từng được ôn (kể cả dòng vừa tạo ở trên) là từ mới
+            new_count = sum(1 for progress in progress_map.values() if progress.times_reviewed == 0)
+
+            # Áp dụng các lượt ôn theo đúng thứ tự gửi lên
+            for review in reviews:
+                progress_map[review['flashcard_id']].apply_review(
+                    review['is_correct'], review.get('difficulty_rating'), now
+                )
+
+            UserProgress.objects.bulk_update(list(progress_map.values()), UserProgress.REVIEW_FIELDS)
+
+            self._update_daily_study_stats(
+                request.user, len(reviews), new_count,
+                sum(1 for review in reviews if review['is_correct'])
+            )
+
+        # Thành tích chỉ được xét 1 lần cho cả batch
+        new_achievements = AchievementService.handle_event(
+            request.user, AchievementEvent.CARD_REVIEWED, delta=new_count
+        )
+
+        response_data = {
+            'message': 'Đã cập nhật tiến trình học tập',
+            'reviewed': len(reviews),
+            'progress': [
                 {
-                    'name': achievement.name,
-                    'description': achievement.description,
-                    'points': achievement.points,
-                    'rarity': achievement.rarity
+                    'flashcard_id': flashcard_id,
+                    'mastery_level': progress.mastery_level,
+                    'times_reviewed': progress.times_reviewed
                 }
-                for achievement in new_achievements
+                for flashcard_id, progress in progress_map.items()
             ]
+        }
+
+        if new_achievements:
+            response_data['new_achievements'] = self._serialize_achievements(new_achievements)
 
         return Response(response_data)
 
@@ -503,10 +667,12 @@ class UserViewSet(viewsets.ViewSet, generics.CreateAPIView):
     parser_classes = [parsers.MultiPartParser, parsers.FormParser, parsers.JSONParser]
 
     def get_permissions(self):
-        if self.action in ['current_user', 'upload_avatar', 'logout']:
+        if self.action in ['current_user', 'upload_avatar', 'logout', 'export_history']:
             return [permissions.IsAuthenticated()]
         if self.action in ['study_summary', 'saved_sets']:
             return [IsUser()]
+        if self.action in ['admin_list', 'admin_update_role', 'auth_cache_stats']:
+            return [IsAdmin()]
         elif self.action == 'create':
             return [permissions.AllowAny()]
         return [permissions.AllowAny()]
@@ -611,7 +777,7 @@ class UserViewSet(viewsets.ViewSet, generics.CreateAPIView):
 
             return Response({
                 'message': 'Upload avatar thành công',
-                'avatar_url': user.avatar.url if user.avatar else None
+                'avatar_url': user.avatar_url
             })
         except Exception as e:
             return Response(
@@ -643,9 +809,30 @@ class UserViewSet(viewsets.ViewSet, generics.CreateAPIView):
 
     @action(methods=['get'], detail=False, permission_classes=[IsAdmin])
     def admin_list(self, request):
-        users = User.objects.all().order_by('-date_joined')
-        serializer = serializers.UserSerializer(users, many=True)
-        return Response(serializer.data)
+        users = User.objects.all()
+
+        # Filter
+        q = request.query_params.get('q')
+        if q:
+            users = users.filter(username__istartswith=q)  # tiền tố dùng được unique index của username
+        role = request.query_params.get('role')
+        if role in ['user', 'admin']:
+            users = users.filter(role=role)
+
+        if request.query_params.get('stream') == 'ndjson':
+            rows = keyset_rows(users, ADMIN_USER_STREAM_FIELDS, keys=('id',), descending=True)
+            return streaming_export_response(iter_ndjson(rows), 'ndjson', 'admin-users')
+
+        # id tăng theo thời gian đăng ký nên '-id' giữ thứ tự '-date_joined' cũ
+        paginator = AdminCursorPagination()
+        page = paginator.paginate_queryset(users, request)
+        serializer = serializers.UserSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(methods=['get'], detail=False, permission_classes=[IsAdmin])
+    def auth_cache_stats(self, request):
+        # Số lần trúng/trượt cache token Firebase của worker đang phục vụ request này
+        return Response(get_token_cache().stats())
 
     @action(methods=['patch'], detail=True, permission_classes=[IsAdmin])
     def admin_update_role(self, request, pk=None):
@@ -675,9 +862,12 @@ class UserViewSet(viewsets.ViewSet, generics.CreateAPIView):
         total_time = DailyStats.objects.filter(user=user).aggregate(
             total=Sum('time_spent')
         )['total'] or 0
+        # Cộng phần thời gian còn chờ ghi (chế độ write-behind)
+        total_time += sum(
+            deltas.get('time_spent', 0) for deltas, _ in DailyStatsBuffer.pending_for(user).values()
+        )
 
         # Streak hiện tại
-        from api.achievement_service import AchievementService
         current_streak = AchievementService._calculate_current_streak(user)
 
         # Thành tích
@@ -700,9 +890,25 @@ class UserViewSet(viewsets.ViewSet, generics.CreateAPIView):
 
         return Response(data)
 
+    @action(methods=['get'], detail=False)
+    def export_history(self, request):
+        # Lịch sử học (UserProgress/DailyStats/GameSession) dạng NDJSON; admin có thể chọn user_id
+        user = request.user
+        user_id = request.query_params.get('user_id')
+        if user_id and str(user_id) != str(user.pk):
+            if getattr(user, 'role', 'user') != 'admin':
+                return Response({'error': 'Không có quyền'}, status=status.HTTP_403_FORBIDDEN)
+            user = User.objects.filter(pk=user_id).first()
+            if user is None:
+                return Response({'error': 'Không tìm thấy người dùng'}, status=status.HTTP_404_NOT_FOUND)
+
+        return streaming_export_response(iter_ndjson(history_rows(user)), 'ndjson', f'history-{user.pk}')
+
     @action(methods=['get'], detail=False, permission_classes=[permissions.IsAuthenticated])
     def saved_sets(self, request):
-        saved = SavedFlashcardSet.objects.filter(user=request.user).select_related('flashcard_set')
+        saved = SavedFlashcardSet.objects.filter(user=request.user).select_related(
+            'flashcard_set__creator', 'flashcard_set__topic'
+        )
         serializer = serializers.SavedFlashcardSetSerializer(saved, many=True)
         return Response(serializer.data)
 
@@ -714,6 +920,8 @@ class GameSessionViewSet(viewsets.ViewSet, generics.CreateAPIView, generics.List
     def get_permissions(self):
         if self.action in ['create', 'list']:
             return [IsUser()]
+        if self.action == 'my_rank':
+            return [permissions.IsAuthenticated()]
         return [permissions.AllowAny()]
 
     def get_queryset(self):
@@ -726,6 +934,9 @@ class GameSessionViewSet(viewsets.ViewSet, generics.CreateAPIView, generics.List
         with transaction.atomic():
             game_session = serializer.save(user=request.user)
 
+            # Cập nhật bảng xếp hạng (điểm cao nhất theo loại game/khung thời gian)
+            LeaderboardService.record_game(game_session)
+
             # Cập nhật điểm người dùng
             User.objects.filter(id=request.user.id).update(
                 total_points=F('total_points') + game_session.score
@@ -733,57 +944,19 @@ class GameSessionViewSet(viewsets.ViewSet, generics.CreateAPIView, generics.List
             # Refresh user instance để có total_points mới
             request.user.refresh_from_db()
 
-            # Cập nhật thống kê hàng ngày
-            today = timezone.now().date()
-            daily_stats, created_daily = DailyStats.objects.get_or_create(
-                user=request.user, date=today,
-                defaults={
-                    'cards_studied': 0,
-                    'new_words_learned': 0,
-                    'words_reviewed': 0,
-                    'time_spent': 0,
-                    'games_played': 0,
-                    'points_earned': 0,
-                    'accuracy_rate': 0.0
-                }
-            )
-
-            if not created_daily:
-                # Nếu record đã tồn tại thì cập nhật
-                DailyStats.objects.filter(
-                    user=request.user, date=today
-                ).update(
-                    games_played=F('games_played') + 1,
-                    points_earned=F('points_earned') + game_session.score
-                )
-            else:
-                # Nếu record mới, cập nhật trực tiếp
-                daily_stats.games_played = 1
-                daily_stats.points_earned = game_session.score
-                daily_stats.save()
-
-            # Cộng thời gian học (đổi giây -> phút, làm tròn lên phút)
-            minutes_spent = int(ceil((game_session.time_spent or 0) / 60))
-            if minutes_spent > 0:
-                DailyStats.objects.filter(user=request.user, date=today).update(
-                    time_spent=F('time_spent') + minutes_spent
-                )
-
-            # Cập nhật accuracy_rate theo trung bình toàn bộ UserProgress
-            agg = UserProgress.objects.filter(user=request.user).aggregate(
-                total_correct=Sum('times_correct'),
-                total_reviewed=Sum('times_reviewed')
-            )
-            total_correct = agg.get('total_correct') or 0
-            total_reviewed = agg.get('total_reviewed') or 0
-            daily_accuracy = round((total_correct / total_reviewed) * 100, 1) if total_reviewed > 0 else 0.0
-
-            DailyStats.objects.filter(user=request.user, date=today).update(
-                accuracy_rate=daily_accuracy
+            # Cập nhật thống kê hàng ngày trong 1 câu lệnh
+            DailyStatsBuffer.record(
+                request.user,
+                games_played=1,
+                points_earned=game_session.score,
+                # Cộng thời gian học (đổi giây -> phút, làm tròn lên phút)
+                time_spent=int(ceil((game_session.time_spent or 0) / 60)),
+                # accuracy_rate lấy từ bộ đếm trọn đời trong UserStats
+                accuracy_rate=AchievementService.get_accuracy_rate(request.user)
             )
 
         # Kiểm tra và trao thành tích sau khi chơi game
-        new_achievements = AchievementService.check_and_award_achievements(request.user)
+        new_achievements = AchievementService.handle_event(request.user, AchievementEvent.GAME_FINISHED)
 
         response_data = {
             'game_session': serializer.data,
@@ -800,43 +973,53 @@ class GameSessionViewSet(viewsets.ViewSet, generics.CreateAPIView, generics.List
 
         return Response(response_data, status=status.HTTP_201_CREATED)
 
+    def _leaderboard_params(self, request):
+        game_type = request.query_params.get('game_type') or None
+        window = request.query_params.get('window', 'all_time')
+        if window not in LeaderboardService.WINDOWS:
+            window = 'all_time'
+        return game_type, window
+
     @action(methods=['get'], detail=False)
     def leaderboard(self, request):
-        game_type = request.query_params.get('game_type')
-        queryset = GameSession.objects.all()
-
-        # Filter TRƯỚC khi aggregate và slice
-        if game_type:
-            queryset = queryset.filter(game_type=game_type)
-
-        # Sau đó mới aggregate, order và slice
-        queryset = queryset.values('user').annotate(
-            best_score=Max('score'),
-            total_games=Count('id')
-        ).order_by('-best_score')[:10]
-
-        # Transform data
-        leaderboard_data = []
-        for i, item in enumerate(queryset, 1):
-            try:
-                user = User.objects.get(id=item['user'])
-                leaderboard_data.append({
-                    'rank': i,
-                    'user': serializers.UserSerializer(user).data,
-                    'best_score': item['best_score'],
-                    'total_games': item['total_games']
-                })
-            except User.DoesNotExist:
-                # Skip nếu user không tồn tại
-                continue
+        game_type, window = self._leaderboard_params(request)
+
+        # Đọc từ bảng xếp hạng lưu sẵn, 1 query có join user
+        entries = LeaderboardService.get_top(game_type=game_type, window=window, limit=10)
+
+        leaderboard_data = [
+            {
+                'rank': i,
+                'user': serializers.UserSerializer(entry.user).data,
+                'best_score': entry.best_score,
+                'total_games': entry.total_games
+            }
+            for i, entry in enumerate(entries, 1)
+        ]
 
         return Response(leaderboard_data)
 
+    @action(methods=['get'], detail=False, url_path='leaderboard/me', permission_classes=[permissions.IsAuthenticated])
+    def my_rank(self, request):
+        game_type, window = self._leaderboard_params(request)
+
+        entry = LeaderboardService.get_user_rank(request.user, game_type=game_type, window=window)
+        if entry is None:
+            return Response({'rank': None, 'best_score': 0, 'total_games': 0, 'window': window})
+
+        return Response({
+            'rank': entry.rank,
+            'best_score': entry.best_score,
+            'total_games': entry.total_games,
+            'window': window
+        })
+
 
 class UserProgressViewSet(viewsets.ViewSet, generics.ListAPIView):
     queryset = UserProgress.objects.all()
     serializer_class = serializers.UserProgressSerializer
     permission_classes = [permissions.IsAuthenticated]
+    MAX_DUE_LIMIT = 100
 
     def get_queryset(self):
         queryset = self.queryset.filter(user=self.request.user).select_related('flashcard')
@@ -853,6 +1036,21 @@ class UserProgressViewSet(viewsets.ViewSet, generics.ListAPIView):
 
         return queryset
 
+    @action(methods=['get'], detail=False)
+    def due(self, request):
+        # Các thẻ đến hạn ôn của user, quét theo index (user, due_at)
+        try:
+            limit = min(max(int(request.query_params.get('limit', 20)), 1), self.MAX_DUE_LIMIT)
+        except (TypeError, ValueError):
+            limit = 20
+
+        queryset = UserProgress.objects.filter(
+            user=request.user, due_at__lte=timezone.now()
+        ).select_related('flashcard').order_by('due_at')[:limit]
+
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data)
+
     @action(methods=['post'], detail=True)
     def mark_difficult(self, request, pk):
         progress = self.get_object()
@@ -957,15 +1155,27 @@ class DailyStatsViewSet(viewsets.ViewSet, generics.ListAPIView):
     serializer_class = serializers.DailyStatsSerializer
     permission_classes = [permissions.IsAuthenticated]
 
-    def get_queryset(self):
-        queryset = self.queryset.filter(user=self.request.user)
-
+    def _date_range(self):
         # Lọc theo khoảng thời gian
         days = self.request.query_params.get('days', 7)
-        end_date = timezone.now().date()
+        end_date = timezone.localdate()
         start_date = end_date - timedelta(days=int(days))
+        return start_date, end_date
+
+    def get_queryset(self):
+        queryset = self.queryset.filter(user=self.request.user)
+        return queryset.filter(date__range=self._date_range()).order_by('-date')
+
+    def list(self, request, *args, **kwargs):
+        if not DailyStatsBuffer.enabled():
+            return super().list(request, *args, **kwargs)
 
-        return queryset.filter(date__range=[start_date, end_date]).order_by('-date')
+        # Gộp các delta chưa ghi xuống DB để số liệu luôn mới nhất
+        stats_list = DailyStatsBuffer.merge_pending(request.user, list(self.get_queryset()), *self._date_range())
+        page = self.paginate_queryset(stats_list)
+        if page is not None:
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        return Response(self.get_serializer(stats_list, many=True).data)
 
 
 class UserFeedbackViewSet(viewsets.ViewSet, generics.CreateAPIView, generics.ListAPIView):
@@ -984,3 +1194,51 @@ class UserFeedbackViewSet(viewsets.ViewSet, generics.CreateAPIView, generics.Lis
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
+class SearchViewSet(viewsets.ViewSet):
+    permission_classes = [permissions.AllowAny]
+    SEARCH_TYPES = ('all', 'sets', 'cards')
+
+    def list(self, request):
+        # Tìm bộ flashcard công khai và thẻ của chúng, xếp theo mức độ liên quan
+        q = request.query_params.get('q', '')
+        if not query_tokens(q):
+            return Response({'error': 'Thiếu từ khóa tìm kiếm'}, status=status.HTTP_400_BAD_REQUEST)
+
+        search_type = request.query_params.get('type', 'all')
+        if search_type not in self.SEARCH_TYPES:
+            return Response(
+                {'error': f"type phải là một trong: {', '.join(self.SEARCH_TYPES)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            limit = min(max(int(request.query_params.get('limit', SearchService.DEFAULT_LIMIT)), 1),
+                        SearchService.MAX_LIMIT)
+        except (TypeError, ValueError):
+            limit = SearchService.DEFAULT_LIMIT
+
+        data = {'query': q}
+        if search_type in ('all', 'sets'):
+            data['sets'] = serializers.FlashcardSetSerializer(
+                SearchService.search_sets(q, limit), many=True, context={'request': request}
+            ).data
+        if search_type in ('all', 'cards'):
+            data['cards'] = serializers.SearchCardSerializer(SearchService.search_cards(q, limit), many=True).data
+        return Response(data)
+
+    @action(methods=['get'], detail=False)
+    def suggest(self, request):
+        # Gợi ý hoàn thành từ khóa theo tiền tố, phục vụ từ trie trong bộ nhớ (không truy vấn DB)
+        prefix = request.query_params.get('prefix', '')
+        if not query_tokens(prefix):
+            return Response({'prefix': prefix, 'suggestions': []})
+        try:
+            limit = min(max(int(request.query_params.get('limit', SuggestionIndex.DEFAULT_LIMIT)), 1),
+                        SuggestionIndex.MAX_LIMIT)
+        except (TypeError, ValueError):
+            limit = SuggestionIndex.DEFAULT_LIMIT
+
+        suggestions = SuggestionIndex.suggest(prefix, limit)
+        return Response({
+            'prefix': prefix,
+            'suggestions': [{'text': text, 'count': count} for text, count in suggestions],
+        })
@@ -138,6 +138,48 @@ FIREBASE_CONFIG = {
 
 # Firebase Admin SDK
 FIREBASE_CREDENTIALS_PATH = os.getenv('FIREBASE_CREDENTIALS_PATH', 'firebase-credentials.json')
+# Cache token đã xác thực trong process (không giữ quá exp của token); 0 để tắt
+FIREBASE_TOKEN_CACHE_SIZE = int(os.getenv('FIREBASE_TOKEN_CACHE_SIZE', '10000'))
+FIREBASE_TOKEN_CACHE_TTL = int(os.getenv('FIREBASE_TOKEN_CACHE_TTL', '300'))
+# Số thread nhập avatar Firebase lên Cloudinary ở nền; 0 để chạy ngay trong request
+AVATAR_IMPORT_WORKERS = int(os.getenv('AVATAR_IMPORT_WORKERS', '2'))
+
+# AI suggestion (SBERT)
+# Nạp model ở thread nền khi app khởi động; bật riêng cho các worker phục vụ web
+AI_SUGGESTION_PRELOAD = os.getenv('AI_SUGGESTION_PRELOAD', 'false').lower() == 'true'
+# Thư mục model all-MiniLM-L6-v2 trên đĩa (không tra cứu Hugging Face Hub), để trống để tải theo tên
+AI_SUGGESTION_MODEL_PATH = os.getenv('AI_SUGGESTION_MODEL_PATH')
+# Unix socket của process encode dùng chung (manage.py run_embedding_worker), để trống để encode trong process
+AI_EMBEDDING_WORKER_SOCKET = os.getenv('AI_EMBEDDING_WORKER_SOCKET')
+AI_EMBEDDING_WORKER_AUTHKEY = os.getenv('AI_EMBEDDING_WORKER_AUTHKEY')
+# Số giây tối đa cho mỗi kết nối tới process encode (client: kết nối, gửi, nhận, quá hạn thì trả xếp hạng phổ biến;
+# worker: bắt tay và đọc/ghi, quá hạn thì đóng kết nối)
+AI_EMBEDDING_WORKER_TIMEOUT = float(os.getenv('AI_EMBEDDING_WORKER_TIMEOUT', '5'))
+# Nếu không kết nối được process encode thì nạp model ngay trong worker
+AI_EMBEDDING_WORKER_FALLBACK = os.getenv('AI_EMBEDDING_WORKER_FALLBACK', 'true').lower() == 'true'
+
+# DailyStats write-behind: cộng delta vào Redis (django-redis) và ghi dồn bằng manage.py flush_daily_stats --loop
+DAILY_STATS_WRITE_BEHIND = os.getenv('DAILY_STATS_WRITE_BEHIND', 'false').lower() == 'true'
+# 'redis' (dùng chung giữa các worker, cần REDIS_URL) hoặc 'local' (bộ nhớ 1 process); mặc định theo REDIS_URL
+DAILY_STATS_BUFFER_STORE = os.getenv('DAILY_STATS_BUFFER_STORE', 'redis' if os.getenv('REDIS_URL') else 'local')
+# Store 'local': mỗi process tự ghi dồn xuống DB sau ngần này giây (và khi thoát)
+DAILY_STATS_LOCAL_FLUSH_INTERVAL = float(os.getenv('DAILY_STATS_LOCAL_FLUSH_INTERVAL', '5'))
+
+# Tìm kiếm: 'auto' (FULLTEXT trên MySQL, chỉ mục trong process với DB khác), 'fulltext' hoặc 'memory'
+SEARCH_BACKEND = os.getenv('SEARCH_BACKEND', 'auto')
+# Chỉ mục trong process (khi không có FULLTEXT) cập nhật từng phần theo nhật ký thay đổi trong DB,
+# và dựng lại toàn bộ sau số giây này
+SEARCH_MEMORY_INDEX_MAX_AGE = int(os.getenv('SEARCH_MEMORY_INDEX_MAX_AGE', '600'))
+# Phải khớp innodb_ft_min_token_size của MySQL; nên đặt cả hai là 1 (kèm innodb_ft_enable_stopword=OFF)
+# để tìm được các âm tiết tiếng Việt ngắn như "an", "di"
+SEARCH_FULLTEXT_MIN_TOKEN_SIZE = int(os.getenv('SEARCH_FULLTEXT_MIN_TOKEN_SIZE', '3'))
+# Gợi ý typeahead (/search/suggest/): trie trong bộ nhớ mỗi worker
+# Số cụm từ tối đa giữ trong trie (từ phổ biến được ưu tiên)
+SEARCH_SUGGEST_MAX_TERMS = int(os.getenv('SEARCH_SUGGEST_MAX_TERMS', '200000'))
+# Sau bao nhiêu giây thì dựng lại ở thread nền để nhận thay đổi từ các worker khác
+SEARCH_SUGGEST_MAX_AGE = int(os.getenv('SEARCH_SUGGEST_MAX_AGE', '600'))
+# Dựng trie ở thread nền khi app khởi động thay vì ở request đầu tiên
+SEARCH_SUGGEST_PRELOAD = os.getenv('SEARCH_SUGGEST_PRELOAD', 'false').lower() == 'true'
 
 # Cloudinary Configuration for media files
 CLOUDINARY_STORAGE = {
@@ -178,12 +220,26 @@ CSRF_TRUSTED_ORIGINS = [
     "https://your-domain.com",
 ]
 
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'unique-snowflake',
+# Đặt REDIS_URL (vd. redis://127.0.0.1:6379/1) để mọi worker dùng chung cache qua django-redis;
+# để trống thì mỗi process có LocMemCache riêng (chỉ hợp với dev chạy 1 process)
+REDIS_URL = os.getenv('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': REDIS_URL,
+            'OPTIONS': {
+                'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            },
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'unique-snowflake',
+        }
     }
-}
 
 # Session Configuration
 SESSION_ENGINE = 'django.contrib.sessions.backends.db'
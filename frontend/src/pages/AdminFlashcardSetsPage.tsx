@@ -1,5 +1,5 @@
 import React, { useEffect, useMemo, useState } from 'react';
-import { useQuery, useMutation, useQueryClient } from '@tanstack/react-query';
+import { useInfiniteQuery, useQuery, useMutation, useQueryClient } from '@tanstack/react-query';
 import { Link } from 'react-router-dom';
 import { flashcardSetsAPI, topicsAPI } from '../services/api';
 import { FlashcardSet, Topic } from '../types';
@@ -22,17 +22,19 @@ const AdminFlashcardSetsPage: React.FC = () => {
     queryFn: async () => (await topicsAPI.getAll({ page: 1, page_size: 100 })).data,
   });
 
-  const { data, isLoading, refetch } = useQuery({
+  const { data, isLoading, refetch, fetchNextPage, hasNextPage, isFetchingNextPage } = useInfiniteQuery({
     queryKey: ['adminFlashcardSets', q, topicId, creatorId, isPublic],
-    queryFn: async () => {
+    queryFn: async ({ pageParam }) => {
       const res = await flashcardSetsAPI.adminList({
         q: q || undefined,
         topic_id: topicId ? Number(topicId) : undefined,
         creator_id: creatorId ? Number(creatorId) : undefined,
         is_public: isPublic === '' ? undefined : isPublic === 'true',
-      });
+      }, pageParam);
       return res.data;
     },
+    initialPageParam: undefined as string | undefined,
+    getNextPageParam: (lastPage) => lastPage.next ?? undefined,
   });
 
   const deleteMutation = useMutation({
@@ -45,7 +47,7 @@ const AdminFlashcardSetsPage: React.FC = () => {
   });
 
   const topics: Topic[] = topicsData?.results ?? [];
-  const sets: FlashcardSet[] = useMemo(() => data ?? [], [data]);
+  const sets: FlashcardSet[] = useMemo(() => data?.pages.flatMap(page => page.results) ?? [], [data]);
 
   const onDelete = (id: number) => {
     if (window.confirm('Xóa bộ flashcard này?')) {
@@ -137,6 +139,13 @@ const AdminFlashcardSetsPage: React.FC = () => {
               )}
             </tbody>
           </table>
+          {hasNextPage && (
+            <div className="p-3 flex justify-center border-t">
+              <Button onClick={() => fetchNextPage()} disabled={isFetchingNextPage}>
+                {isFetchingNextPage ? 'Đang tải...' : 'Tải thêm'}
+              </Button>
+            </div>
+          )}
         </Card>
       )}
     </div>
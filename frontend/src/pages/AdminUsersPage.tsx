@@ -1,5 +1,5 @@
-import React from 'react';
-import { useQuery, useMutation, useQueryClient } from '@tanstack/react-query';
+import React, { useMemo } from 'react';
+import { useInfiniteQuery, useMutation, useQueryClient } from '@tanstack/react-query';
 import { userAPI } from '../services/api';
 import { User } from '../types';
 import Card from '../components/common/Card';
@@ -10,11 +10,15 @@ import toast from 'react-hot-toast';
 const AdminUsersPage: React.FC = () => {
   const queryClient = useQueryClient();
 
-  const { data, isLoading } = useQuery({
+  const { data, isLoading, fetchNextPage, hasNextPage, isFetchingNextPage } = useInfiniteQuery({
     queryKey: ['adminUsers'],
-    queryFn: async () => (await userAPI.adminList()).data as User[],
+    queryFn: async ({ pageParam }) => (await userAPI.adminList(undefined, pageParam)).data,
+    initialPageParam: undefined as string | undefined,
+    getNextPageParam: (lastPage) => lastPage.next ?? undefined,
   });
 
+  const users: User[] = useMemo(() => data?.pages.flatMap(page => page.results) ?? [], [data]);
+
   const updateRoleMutation = useMutation({
     mutationFn: ({ id, role }: { id: number; role: 'user' | 'admin' }) => userAPI.adminUpdateRole(id, role),
     onSuccess: () => {
@@ -51,7 +55,7 @@ const AdminUsersPage: React.FC = () => {
               </tr>
             </thead>
             <tbody>
-              {(data ?? []).map(u => (
+              {users.map(u => (
                 <tr key={u.id} className="border-t">
                   <td className="p-3">{u.id}</td>
                   <td className="p-3">{u.username}</td>
@@ -63,11 +67,18 @@ const AdminUsersPage: React.FC = () => {
                   </td>
                 </tr>
               ))}
-              {(!data || data.length === 0) && (
+              {users.length === 0 && (
                 <tr><td className="p-4 text-center text-gray-500" colSpan={6}>Không có dữ liệu</td></tr>
               )}
             </tbody>
           </table>
+          {hasNextPage && (
+            <div className="p-3 flex justify-center border-t">
+              <Button onClick={() => fetchNextPage()} disabled={isFetchingNextPage}>
+                {isFetchingNextPage ? 'Đang tải...' : 'Tải thêm'}
+              </Button>
+            </div>
+          )}
         </Card>
       )}
     </div>
@@ -2,7 +2,7 @@ import axios, { AxiosResponse } from 'axios';
 import { 
   User, Topic, FlashcardSet, Flashcard, GameSession, 
   Achievement, UserAchievement, DailyStats, StudySummary,
-  AuthResponse, PaginatedResponse, LeaderboardEntry, UserProgress
+  AuthResponse, PaginatedResponse, LeaderboardEntry, UserProgress, SearchResponse
 } from '../types';
 
 const API_BASE_URL = process.env.REACT_APP_API_URL || 'http://localhost:8000/api';
@@ -149,8 +149,13 @@ export const flashcardSetsAPI = {
     topic_id?: number;
     creator_id?: number;
     is_public?: boolean;
-  }): Promise<AxiosResponse<FlashcardSet[]>> =>
-    api.get('/flashcard-sets/admin_list/', { params }),
+    page_size?: number;
+  }, nextUrl?: string): Promise<AxiosResponse<{
+    next: string | null;
+    previous: string | null;
+    results: FlashcardSet[];
+  }>> =>
+    nextUrl ? api.get(nextUrl) : api.get('/flashcard-sets/admin_list/', { params }),
   
   create: (data: {
     title: string;
@@ -190,6 +195,37 @@ export const flashcardSetsAPI = {
   getFlashcards: (id: number): Promise<AxiosResponse<Flashcard[]>> =>
     api.get(`/flashcard-sets/${id}/flashcards/`),
 
+  // Phân trang theo cursor: truyền nextUrl (trường `next` của trang trước) để lấy trang tiếp
+  getFlashcardsPage: (id: number, params?: { page_size?: number }, nextUrl?: string): Promise<AxiosResponse<{
+    next: string | null;
+    previous: string | null;
+    results: Flashcard[];
+  }>> =>
+    nextUrl ? api.get(nextUrl) : api.get(`/flashcard-sets/${id}/flashcards/`, { params: { page_size: 50, ...params } }),
+
+  // Chỉ metadata (cards=none) hoặc metadata + trang thẻ đầu tiên (cards=first_page)
+  getByIdLite: (id: number, cards: 'none' | 'first_page' = 'first_page', pageSize?: number): Promise<AxiosResponse<
+    FlashcardSet & { flashcards_next?: string | null }
+  >> =>
+    api.get(`/flashcard-sets/${id}/`, { params: { cards, page_size: pageSize } }),
+
+  // Nhập flashcard hàng loạt từ file CSV/TSV/JSON lines
+  importFlashcards: (id: number, file: File): Promise<AxiosResponse<{
+    message: string;
+    total_cards: number;
+    created: number;
+    error_count: number;
+    errors: { line: number; errors: Record<string, string> }[];
+    errors_truncated: boolean;
+  }>> => {
+    const formData = new FormData();
+    formData.append('file', file);
+    return api.post(`/flashcard-sets/${id}/import/`, formData, {
+      headers: { 'Content-Type': 'multipart/form-data' },
+      timeout: 300000,
+    });
+  },
+
   // Thêm method favorite
   favorite: (id: number): Promise<AxiosResponse<{
     message: string;
@@ -229,6 +265,17 @@ export const flashcardsAPI = {
     times_reviewed: number;
   }>> =>
     api.post(`/flashcards/${id}/study/`, data),
+
+  studyBatch: (reviews: {
+    flashcard_id: number;
+    is_correct: boolean;
+    difficulty_rating?: number;
+  }[]): Promise<AxiosResponse<{
+    message: string;
+    reviewed: number;
+    progress: { flashcard_id: number; mastery_level: number; times_reviewed: number }[];
+  }>> =>
+    api.post('/flashcards/study-batch/', { reviews }),
 };
 
 // User API
@@ -242,8 +289,12 @@ export const userAPI = {
     api.get('/users/saved_sets/'),
   
   // Admin: list users
-  adminList: (): Promise<AxiosResponse<User[]>> =>
-    api.get('/users/admin_list/'),
+  adminList: (params?: { q?: string; role?: 'user' | 'admin'; page_size?: number }, nextUrl?: string): Promise<AxiosResponse<{
+    next: string | null;
+    previous: string | null;
+    results: User[];
+  }>> =>
+    nextUrl ? api.get(nextUrl) : api.get('/users/admin_list/', { params }),
   
   // Admin: update user role
   adminUpdateRole: (id: number, role: 'user' | 'admin'): Promise<AxiosResponse<{ message: string; user: User }>> =>
@@ -259,6 +310,10 @@ export const progressAPI = {
     page_size?: number;
   }): Promise<AxiosResponse<PaginatedResponse<UserProgress>>> =>
     api.get('/progress/', { params }),
+
+  // Thẻ đến hạn ôn tập (array, not paginated)
+  getDue: (params?: { limit?: number }): Promise<AxiosResponse<UserProgress[]>> =>
+    api.get('/progress/due/', { params }),
   
   markDifficult: (id: number): Promise<AxiosResponse<{
     message: string;
@@ -371,5 +426,22 @@ export const feedbackAPI = {
 };
 
 
+// Search API - Relevance-ranked, no pagination
+export const searchAPI = {
+  search: (params: {
+    q: string;
+    type?: 'all' | 'sets' | 'cards';
+    limit?: number;
+  }): Promise<AxiosResponse<SearchResponse>> =>
+    api.get('/search/', { params }),
+
+  // Typeahead: served from the in-memory prefix index
+  suggest: (prefix: string, limit?: number): Promise<AxiosResponse<{
+    prefix: string;
+    suggestions: { text: string; count: number }[];
+  }>> =>
+    api.get('/search/suggest/', { params: { prefix, limit } }),
+};
+
 
 export default api;
\ No newline at end of file
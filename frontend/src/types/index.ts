@@ -65,6 +65,10 @@ export interface UserProgress {
   is_learned: boolean;
   is_difficult: boolean;
   accuracy_rate: number;
+  due_at: string | null;
+  interval_days: number;
+  ease_factor: number;
+  repetitions: number;
 }
 
 export interface GameSession {
@@ -142,6 +146,21 @@ export interface PaginatedResponse<T> {
   results: T[];
 }
 
+export interface SearchCard {
+  id: number;
+  vietnamese: string;
+  english: string;
+  word_type: string;
+  flashcard_set_id: number;
+  flashcard_set_title: string;
+}
+
+export interface SearchResponse {
+  query: string;
+  sets?: FlashcardSet[];
+  cards?: SearchCard[];
+}
+
 export interface ApiError {
   detail?: string;
   message?: string;